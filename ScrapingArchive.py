@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:41:09 2026
+
+@author: Hichem Dridi
+"""
+
+import os
+import re
+import json
+import shutil
+import struct
+import tarfile
+import zipfile
+import tempfile
+import threading
+import time
+import ScrapingStorage as ss
+
+ARCHIVE_FORMATS = ('zip', 'tar')
+ARCHIVE_INDEX_NAME = 'archive-index.json'
+SHARD_PREFIX = 'medicines-advice-'
+DEFAULT_SHARD_SIZE = 512 * 1024 * 1024 # bytes of a shard before the next one is started
+ZIP_HEADER = struct.Struct('<4s22xHH') # signature, then file name and extra field lengths of a local header
+ZIP_CENTRAL_HEADER_SIZE = 46 # bytes of a central directory header, before its file name and extra field
+ZIP_END_SIZE = 22 # bytes of the end of central directory record
+
+class ShardedArchive():
+    """
+    Rolling archive shards of the pdf files of a directory, zip or tar, each one up to max_size bytes\
+    once complete, with its central directory or end-of-archive blocks; a file bigger than max_size\
+    gets a shard of its own.
+    The files are spooled in memory, or in a temporary file for the biggest ones, while they download\
+    and appended to the current shard one at a time, so no loose file is written in the directory.
+    The index file maps each medicine SMC ID to its shard and to the offset and size of its data,\
+    so a single document is read back with one seek. The zip entries are stored without compression,\
+    the pdf files are compressed already.
+    """
+
+    def __init__(self, directory, format = 'zip', max_size = DEFAULT_SHARD_SIZE):
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(f"The archive format must be one of {ARCHIVE_FORMATS}, got {format!r}!")
+        self.__directory = directory
+        self.__format = format
+        self.__max_size = max_size
+        self.__index_path = str(os.path.join(directory, ARCHIVE_INDEX_NAME))
+        self.__lock = threading.Lock()
+        self.__index = {} # ID -> shard, file name, offset and size
+        if os.path.exists(self.__index_path):
+            with open(self.__index_path, encoding = 'utf-8') as fh:
+                self.__index = json.load(fh)
+        # the shards of the previous runs are complete, the next files go to a new one
+        matches = (re.match(re.escape(SHARD_PREFIX) + r'(\d+)\.(?:zip|tar)$', name) for name in os.listdir(directory))
+        numbers = [int(match.group(1)) for match in matches if match != None]
+        self.__next_number = max(numbers, default = -1) + 1
+        self.__shard = None # the shard being written: its name, the ZipFile or TarFile, its entries count
+        self.__shards = 0 # shards written by this archive
+
+    def __repr__(self):
+        return "ShardedArchive"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.__index)
+
+    def __contains__(self, ID):
+        return ID in self.__index
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    @property
+    def format(self):
+        return self.__format
+
+    @property
+    def index_path(self):
+        return self.__index_path
+
+    @property
+    def shards(self):
+        return self.__shards
+
+    def write(self, ID, file_name, chunks, meter = None):
+        '''
+        Archive the content of a medicine file.
+
+        Parameters
+        ----------
+        ID : str
+            The medicine SMC ID.
+        file_name : str
+            The name of the file in its link.
+        chunks : iterable
+            The content of the file, as bytes chunks.
+        meter : ScrapingClient.TransferMeter, optional
+            A counter for the bytes read.
+
+        Returns
+        -------
+        location : str
+            The shard and the entry of the file, as <shard>/<entry name>.
+        size : int
+            The size of the file.
+
+        '''
+        with tempfile.SpooledTemporaryFile(max_size = ss.SPOOL_SIZE) as spool:
+            # the download is not serialized, only the copy to the shard
+            for chunk in chunks:
+                spool.write(chunk)
+                if meter != None: meter.add(len(chunk))
+            size = spool.tell()
+            spool.seek(0)
+            entry_name = ss.readable_name(ID, file_name)
+            with self.__lock:
+                shard_name, offset = self.__append(entry_name, spool, size)
+                self.__index[ID] = {"shard": shard_name, "file": entry_name, "offset": offset, "size": size}
+        return f"{shard_name}/{entry_name}", size
+
+    def __append(self, entry_name, fileobj, size):
+        # append an entry to the current shard, starting a new one when it would exceed max_size
+        if self.__format == 'zip':
+            info = zipfile.ZipInfo(entry_name, date_time = time.localtime()[:6])
+            info.file_size = size
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            info = tarfile.TarInfo(entry_name)
+            info.size = size
+            info.mtime = time.time()
+        if self.__shard != None and self.__shard[2] > 0 and self.__complete_size(info) > self.__max_size:
+            self.__close_shard()
+        if self.__shard == None: self.__open_shard()
+        shard_name, archive, _ = self.__shard
+
+        if self.__format == 'zip':
+            with archive.open(info, mode = 'w') as dest: shutil.copyfileobj(fileobj, dest)
+            # the data follows the local header and its variable fields
+            archive.fp.flush()
+            with open(os.path.join(self.__directory, shard_name), mode = 'rb') as fh:
+                fh.seek(info.header_offset)
+                _, name_length, extra_length = ZIP_HEADER.unpack(fh.read(ZIP_HEADER.size))
+            offset = info.header_offset + ZIP_HEADER.size + name_length + extra_length
+        else:
+            archive.addfile(info, fileobj)
+            archive.fileobj.flush()
+            # the data is padded to a whole number of blocks
+            offset = archive.offset - -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+        self.__shard[2] += 1
+        return shard_name, offset
+
+    def __complete_size(self, info):
+        # the size of the current shard once the entry is added and the shard is closed
+        archive = self.__shard[1]
+        if self.__format == 'zip':
+            # the local header and the data, then the central directory and its end record
+            name_length = len(info.filename.encode('utf-8'))
+            central_size = sum(ZIP_CENTRAL_HEADER_SIZE + len(entry.filename.encode('utf-8')) + len(entry.extra)
+                               for entry in archive.filelist)
+            return (archive.fp.tell() + ZIP_HEADER.size + name_length + info.file_size
+                    + central_size + ZIP_CENTRAL_HEADER_SIZE + name_length + ZIP_END_SIZE)
+        # the header and the data padded to whole blocks, then the end-of-archive blocks,\
+        # the whole archive being padded to a whole record
+        header_size = len(info.tobuf(archive.format, archive.encoding, archive.errors))
+        size = (archive.offset + header_size + -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                + 2 * tarfile.BLOCKSIZE)
+        return -(-size // tarfile.RECORDSIZE) * tarfile.RECORDSIZE
+
+    def __open_shard(self):
+        shard_name = f"{SHARD_PREFIX}{self.__next_number:05d}.{self.__format}"
+        self.__next_number += 1
+        shard_path = str(os.path.join(self.__directory, shard_name))
+        if self.__format == 'zip': archive = zipfile.ZipFile(shard_path, mode = 'w', compression = zipfile.ZIP_STORED)
+        else: archive = tarfile.open(shard_path, mode = 'w', format = tarfile.PAX_FORMAT)
+        self.__shard = [shard_name, archive, 0]
+
+    def __close_shard(self):
+        # a closed shard is complete, its entries are recorded in the index file
+        self.__shard[1].close()
+        self.__shard = None
+        self.__shards += 1
+        ss.write_json(self.__index_path, self.__index)
+
+    def locate(self, ID):
+        '''
+        Returns a copy of the index entry of a medicine: shard, file, offset and size,\
+        None if it is not archived.
+
+        '''
+        with self.__lock:
+            entry = self.__index.get(ID)
+            return dict(entry) if entry != None else None
+
+    def read(self, ID):
+        '''
+        Returns the content of the file of a medicine, read directly at its offset in its shard.
+        None if the medicine is not archived.
+
+        '''
+        entry = self.locate(ID)
+        if entry == None: return None
+        with open(os.path.join(self.__directory, entry["shard"]), mode = 'rb') as fh:
+            fh.seek(entry["offset"])
+            return fh.read(entry["size"])
+
+    def close(self):
+        '''
+        Complete the current shard and write the index file.
+
+        '''
+        with self.__lock:
+            if self.__shard != None: self.__close_shard()
+            else: ss.write_json(self.__index_path, self.__index)
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 22:41:55 2026
+
+@author: Hichem Dridi
+"""
+
+import os
+import random
+import asyncio
+import tempfile
+from http import HTTPStatus
+from urllib.parse import urljoin
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import ScrapingFunctions as sf
+import ScrapingClient as sc
+import ScrapingIndex as si
+# aiohttp is an optional dependency, it is imported when a scraper starts its session
+
+DEFAULT_CONCURRENCY = 64 # number of requests in flight
+
+class ScrapingError(Exception):
+    """
+    Raised by AsyncMedAdvScraper when the table Published cannot be retrieved.
+    """
+
+class AsyncMedAdvScraper():
+    """
+    Asynchronous version of MedAdvScraper, for use inside an event loop.
+    The table and the medicines are retrieved without a browser through a single aiohttp session,\
+    with at most concurrency requests in flight, paced by the budgets of an AdaptiveScheduler\
+    like the requests of HttpClient. Failures raise exceptions and the results\
+    are returned instead of being printed, and the process is never exited. Only the downloading\
+    path is printed when the default one is used, see ScrapingFunctions.get_downloading_path.
+    """
+
+    def __init__(self, IDs_list = None, names_list = None, limit = None, path = None,
+                 concurrency = DEFAULT_CONCURRENCY, chunk_size = None, index = None,
+                 connect_timeout = sc.DEFAULT_CONNECT_TIMEOUT, read_timeout = sc.DEFAULT_READ_TIMEOUT,
+                 retries = sc.DEFAULT_RETRIES, backoff = sc.DEFAULT_BACKOFF, scheduler = None):
+        if concurrency < 1: raise ValueError(f"At least one request in flight is required, got {concurrency}!")
+        self.__IDs_list = IDs_list
+        self.__names_list = names_list
+        self.__limit = limit
+        self.__path = path
+        self.__concurrency = concurrency
+        self.__chunk_size = chunk_size if chunk_size != None else sf.DEFAULT_CHUNK_SIZE
+        self.__index = index # ScrapingIndex.TableIndex answering for the table while it is fresh
+        self.__timeout = (connect_timeout, read_timeout)
+        self.__retries = retries
+        self.__backoff = backoff
+        # ScrapingClient.AdaptiveScheduler pacing the requests, shared with the default client if None
+        self.__scheduler = scheduler if scheduler != None else sc.get_default_client().scheduler
+        self.__session = None # created in the running event loop
+        self.__semaphore = None
+        self.__acquirer = None # threads waiting for the scheduler, so the event loop is never blocked
+
+    def __repr__(self):
+        return "AsyncMedicinesAdviceScraper"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def IDs_list(self):
+        return self.__IDs_list
+
+    @IDs_list.setter
+    def IDs_list(self, IDs_list):
+        self.__IDs_list = IDs_list
+
+    @property
+    def names_list(self):
+        return self.__names_list
+
+    @names_list.setter
+    def names_list(self, names_list):
+        self.__names_list = names_list
+
+    @property
+    def limit(self):
+        return self.__limit
+
+    @limit.setter
+    def limit(self, limit):
+        self.__limit = limit
+
+    @property
+    def path(self):
+        return self.__path
+
+    @path.setter
+    def path(self, path):
+        self.__path = path
+
+    @property
+    def concurrency(self):
+        return self.__concurrency
+
+    @property
+    def scheduler(self):
+        return self.__scheduler
+
+    @property
+    def index(self):
+        return self.__index
+
+    @index.setter
+    def index(self, index):
+        self.__index = index
+
+    async def close(self):
+        """
+        Close the session and its pooled connections.
+
+        """
+        if self.__session != None:
+            await self.__session.close()
+            self.__session = None
+        if self.__acquirer != None:
+            self.__acquirer.shutdown(wait = False, cancel_futures = True)
+            self.__acquirer = None
+
+    def __start(self):
+        # the session and the semaphore belong to the running event loop
+        if self.__session != None: return
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise ImportError("AsyncMedAdvScraper requires aiohttp: pip install aiohttp") from e
+
+        connect_timeout, read_timeout = self.__timeout
+        self.__semaphore = asyncio.Semaphore(self.__concurrency)
+        # a single waiting thread per request in flight
+        self.__acquirer = ThreadPoolExecutor(max_workers = self.__concurrency)
+        self.__session = aiohttp.ClientSession(
+            connector = aiohttp.TCPConnector(limit = self.__concurrency),
+            timeout = aiohttp.ClientTimeout(sock_connect = connect_timeout, sock_read = read_timeout))
+
+    async def __acquire(self, kind):
+        # wait for a slot of the scheduler budget in a thread, returns the start time of the request
+        future = asyncio.get_running_loop().run_in_executor(self.__acquirer, self.__scheduler.acquire, kind)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # the slot obtained after the request was cancelled is freed at once
+            future.add_done_callback(lambda future: future.cancelled() or future.exception() != None or
+                                     self.__scheduler.cancel(kind))
+            raise
+
+    @asynccontextmanager
+    async def __get(self, link, kind = 'html', **kwargs):
+        # send a GET request, retrying connection errors, 429 and 5xx responses like HttpClient.get
+        import aiohttp
+
+        for attempt in range(self.__retries + 1):
+            last_attempt = attempt == self.__retries
+            async with self.__semaphore: # the slots are kept until the body is read
+                start = await self.__acquire(kind)
+                try:
+                    response = await self.__session.get(link, **kwargs)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    self.__scheduler.release(kind, start)
+                    if last_attempt: raise
+                    delay = None
+                except BaseException:
+                    # e.g. an invalid url or a cancelled task, which says nothing about the server
+                    self.__scheduler.cancel(kind)
+                    raise
+                else:
+                    # the server may tell how long to wait
+                    delay = sc.retry_after(response) if response.status in sc.RETRY_STATUSES else None
+                    if last_attempt or response.status not in sc.RETRY_STATUSES:
+                        try:
+                            yield response
+                        finally:
+                            response.release()
+                            # the latency covers the whole transfer
+                            self.__scheduler.release(kind, start, response.status, delay)
+                        return
+                    self.__scheduler.release(kind, start, response.status, delay)
+                    response.release()
+            if delay == None: delay = min(sc.MAX_BACKOFF, self.__backoff * 2 ** attempt) * random.uniform(0.5, 1)
+            await asyncio.sleep(delay) # the slot is free while waiting
+
+    async def __read(self, link):
+        async with self.__get(link) as response:
+            if response.status != HTTPStatus.OK:
+                raise ValueError(f"Unable to rertieve {link}, status code {response.status}")
+            return await response.read()
+
+    async def __table_data(self, limit = None, refresh = False):
+        # get the data from the index, or from the table Published and keep a copy in the index
+        if self.__index != None and not refresh and await asyncio.to_thread(self.__index.is_fresh, limit):
+            return await asyncio.to_thread(self.__index.data_dict, limit)
+
+        url = sf.url
+        try:
+            content = await self.__read(url)
+            totalPages = await asyncio.to_thread(sf.table_pages_count, content, limit)
+            pages = await asyncio.gather(*(self.__read(sf.table_page_url.format(page = page))
+                                           for page in range(2, totalPages + 1)))
+            # parse the pages out of the event loop
+            pages = await asyncio.gather(*(asyncio.to_thread(sf.parse_table_rows, page)
+                                           for page in [content] + pages))
+            seen_IDs = set()
+            for page, page_dict in enumerate(pages, start = 1): sf.check_table_page(page, page_dict, seen_IDs)
+        except Exception as e:
+            raise ScrapingError(f"Unable to retrieve data from {url}. "
+                                "The website may not be found or its design has changed!") from e
+
+        data_dict = sf.merge_pages(pages)
+        if limit != None: data_dict = {key: values[:limit] for key, values in data_dict.items()}
+        if self.__index != None:
+            complete = limit == None or len(data_dict['IDs']) < limit
+            await asyncio.to_thread(self.__index.store, data_dict, complete)
+        return data_dict
+
+    async def __get_file_link(self, file_name, file_url):
+        # the pdf link of a medicine webpage, the page is read only until the link is found
+        async with self.__get(file_url) as response:
+            if response.status != HTTPStatus.OK: return None
+
+            scanner = sf.FileLinkScanner(file_name)
+            async for chunk in response.content.iter_chunked(self.__chunk_size):
+                if scanner.feed(chunk): break
+            href = scanner.result()
+
+            # read the rest of a short page so that the connection goes back to the pool
+            if href != None and response.content_length != None and \
+                    response.content_length - response.content.total_bytes <= sf.DRAIN_LIMIT:
+                await response.read()
+
+        return urljoin(sf.base_url, href) if href != None else None
+
+    async def __dwn_pdf_file(self, ID, name, pdf_link, dwn_path):
+        # stream the pdf file to a temporary file which replaces the final file once complete
+        async with self.__get(pdf_link, kind = 'pdf') as response:
+            if response.status != HTTPStatus.OK: return (ID, name, "Inaccessible link for pdf file")
+
+            file_path = str(os.path.join(dwn_path, pdf_link.split('/')[-1]))
+            directory, file_name = os.path.split(file_path)
+            fd, temp_path = tempfile.mkstemp(dir = directory, prefix = '.' + file_name + '.', suffix = '.part')
+            try:
+                with os.fdopen(fd, mode = 'wb') as fh:
+                    async for chunk in response.content.iter_chunked(self.__chunk_size): fh.write(chunk)
+                    fh.flush()
+                    await asyncio.to_thread(os.fsync, fh.fileno())
+                os.replace(temp_path, file_path)
+            except BaseException:
+                if os.path.exists(temp_path): os.remove(temp_path)
+                raise
+        return None
+
+    async def __process_row(self, ID, name, link, downloads_path):
+        # see ScrapingFunctions.process_row
+        try:
+            pdf_link = await self.__get_file_link(name, link)
+        except Exception:
+            pdf_link = None
+        if pdf_link == None: return False, (ID, name, "Inaccessible or incorrect web page")
+
+        try:
+            return True, await self.__dwn_pdf_file(ID, name, pdf_link, downloads_path)
+        except Exception:
+            return True, (ID, name, "Incorrect link for pdf file")
+
+    async def __dwn_process(self, data_dict, limit = None, path = None):
+        # see ScrapingFunctions.dwn_process: the rows needed to reach the limit are processed concurrently
+        downloads_path = await asyncio.to_thread(sf.get_downloading_path, path)
+        rows = list(zip(data_dict['IDs'], data_dict['Names'], data_dict['Links']))
+
+        unretrieved_list = [] # for unretrieved files
+        counter = 0 # count the number of files succefully downloaded
+        position = 0
+        while position < len(rows) and (limit == None or counter < limit):
+            # the failed webpages do not count, the next rows replace them
+            batch = rows[position:] if limit == None else rows[position:position + limit - counter]
+            position += len(batch)
+            results = await asyncio.gather(*(self.__process_row(ID, name, link, downloads_path)
+                                             for ID, name, link in batch))
+            for resolved, dwn_result in results:
+                if dwn_result != None: unretrieved_list.append(dwn_result)
+                if resolved: counter += 1
+
+        return (unretrieved_list, counter, downloads_path)
+
+    async def fetch_byIDs(self, IDs_list = None, path = None, refresh = False):
+        """
+        Download The detailed advice pdf files for the medicine Identifiers provided.
+
+        Parameters
+        ----------
+        IDs_list : list
+            A list of medicines SMC identifiers .
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+
+        Raises
+        ------
+        ScrapingError
+            If the table Published cannot be retrieved.
+
+        Returns
+        -------
+        fetch_result : Tuple
+            A tuple with the list of unretrieved files details, the downloaded files count\
+                 and the path for the results directory. The IDs not found in the table\
+                 are reported as unretrieved with no name.
+
+        """
+        if IDs_list == None: IDs_list = self.__IDs_list
+        if path == None: path = self.__path
+        if not isinstance(IDs_list, list):
+            raise TypeError(f"A list of IDs is required, got a {type(IDs_list)} instead!")
+
+        self.__start()
+        data_dict = await self.__table_data(refresh = refresh)
+
+        # limit the data dictionary to only medicines whose identifiers are provided in IDs_list
+        wanted = set(IDs_list)
+        new_data_dict = si.to_data_dict(
+            [(position, ID, name, link) for position, (ID, name, link) in \
+             enumerate(zip(data_dict['IDs'], data_dict['Names'], data_dict['Links'])) if ID in wanted])
+
+        unretrieved_list, counter, downloads_path = await self.__dwn_process(new_data_dict, path = path)
+        found_IDs = set(new_data_dict['IDs'])
+        bad_IDs = [(ID, None, "Bad or not found ID") for ID in dict.fromkeys(IDs_list) if ID not in found_IDs]
+        return (bad_IDs + unretrieved_list, counter, downloads_path)
+
+    async def fetch_byNames(self, names_list = None, path = None, refresh = False):
+        """
+        Download The detailed advice pdf files for the medicine names provided.
+        Names are compared ignoring case and repeated spaces.
+
+        Parameters
+        ----------
+        names_list : list
+            A list of medicines names .
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+
+        Raises
+        ------
+        ScrapingError
+            If the table Published cannot be retrieved.
+
+        Returns
+        -------
+        fetch_result : Tuple
+            A tuple with the list of unretrieved files details, the downloaded files count\
+                 and the path for the results directory. The names not found in the table\
+                 are reported as unretrieved with no ID.
+
+        """
+        if names_list == None: names_list = self.__names_list
+        if path == None: path = self.__path
+        if not isinstance(names_list, list):
+            raise TypeError(f"A list of names is required, got a {type(names_list)} instead!")
+
+        self.__start()
+        data_dict = await self.__table_data(refresh = refresh)
+
+        # limit the data dictionary to only medicines whose names are provided in names_list
+        wanted = set(si.normalize_name(name) for name in names_list)
+        new_data_dict = si.to_data_dict(
+            [(position, ID, name, link) for position, (ID, name, link) in \
+             enumerate(zip(data_dict['IDs'], data_dict['Names'], data_dict['Links'])) \
+             if si.normalize_name(name) in wanted])
+
+        unretrieved_list, counter, downloads_path = await self.__dwn_process(new_data_dict, path = path)
+        found_names = set(si.normalize_name(name) for name in new_data_dict['Names'])
+        bad_names = [(None, name, "Wrong or missing name") for name in dict.fromkeys(names_list)
+                     if si.normalize_name(name) not in found_names]
+        return (bad_names + unretrieved_list, counter, downloads_path)
+
+    async def fetch_all(self, limit = None, path = None, refresh = False):
+        """
+        Download all detailed advice pdf files. If a limit is provided,
+        the first n files will be downloaded instead.
+
+        Parameters
+        ----------
+        limit : int, optional
+            The number of the first n files to download. The default is None.
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+
+        Raises
+        ------
+        ScrapingError
+            If the table Published cannot be retrieved.
+
+        Returns
+        -------
+        fetch_result : Tuple
+            A tuple with the list of unretrieved files details, the downloaded files count\
+                 and the path for the results directory.
+
+        """
+        if limit == None: limit = self.__limit
+        if path == None: path = self.__path
+
+        self.__start()
+        data_dict = await self.__table_data(limit = limit, refresh = refresh)
+        return await self.__dwn_process(data_dict, limit, path)
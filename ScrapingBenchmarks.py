@@ -0,0 +1,574 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 16:48:31 2026
+
+@author: Hichem Dridi
+
+Benchmarks for the scraping functions, run offline against generated pages.
+Run this module as a script to execute all of them.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import re
+import html
+import glob
+import random
+import multiprocessing
+from contextlib import redirect_stdout
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from pathlib import Path
+import ScrapingFunctions as sf
+import ScrapingClient as sc
+import ScrapingClass as scl
+
+IMPORT_BUDGET_MS = 100 # import time allowed for the package modules
+# dependencies which must only be imported by the code paths using them
+HEAVY_MODULES = ('selenium', 'webdriver_manager', 'bs4', 'requests')
+
+def package_modules():
+    '''
+    Returns the modules imported by the package __init__ when it is loaded,\
+    the lazily imported ones are left out.
+
+    '''
+    import ast
+
+    init_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__init__.py')
+    with open(init_path, encoding = 'utf-8') as fh:
+        tree = ast.parse(fh.read())
+    modules = []
+    for node in tree.body: # only the imports at the top level of the module
+        if isinstance(node, ast.ImportFrom) and node.level == 0: names = [node.module]
+        elif isinstance(node, ast.Import): names = [alias.name for alias in node.names]
+        else: continue
+        modules.extend(name for name in names if name not in modules)
+    return tuple(modules)
+
+# the modules imported by the package __init__
+PACKAGE_MODULES = package_modules()
+
+def make_table_rows(start, stop, base = '/medicines-advice/'):
+    '''
+    Returns the html rows of the table Published for medicines start to stop - 1.
+
+    '''
+    rows = []
+    for number in range(start, stop):
+        link = f'{base}medicine-{number}-full-smc{number}/'
+        rows.append(
+            '<tr>'
+            f'<td class="medicine-advice-table__id-row">SMC{number}</td>'
+            '<td class="medicine-advice-table__medicine-row">'
+            f'<a class="medicine-advice-table__link" href="{link}">Medicine {number} (generic {number})</a></td>'
+            '<td class="medicine-advice-table__date-row">17/10/2022</td>'
+            f'<td class="medicine-advice-table__link-row"><a href="{link}">View</a></td>'
+            '</tr>')
+    return "\n".join(rows)
+
+def make_table_page(rows, max_page = 1, extra = ''):
+    '''
+    Returns a 'Medicines advice' webpage with the given rows in the table Published.
+
+    Parameters
+    ----------
+    rows : str
+        The html rows of the table, see make_table_rows.
+    max_page : int, optional
+        The number of pages announced by the page. The default is 1.
+    extra : str, optional
+        Html added at the end of the body, e.g. a script. The default is ''.
+
+    Returns
+    -------
+    str
+        The webpage.
+
+    '''
+    return f'''<!DOCTYPE html>
+<html><head><title>Medicines advice</title></head>
+<body>
+<div class="tabs__content">
+<table class="medicine-advice-table">
+<thead><tr><th>ID</th><th>Medicine</th><th>Date</th><th></th></tr></thead>
+<tbody id="table-body-0">
+{rows}
+</tbody>
+</table>
+<input type="hidden" id="max-page-0" value="{max_page}">
+<button id="btn-more-0" type="button">Load more</button>
+</div>
+{extra}
+</body></html>'''
+
+def make_medicine_page(number, filler = 200):
+    '''
+    Returns a medicine webpage linking to its detailed advice pdf file.
+
+    Parameters
+    ----------
+    number : int
+        The medicine number, see make_table_rows.
+    filler : int, optional
+        The number of navigation links and paragraphs around the pdf links, sets the page size.\
+        The default is 200, about 60 kB like the real pages.
+
+    Returns
+    -------
+    str
+        The webpage.
+
+    '''
+    navigation = "\n".join(f'<li><a href="/about/page-{i}/">Section {i}</a></li>' for i in range(filler))
+    paragraphs = "\n".join(f'<p>Paragraph {i} of the advice for medicine {number}, with some text.</p>'
+                            for i in range(filler))
+    return f'''<!DOCTYPE html>
+<html><head><title>Medicine {number} (generic {number})</title>
+<meta charset="utf-8"><link rel="stylesheet" href="/css/site.css"></head>
+<body>
+<nav><ul>
+{navigation}
+</ul></nav>
+<main>
+<h1>Medicine {number} (generic {number})</h1>
+<a href="/media/{number}/medicine-{number}-summary.pdf">Public summary</a>
+<a class="button" href="/media/{number}/medicine-{number}-final-october-2022-for-website.pdf">Detailed advice</a>
+{paragraphs}
+</main>
+</body></html>'''
+
+def legacy_file_link(content, file_name):
+    '''
+    Find the pdf link with a full html.parser tree, as get_file_link used to.
+
+    '''
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    if soup.title.string.strip() != file_name: return None
+    return soup.find('a', {'href': re.compile(r'.*for-website\.pdf.*')}).get('href')
+
+# loads the next table page on 'load more' clicks, like the real webpage
+LOAD_MORE_SCRIPT = '''<button id="ccc-dismiss-button" type="button" onclick="this.remove()">Accept</button>
+<script>
+var page = 1;
+document.getElementById("btn-more-0").onclick = function () {
+    page += 1;
+    fetch("?page=" + page).then(function (response) { return response.text(); }).then(function (rows) {
+        document.getElementById("table-body-0").insertAdjacentHTML("beforeend", rows);
+    });
+};
+</script>'''
+
+class LocalSite():
+    """
+    Local HTTP server imitating the 'Medicines advice' website: the table Published with its\
+    'load more' pages, the medicines webpages and synthetic pdf files of a given size.
+    Latency and server errors can be injected to imitate a slow or overloaded website.
+    The pdf files answer conditional and range requests; with bad_ranges the partial responses\
+    start one byte before the requested position, like a misbehaving proxy.
+    """
+    
+    def __init__(self, medicines = 100, pdf_size = 100 * 1024, latency = 0.0, error_rate = 0.0, bad_ranges = False):
+        self.__medicines = medicines
+        self.__pdf_size = pdf_size
+        self.__latency = latency
+        self.__error_rate = error_rate
+        self.__bad_ranges = bad_ranges
+        self.__process = None
+        self.__port = None
+        
+    def __repr__(self):
+        return "LocalSite"
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+    
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.__port}/medicines-advice/'
+    
+    @property
+    def latency(self):
+        return self.__latency
+    
+    @property
+    def error_rate(self):
+        return self.__error_rate
+    
+    @property
+    def medicines(self):
+        return self.__medicines
+    
+    def IDs(self):
+        return [f'SMC{number}' for number in range(1, self.__medicines + 1)]
+    
+    def names(self):
+        return [f'Medicine {number} (generic {number})' for number in range(1, self.__medicines + 1)]
+    
+    def response(self, path, headers = None):
+        '''
+        Returns the status code, response headers and body answering a request path and its headers.
+
+        '''
+        status, content_type, body = self.__content(path)
+        response_headers = {'Content-Type': content_type}
+        if status != 200 or content_type != 'application/pdf': return status, response_headers, body
+        
+        # the pdf files are validated by their ETag and can be requested by range
+        headers = headers if headers != None else {}
+        etag = f'"pdf-{len(body)}"'
+        response_headers.update({'ETag': etag, 'Last-Modified': 'Mon, 17 Oct 2022 09:00:00 GMT'})
+        if headers.get('If-None-Match') == etag: return 304, response_headers, b''
+        match = re.match(r'bytes=(\d+)-$', headers.get('Range') or '')
+        if match and headers.get('If-Range') in (None, etag):
+            start = int(match.group(1))
+            if start >= len(body):
+                response_headers['Content-Range'] = f'bytes */{len(body)}'
+                return 416, response_headers, b''
+            if self.__bad_ranges: start = max(0, start - 1)
+            response_headers['Content-Range'] = f'bytes {start}-{len(body) - 1}/{len(body)}'
+            return 206, response_headers, body[start:]
+        return status, response_headers, body
+    
+    def __content(self, path):
+        # the status code, content type and body of a path
+        parts = urlsplit(path)
+        rows = sf.TABLE_PAGE_ROWS
+        pages = max(1, -(-self.__medicines // rows))
+        
+        if parts.path == '/medicines-advice/':
+            query = parse_qs(parts.query)
+            if 'page' in query:
+                page = int(query['page'][0])
+                if not 1 <= page <= pages: return 404, 'text/html', b''
+                body = make_table_rows((page - 1) * rows + 1, min(self.__medicines, page * rows) + 1)
+            else:
+                body = make_table_page(make_table_rows(1, min(self.__medicines, rows) + 1), pages, LOAD_MORE_SCRIPT)
+            return 200, 'text/html; charset=utf-8', body.encode('utf-8')
+        
+        match = re.match(r'/medicines-advice/medicine-(\d+)-full-smc\d+/$', parts.path)
+        if match and 1 <= int(match.group(1)) <= self.__medicines:
+            return 200, 'text/html; charset=utf-8', make_medicine_page(int(match.group(1))).encode('utf-8')
+        
+        if re.match(r'/media/\d+/[\w-]+\.pdf$', parts.path):
+            header = b'%PDF-1.4\n% synthetic detailed advice\n'
+            return 200, 'application/pdf', header + b'0' * max(0, self.__pdf_size - len(header))
+        
+        return 404, 'text/html', b''
+    
+    def start(self):
+        '''
+        Start serving on a free local port, in a separate process so that the server does not\
+        compete with the scraper for the interpreter or count in its memory.
+
+        '''
+        ready = multiprocessing.Queue()
+        self.__process = multiprocessing.Process(target = serve_site, args = (self, ready), daemon = True)
+        self.__process.start()
+        self.__port = ready.get(timeout = 30)
+    
+    def stop(self):
+        '''
+        Stop serving.
+
+        '''
+        self.__process.terminate()
+        self.__process.join()
+
+def serve_site(site, ready):
+    '''
+    Serve a LocalSite forever, the port is put in the ready queue once listening.
+
+    '''
+    latency, error_rate = site.latency, site.error_rate
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' # keep-alive, like the real website
+        disable_nagle_algorithm = True # headers and body are sent separately
+        
+        def do_GET(self):
+            if latency: time.sleep(latency)
+            if random.random() < error_rate:
+                status, headers, body = 503, {'Content-Type': 'text/html'}, b''
+            else:
+                status, headers, body = site.response(self.path, self.headers)
+            self.send_response(status)
+            for header, value in headers.items(): self.send_header(header, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+def peak_rss_mb():
+    '''
+    Returns the peak resident memory of the process in MB, None where the module resource\
+    is not available (Windows).
+
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+def timed(func, *args, repeat = 3, **kwargs):
+    '''
+    Returns the best wall time of a number of calls and the result of the last call.
+
+    '''
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best: best = elapsed
+    return best, result
+
+def bench_table_extraction(rows = 5000, repeat = 3):
+    '''
+    Compare the extraction methods of extract_table_rows on a large table loaded in a browser.
+
+    Parameters
+    ----------
+    rows : int, optional
+        The number of rows of the table. The default is 5000.
+    repeat : int, optional
+        The number of runs per method, the best one is kept. The default is 3.
+
+    Returns
+    -------
+    results : dict
+        The best time in seconds per method.
+
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        page_path = os.path.join(directory, 'medicines-advice.html')
+        with open(page_path, mode = 'w', encoding = 'utf-8') as fh:
+            fh.write(make_table_page(make_table_rows(1, rows + 1)))
+
+        driver = sf.driver_provider.acquire()
+        if driver == None: raise RuntimeError("No browser available for the benchmark")
+        try:
+            driver.get(Path(page_path).as_uri())
+            results, outputs = {}, {}
+            for method in ('elements', 'source', 'script'):
+                # the per element method costs a round trip per cell, once is enough
+                runs = 1 if method == 'elements' else repeat
+                results[method], outputs[method] = timed(sf.extract_table_rows, driver, method, repeat = runs)
+        finally:
+            sf.driver_provider.release(driver)
+
+    print(f'Table extraction, {rows} rows:')
+    for method, elapsed in results.items():
+        identical = outputs[method] == outputs['elements']
+        print(f'  {method:<9}{elapsed:9.3f} s  {rows / elapsed:10.0f} rows/s  identical output: {identical}')
+    return results
+
+def bench_file_link_parsing(pages = 200, pages_dir = None, repeat = 3):
+    '''
+    Compare the CPU cost per medicine webpage of the former full parsing and of find_file_link.
+
+    Parameters
+    ----------
+    pages : int, optional
+        The number of generated pages. The default is 200.
+    pages_dir : str, optional
+        A directory of saved medicine webpages (*.html) used instead of generated pages.
+    repeat : int, optional
+        The number of runs per approach, the best one is kept. The default is 3.
+
+    Returns
+    -------
+    results : dict
+        The best CPU time in milliseconds per page for each approach.
+
+    '''
+    if pages_dir != None:
+        contents = []
+        for page_path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+            with open(page_path, mode = 'rb') as fh: contents.append(fh.read())
+    else:
+        contents = [make_medicine_page(number).encode('utf-8') for number in range(1, pages + 1)]
+    if not contents: raise ValueError(f"No medicine webpage found in {pages_dir}")
+    
+    # the expected names are the titles of the pages
+    names = [html.unescape(sf.TITLE_PATTERN.search(content).group(1).decode('utf-8')).strip()
+             for content in contents]
+    chunk_size = sf.DEFAULT_CHUNK_SIZE
+    approaches = {
+        'legacy': lambda content, name: legacy_file_link(content, name),
+        'fast': lambda content, name: sf.find_file_link(
+            (content[i:i + chunk_size] for i in range(0, len(content), chunk_size)), name),
+        }
+    
+    results, outputs = {}, {}
+    for approach, find in approaches.items():
+        best = None
+        for _ in range(repeat):
+            start = time.process_time()
+            outputs[approach] = [find(content, name) for content, name in zip(contents, names)]
+            elapsed = time.process_time() - start
+            if best == None or elapsed < best: best = elapsed
+        results[approach] = best * 1000 / len(contents)
+    
+    print(f'Medicine webpage parsing, {len(contents)} pages:')
+    for approach, per_page in results.items():
+        identical = outputs[approach] == outputs['legacy']
+        print(f'  {approach:<7}{per_page:9.3f} ms CPU per page  identical output: {identical}')
+    return results
+
+def bench_end_to_end(sizes = (100, 1000, 10000), pdf_size = 20 * 1024, latency = 0.0, error_rate = 0.0,
+                     workers = None, sample = 200, targets = 50, quiet = True):
+    '''
+    Time the scraping functions and the fetch methods against a LocalSite of each size.
+
+    Parameters
+    ----------
+    sizes : tuple, optional
+        The numbers of medicines of the local sites. The default is (100, 1000, 10000).
+    pdf_size : int, optional
+        The size of the pdf files in bytes. The default is 20 kB.
+    latency : float, optional
+        The delay added to every response in seconds. The default is 0.
+    error_rate : float, optional
+        The share of requests answered with a 503 error. The default is 0.
+    workers : int, optional
+        The number of medicines processed concurrently. If None the default value is used.
+    sample : int, optional
+        The number of medicines used to time get_file_link and dwn_pdf_file. The default is 200.
+    targets : int, optional
+        The number of medicines requested by fetch_byIDs and fetch_byNames. The default is 50.
+    quiet : bool, optional
+        If True the messages printed by the scraper are hidden. The default is True.
+
+    Returns
+    -------
+    results : list
+        A dictionnary of measures per size and stage.
+
+    '''
+    results = []
+    previous_url = sf.url
+    
+    def measure(medicines, stage, func, rows = 0, files = 0, nbytes = 0):
+        output = open(os.devnull, 'w') if quiet else sys.stdout
+        try:
+            with redirect_stdout(output):
+                start = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - start
+        finally:
+            if quiet: output.close()
+        results.append({"medicines": medicines, "stage": stage, "seconds": elapsed,
+                        "rows/s": rows / elapsed, "files/s": files / elapsed,
+                        "MB/s": nbytes / 1e6 / elapsed, "peak RSS MB": peak_rss_mb()})
+    
+    try:
+        for medicines in sizes:
+            with LocalSite(medicines, pdf_size, latency, error_rate) as site, \
+                    tempfile.TemporaryDirectory() as directory:
+                sf.set_url(site.url)
+                # the local site needs no politeness, the requests are not paced by a scheduler
+                client = sc.HttpClient()
+                # the links of the local site must not be cached for the next runs
+                scraper = scl.MedAdvScraper(path = directory, workers = workers, client = client, link_cache = None)
+                
+                data_dict = {}
+                measure(medicines, 'get_table_data', lambda: data_dict.update(sf.get_table_data(client = client)),
+                        rows = medicines)
+                
+                rows = list(zip(data_dict['IDs'], data_dict['Names'], data_dict['Links']))[:sample]
+                pdf_links = []
+                measure(medicines, 'get_file_link', lambda: pdf_links.extend(
+                    sf.get_file_link(ID, name, link, client)['File link'] for ID, name, link in rows), files = len(rows))
+                measure(medicines, 'dwn_pdf_file', lambda: [sf.dwn_pdf_file(ID, name, pdf_link, directory, client)
+                        for (ID, name, _), pdf_link in zip(rows, pdf_links)],
+                        files = len(rows), nbytes = len(rows) * pdf_size)
+                
+                measure(medicines, 'fetch_all', lambda: scraper.fetch_all(),
+                        rows = medicines, files = medicines, nbytes = medicines * pdf_size)
+                # requested medicines spread over the whole table
+                step = max(1, medicines // targets)
+                IDs_list, names_list = site.IDs()[::step][:targets], site.names()[::step][:targets]
+                measure(medicines, 'fetch_byIDs', lambda: scraper.fetch_byIDs(IDs_list), rows = medicines,
+                        files = len(IDs_list), nbytes = len(IDs_list) * pdf_size)
+                measure(medicines, 'fetch_byNames', lambda: scraper.fetch_byNames(names_list), rows = medicines,
+                        files = len(names_list), nbytes = len(names_list) * pdf_size)
+    finally:
+        sf.set_url(previous_url)
+    
+    print(f"End to end benchmark, pdf files of {pdf_size / 1024:.0f} kB, latency {latency} s, "
+          f"error rate {error_rate}:")
+    print(f"  {'medicines':>9}  {'stage':<15}{'seconds':>9}{'rows/s':>10}{'files/s':>9}{'MB/s':>8}{'peak RSS MB':>13}")
+    for result in results:
+        peak = result["peak RSS MB"]
+        print("  {medicines:>9}  {stage:<15}{seconds:>9.2f}{rows/s:>10.0f}{files/s:>9.1f}{MB/s:>8.1f}".format_map(result)
+              + (f"{peak:>13.0f}" if peak != None else f"{'n/a':>13}"))
+    return results
+
+def bench_import_time(budget_ms = IMPORT_BUDGET_MS, repeat = 5):
+    '''
+    Measure the import time of the package with python -X importtime in fresh interpreters.
+
+    Parameters
+    ----------
+    budget_ms : float, optional
+        The import time allowed in milliseconds. The default is IMPORT_BUDGET_MS.
+    repeat : int, optional
+        The number of interpreters started, the best time is kept. The default is 5.
+
+    Raises
+    ------
+    AssertionError
+        If a heavy dependency is imported or the budget is exceeded.
+
+    Returns
+    -------
+    best_ms : float
+        The best import time in milliseconds.
+
+    '''
+    command = [sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(PACKAGE_MODULES)]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    
+    best_ms, heavy_imports = None, set()
+    for _ in range(repeat):
+        output = subprocess.run(command, cwd = directory, capture_output = True, text = True, check = True).stderr
+        total_us = 0
+        # lines are 'import time: self [us] | cumulative | imported package', indented by depth
+        for line in output.splitlines():
+            fields = line.split('|')
+            if len(fields) != 3 or not fields[1].strip().isdigit(): continue
+            name = fields[2].rstrip()
+            if name.strip().split('.')[0] in HEAVY_MODULES: heavy_imports.add(name.strip())
+            if name.strip() in PACKAGE_MODULES and name == ' ' + name.strip(): total_us += int(fields[1])
+        if best_ms == None or total_us / 1000 < best_ms: best_ms = total_us / 1000
+    
+    print(f'Package import time: {best_ms:.1f} ms (budget {budget_ms} ms)')
+    assert not heavy_imports, 'Heavy dependencies imported eagerly: ' + ', '.join(sorted(heavy_imports))
+    assert best_ms <= budget_ms, f'Import time {best_ms:.1f} ms exceeds the budget of {budget_ms} ms'
+    return best_ms
+
+if __name__ == '__main__':
+    bench_import_time()
+    bench_file_link_parsing()
+    bench_end_to_end()
+    bench_table_extraction()
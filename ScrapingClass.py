@@ -5,7 +5,15 @@ Created on Mon Oct 17 18:30:38 2022
 @author: Hichem Dridi
 """
 import ScrapingFunctions as sf
-import sys
+import ScrapingIndex as si
+import ScrapingStorage as ss
+import ScrapingExtract as se
+import ScrapingSearch as ssr
+import ScrapingMetrics as sm
+import os
+import re
+import itertools
+from contextlib import closing
 
 class MedAdvScraper():
     """
@@ -14,11 +22,27 @@ class MedAdvScraper():
     The webpage link is then parsed to download the detailed advice pdf file.
     """
     
-    def __init__(self, IDs_list = None, names_list = None, limit = None, path = None):
+    def __init__(self, IDs_list = None, names_list = None, limit = None, path = None, workers = None,
+                 client = None, chunk_size = None, sync = False, keep_driver = False,
+                 index = None, extract = False, dedup = False, archive = None, shard_size = None,
+                 link_cache = True):
         self.__IDs_list = IDs_list
         self.__names_list = names_list
         self.__limit = limit
         self.__path = path
+        self.__workers = workers
+        self.__client = client # HTTP client, the default shared client if None
+        self.__chunk_size = chunk_size # bytes written at a time when downloading a file
+        self.__sync = sync # download only the files which changed since the last run
+        self.__keep_driver = keep_driver # keep the browser alive between calls
+        self.__index = index # ScrapingIndex.TableIndex answering for the table while it is fresh
+        self.__extract = extract # extract the text and metadata of the files downloaded
+        self.__dedup = dedup # store each distinct file once, by content hash
+        self.__archive = archive # 'zip' or 'tar' to stream the files into rolling archive shards
+        self.__shard_size = shard_size # maximum size of an archive shard in bytes
+        # ScrapingStorage.LinkCache of the pdf links, True for the file of the downloading directory, None without
+        self.__link_cache = link_cache
+        self.__metrics = sm.Metrics() # sinks of the fetch calls, each call records its events apart
         
     def __repr__(self):
         return "MedicinesAdviceScraper"
@@ -35,7 +59,7 @@ class MedAdvScraper():
         return self.__names_list
     
     @names_list.setter
-    def limit(self, names_list):
+    def names_list(self, names_list):
         self.__names_list = names_list
         
     @property
@@ -54,10 +78,237 @@ class MedAdvScraper():
     def path(self, path):
         self.__path = path
         
+    @property
+    def workers(self):
+        return self.__workers
+    
+    @workers.setter
+    def workers(self, workers):
+        self.__workers = workers
+        
+    @property
+    def client(self):
+        return self.__client
+    
+    @client.setter
+    def client(self, client):
+        self.__client = client
+        
+    @property
+    def chunk_size(self):
+        return self.__chunk_size
+    
+    @chunk_size.setter
+    def chunk_size(self, chunk_size):
+        self.__chunk_size = chunk_size
+        
+    @property
+    def sync(self):
+        return self.__sync
+    
+    @sync.setter
+    def sync(self, sync):
+        self.__sync = sync
+        
+    @property
+    def keep_driver(self):
+        return self.__keep_driver
+    
+    @keep_driver.setter
+    def keep_driver(self, keep_driver):
+        self.__keep_driver = keep_driver
+        
+    @property
+    def index(self):
+        return self.__index
+    
+    @index.setter
+    def index(self, index):
+        self.__index = index
+        
+    @property
+    def extract(self):
+        return self.__extract
+    
+    @extract.setter
+    def extract(self, extract):
+        self.__extract = extract
+        
+    @property
+    def dedup(self):
+        return self.__dedup
+    
+    @dedup.setter
+    def dedup(self, dedup):
+        self.__dedup = dedup
+        
+    @property
+    def archive(self):
+        return self.__archive
+    
+    @archive.setter
+    def archive(self, archive):
+        self.__archive = archive
+        
+    @property
+    def shard_size(self):
+        return self.__shard_size
+    
+    @shard_size.setter
+    def shard_size(self, shard_size):
+        self.__shard_size = shard_size
+        
+    @property
+    def metrics(self):
+        # the sinks added with metrics.add_sink receive the events of the next fetch calls, see sf.fetch_call
+        return self.__metrics
+    
+    @property
+    def link_cache(self):
+        # the pdf links found in the medicines webpages, see ScrapingStorage.LinkCache
+        return self.__link_cache
+    
+    @link_cache.setter
+    def link_cache(self, link_cache):
+        self.__link_cache = link_cache
+    
+    def close(self):
+        """
+        Quit the browser kept alive between calls, if there is any.
+
+        """
+        sf.driver_provider.close()
+        
+    def __fresh_index(self, limit = None, refresh = False):
+        # the table index if it can answer instead of the website
+        if self.__index == None or refresh or not self.__index.is_fresh(limit): return None
+        print('Using the table index ' + self.__index.db_path)
+        return self.__index
+    
+    def __table_data(self, limit = None, metrics = None):
+        # get the data from table Published and keep a copy in the index
+        data_dict = sf.get_table_data(limit = limit, client = self.__client, keep_driver = self.__keep_driver,
+                                      metrics = metrics)
+        if data_dict != None and self.__index != None:
+            self.__index.store(data_dict, complete = limit == None or len(data_dict['IDs']) < limit)
+        return data_dict
+        
+    def __table_rows(self, limit = None, metrics = None):
+        # generate the rows of the table Published and keep a copy in the index once all are loaded
+        data_dict = {"IDs": [], "Names": [], "Links": []}
+        for ID, name, link in sf.iter_table_rows(limit = limit, client = self.__client,
+                                                 keep_driver = self.__keep_driver, metrics = metrics):
+            if self.__index != None:
+                for key, value in zip(("IDs", "Names", "Links"), (ID, name, link)): data_dict[key].append(value)
+            yield ID, name, link
+        if self.__index != None:
+            self.__index.store(data_dict, complete = limit == None or len(data_dict['IDs']) < limit)
+        
+    def __dwn_options(self, workers, metrics):
+        # keyword arguments shared by all the calls to dwn_process
+        return {"workers": workers, "client": self.__client, "chunk_size": self.__chunk_size,
+                "sync": self.__sync, "extract": self.__extract, "dedup": self.__dedup,
+                "archive": self.__archive, "shard_size": self.__shard_size, "link_cache": self.__link_cache,
+                "metrics": metrics}
+        
+    def __fetch(self, IDs_list, names_list, name_pattern, limit, path, workers, refresh, metrics):
+        # one query for the IDs, names and pattern: the matching rows are downloaded while the table loads
+        for values in (IDs_list, names_list):
+            if values != None and isinstance(values, str):
+                raise TypeError(f"A list of IDs or names is required, got a {type(values)} instead!")
+        if path == None: path = self.__path
+        if workers == None: workers = self.__workers
+        
+        IDs_set = set(IDs_list) if IDs_list != None else set()
+        names_set = set(si.normalize_name(name) for name in names_list) if names_list != None else set()
+        pattern = re.compile(name_pattern, re.IGNORECASE) if name_pattern != None else None
+        filtered = IDs_list != None or names_list != None or pattern != None
+        found_IDs, found_names = set(), set()
+        
+        def matching(rows):
+            try:
+                for ID, name, link in rows:
+                    normalized = si.normalize_name(name)
+                    if not filtered or ID in IDs_set or normalized in names_set or \
+                            (pattern != None and pattern.search(name) != None):
+                        found_IDs.add(ID)
+                        found_names.add(normalized)
+                        yield ID, name, link
+                    # without a pattern, the table is read only until all the IDs and names are found
+                    if filtered and pattern == None and IDs_set <= found_IDs and names_set <= found_names: return
+            finally:
+                # stop loading the table
+                if hasattr(rows, 'close'): rows.close()
+        
+        # get the rows from the index, or download while the table Published is loading
+        index = self.__fresh_index(limit = None if filtered else limit, refresh = refresh)
+        if index != None:
+            # the IDs and names are looked up in the index, only a pattern needs all the rows
+            if not filtered: data_dict = index.data_dict(limit)
+            elif pattern == None: data_dict = index.lookup(IDs_list, names_list)
+            else: data_dict = index.data_dict(None)
+            rows = matching(zip(data_dict['IDs'], data_dict['Names'], data_dict['Links']))
+            fetch_result = sf.dwn_rows(rows, limit, path, **self.__dwn_options(workers, metrics))
+        else:
+            rows = matching(self.__table_rows(None if filtered else limit, metrics))
+            fetch_result = sf.crawl_process(limit, path, rows = rows, **self.__dwn_options(workers, metrics))
+        
+        # flag the IDs and names not found, unless the limit stopped the query first
+        if fetch_result != None and (limit == None or fetch_result[1] < limit):
+            bad_IDs = sorted(IDs_set - found_IDs)
+            if bad_IDs:
+                print("Bad or not found IDs:")
+                print("\n".join(bad_IDs))
+            bad_names = [name for name in names_list or [] if si.normalize_name(name) not in found_names]
+            if bad_names:
+                print("wrong or missing names:")
+                print("\n".join(bad_names))
+        
+        return fetch_result
+    
     @sf.fetch_call
-    def fetch_byIDs(self, IDs_list = None, path = None):
+    def fetch(self, IDs_list = None, names_list = None, name_pattern = None, limit = None, path = None,
+              workers = None, refresh = False, metrics = None):
         """
-        Download The detailed advice pdf files for the medicine Identifiers provided.
+        Download the detailed advice pdf files of the medicines matching any of the IDs, names or\
+        name pattern provided, with a single pass over the table Published, or over the index while\
+        it is fresh. Without a pattern the table is read only until all the IDs and names are found,\
+        so a name matches its most recent advice. Without any criterion all the files are downloaded.
+
+        Parameters
+        ----------
+        IDs_list : list, optional
+            A list of medicines SMC identifiers.
+        names_list : list, optional
+            A list of medicines names, compared ignoring case and repeated spaces.
+        name_pattern : str, optional
+            A regular expression searched in the medicines names, ignoring case.
+        limit : int, optional
+            The maximum number of files to download. The default is None.
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        workers : int, optional
+            The number of medicines processed concurrently. If None a default value will be used.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+        metrics : ScrapingMetrics.Metrics, optional
+            The timers and counters of the call. If None a new one is created, see sf.fetch_call.
+
+        Returns
+        -------
+        fetch_result : Tuple or None
+            A tuple with the list of unretrieved files details, the downloaded files count\
+                 and the path for the results directory. None if parsing method failed.
+
+        """
+        if limit == None: limit = self.__limit
+        
+        return self.__fetch(IDs_list, names_list, name_pattern, limit, path, workers, refresh, metrics)
+    
+    @sf.fetch_call
+    def fetch_byIDs(self, IDs_list = None, path = None, workers = None, refresh = False, metrics = None):
+        """
+        Download The detailed advice pdf files for the medicine Identifiers provided, see fetch.
 
         Parameters
         ----------
@@ -65,6 +316,12 @@ class MedAdvScraper():
             A list of medicines SMC identifiers .
         path : str, optional
             The path for downloading directory. If None a default path will be used.
+        workers : int, optional
+            The number of medicines processed concurrently. If None a default value will be used.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+        metrics : ScrapingMetrics.Metrics, optional
+            The timers and counters of the call. If None a new one is created, see sf.fetch_call.
 
         Returns
         -------
@@ -74,41 +331,18 @@ class MedAdvScraper():
 
         """
         if IDs_list == None: IDs_list = self.__IDs_list
-        if path == None: path = self.__path
         
         # ensure that IDs_list is a of type list
         if not isinstance(IDs_list, list):
             raise TypeError(f"A list of IDs is required, got a {type(IDs_list)} instead!")
-            sys.exit()
-            
-        # get the data from table Published
-        data_dict = sf.get_table_data()
-        
-        # if the scraping method failed
-        if data_dict == None: fetch_result = None
-        else: 
-            # limit the data dictionary to only medicines whose identifiers are provided in IDs_list
-            new_data_dict = {
-                "IDs": [ID for ID in data_dict['IDs'] if ID in IDs_list],
-                "Names": [name for ID, name in zip(data_dict['IDs'], data_dict['Names']) if ID in IDs_list],
-                "Links": [link for ID, link in zip(data_dict['IDs'], data_dict['Links']) if ID in IDs_list]
-                }
             
-            # flag bad IDs
-            bad_IDs = list(set(IDs_list) - set(new_data_dict['IDs']))
-            if bad_IDs:
-                print("Bad or not found IDs:")
-                print("\n".join(bad_IDs))
-                
-                
-            fetch_result = sf.dwn_process(new_data_dict, path)
-                
-        return fetch_result
+        return self.__fetch(IDs_list, None, None, None, path, workers, refresh, metrics)
     
     @sf.fetch_call
-    def fetch_byNames(self, names_list = None, path = None):
+    def fetch_byNames(self, names_list = None, path = None, workers = None, refresh = False, metrics = None):
         """
-        Download The detailed advice pdf files for the medicine Identifiers provided.
+        Download The detailed advice pdf files for the medicine names provided, compared ignoring case\
+        and repeated spaces, see fetch.
 
         Parameters
         ----------
@@ -116,6 +350,12 @@ class MedAdvScraper():
             A list of medicines names .
         path : str, optional
             The path for downloading directory. If None a default path will be used.
+        workers : int, optional
+            The number of medicines processed concurrently. If None a default value will be used.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+        metrics : ScrapingMetrics.Metrics, optional
+            The timers and counters of the call. If None a new one is created, see sf.fetch_call.
 
         Returns
         -------
@@ -125,39 +365,15 @@ class MedAdvScraper():
 
         """
         if names_list == None: names_list = self.__names_list
-        if path == None: path = self.__path
         
         # ensure that names_list is a of type list
         if not isinstance(names_list, list):
             raise TypeError(f"A list of names is required, got a {type(names_list)} instead!")
-            sys.exit()
-            
-        # get the data from table Published
-        data_dict = sf.get_table_data()
-        
-        # if the scraping method failed
-        if data_dict == None: fetch_result = None
-        else: 
-            # limit the data dictionary to only medicines whose names are provided in names_list
-            new_data_dict = {
-                "IDs": [ID for ID, name in zip(data_dict['IDs'], data_dict['Names']) if name in names_list],
-                "Names": [name for name in data_dict['Names'] if name in names_list],
-                "Links": [link for link, name in zip(data_dict['Links'], data_dict['Names']) if name in names_list]
-                }
             
-            # flag bad names
-            bad_names = list(set(names_list) - set(new_data_dict['Names']))
-            if bad_names:
-                print("wrong or missing names:")
-                print("\n".join(bad_names))
-                
-                
-            fetch_result = sf.dwn_process(new_data_dict, path)
-                
-        return fetch_result
+        return self.__fetch(None, names_list, None, None, path, workers, refresh, metrics)
         
     @sf.fetch_call
-    def fetch_all(self, limit = None, path = None):
+    def fetch_all(self, limit = None, path = None, workers = None, refresh = False, metrics = None):
         """
         Download all detailed advice pdf files. If a limit is provided, 
         the first n files will be downloaded instead.
@@ -168,6 +384,12 @@ class MedAdvScraper():
             The number of the first n files to download. The default is None.
         path : str, optional
             The path for downloading directory. If None a default path will be used.
+        workers : int, optional
+            The number of medicines processed concurrently. If None a default value will be used.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+        metrics : ScrapingMetrics.Metrics, optional
+            The timers and counters of the call. If None a new one is created, see sf.fetch_call.
 
         Returns
         -------
@@ -178,12 +400,276 @@ class MedAdvScraper():
         """
         if limit == None: limit = self.__limit
         if path == None: path = self.__path
+        if workers == None: workers = self.__workers
         
-        # get the data from table Published
-        data_dict = sf.get_table_data(limit = limit)
-        
-        # if the scraping method failed
-        if data_dict == None: fetch_result = None
-        else: fetch_result = sf.dwn_process(data_dict, limit, path)
+        # get the data from the index, or download while the table Published is loading
+        index = self.__fresh_index(limit = limit, refresh = refresh)
+        if index != None:
+            fetch_result = sf.dwn_process(index.data_dict(limit), limit, path,
+                                          **self.__dwn_options(workers, metrics))
+        else:
+            fetch_result = sf.crawl_process(limit, path, rows = self.__table_rows(limit, metrics),
+                                            **self.__dwn_options(workers, metrics))
                 
-        return fetch_result
\ No newline at end of file
+        return fetch_result
+    
+    @sf.fetch_call
+    def fetch_new(self, limit = None, path = None, workers = None, known_path = None, metrics = None):
+        """
+        Download only the detailed advice pdf files published since the last call: the table is read\
+        until the first medicine already downloaded, so a call without new advice loads a single page.
+        The first call downloads the whole table, or its first n files if a limit is provided.
+
+        Parameters
+        ----------
+        limit : int, optional
+            The maximum number of files to download. The default is None.
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        workers : int, optional
+            The number of medicines processed concurrently. If None a default value will be used.
+        known_path : str, optional
+            The file keeping the IDs already downloaded. If None the file of the downloading directory is used.
+        metrics : ScrapingMetrics.Metrics, optional
+            The timers and counters of the call. If None a new one is created, see sf.fetch_call.
+
+        Returns
+        -------
+        fetch_result : Tuple or None
+            A tuple with the list of unretrieved files details, the downloaded files count\
+                 and the path for the results directory. None if parsing method failed.
+
+        """
+        if limit == None: limit = self.__limit
+        if path == None: path = self.__path
+        if workers == None: workers = self.__workers
+        
+        if known_path == None: known_path = str(os.path.join(sf.get_downloading_path(path), ss.KNOWN_IDS_NAME))
+        known = ss.KnownIDs(known_path)
+        print(f'{len(known)} medicines already downloaded, see {known.path}')
+        return sf.crawl_process(limit, path, keep_driver = self.__keep_driver, known = known,
+                                **self.__dwn_options(workers, metrics))
+    
+    @sf.fetch_call
+    def fetch_sharded(self, limit = None, path = None, processes = None, queue_path = None, refresh = False,
+                      metrics = None):
+        """
+        Download all detailed advice pdf files with several worker processes sharing a durable work queue,\
+        see ScrapingQueue.sharded_process. An interrupted call is resumed by the next call with the same queue.
+        Each worker process creates its own HTTP client with the settings of the scraper client,\
+        and reads and saves the link cache of the scraper, see ScrapingQueue.run_worker.
+        The workers download plain files only: the manifest, refs, extracts and archive index of a directory\
+        are written by a single process.
+
+        Parameters
+        ----------
+        limit : int, optional
+            The number of the first n files to download. The default is None.
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        processes : int, optional
+            The number of worker processes. If None the number of CPUs is used.
+        queue_path : str, optional
+            The path of the queue database. If None it is stored in the downloading directory.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+        metrics : ScrapingMetrics.Metrics, optional
+            The timers and counters of the call. If None a new one is created, see sf.fetch_call.
+
+        Raises
+        ------
+        ValueError
+            If the scraper syncs, extracts, deduplicates or archives the files.
+
+        Returns
+        -------
+        fetch_result : Tuple or None
+            A tuple with the list of unretrieved files details, the downloaded files count\
+                 and the path for the results directory. None if parsing method failed.
+
+        """
+        import ScrapingQueue as sq
+        
+        options = [name for name, enabled in (("sync", self.__sync), ("extract", self.__extract),
+                                              ("dedup", self.__dedup), ("archive", self.__archive != None))
+                   if enabled]
+        if options:
+            raise ValueError(f"The sharded download does not support the options: {', '.join(options)}!")
+        
+        if limit == None: limit = self.__limit
+        if path == None: path = self.__path
+        
+        # get the data from the index or the table Published
+        index = self.__fresh_index(limit = limit, refresh = refresh)
+        data_dict = index.data_dict(limit) if index != None else self.__table_data(limit, metrics)
+        if data_dict == None: return None
+        
+        return sq.sharded_process(data_dict, path, processes, self.__workers, queue_path,
+                                  chunk_size = self.__chunk_size, client = self.__client,
+                                  link_cache = self.__link_cache)
+    
+    @sf.fetch_call
+    def retry_failed(self, path = None, workers = None, force = False, metrics = None):
+        """
+        Download again only the medicines which failed in the previous calls, from the failures\
+        store of the downloading directory, without loading the table. A medicine is retried once\
+        its backoff delay has passed, which doubles at each failure, see ScrapingStorage.FailureStore.
+
+        Parameters
+        ----------
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        workers : int, optional
+            The number of medicines processed concurrently. If None a default value will be used.
+        force : bool, optional
+            If True all the failures are retried, even those whose backoff delay has not passed yet.
+        metrics : ScrapingMetrics.Metrics, optional
+            The timers and counters of the call. If None a new one is created, see sf.fetch_call.
+
+        Returns
+        -------
+        fetch_result : Tuple or None
+            A tuple with the list of unretrieved files details, the downloaded files count\
+                 and the path for the results directory. None if parsing method failed.
+
+        """
+        if path == None: path = self.__path
+        if workers == None: workers = self.__workers
+        
+        downloads_path = sf.get_downloading_path(path)
+        failures = ss.FailureStore(str(os.path.join(downloads_path, ss.FAILURES_NAME)))
+        rows = failures.due(force = force)
+        print(f'{len(rows)} of the {len(failures)} failed medicines are due for a retry')
+        return sf.dwn_rows(rows, None, path, **self.__dwn_options(workers, metrics))
+    
+    def update_search_index(self, path = None, refresh = False):
+        """
+        Add the documents extracted in the downloading directory to its search index,\
+        only those which changed since they were indexed. See MedAdvScraper.extract.
+
+        Parameters
+        ----------
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        refresh : bool, optional
+            If True the table is scraped again for the names even if the index is fresh. The default is False.
+
+        Returns
+        -------
+        int
+            The number of documents added.
+
+        """
+        if path == None: path = self.__path
+        
+        downloads_path = sf.get_downloading_path(path)
+        # the medicines names come from the table Published
+        index = self.__fresh_index(refresh = refresh)
+        data_dict = index.data_dict() if index != None else self.__table_data()
+        names = dict(zip(data_dict['IDs'], data_dict['Names'])) if data_dict != None else {}
+        
+        store = se.ExtractStore(os.path.join(downloads_path, se.EXTRACTS_NAME))
+        with ssr.SearchIndex(os.path.join(downloads_path, ssr.SEARCH_DIR_NAME)) as search_index:
+            return ssr.update_index(search_index, store, names)
+    
+    def search(self, terms, path = None):
+        """
+        Search the documents downloaded and extracted for terms.
+
+        Parameters
+        ----------
+        terms : str or list
+            The searched terms, compared ignoring case. The medicines names and IDs are searchable too.
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+
+        Returns
+        -------
+        list
+            The SMC IDs of the medicines whose document contain all the terms.
+
+        """
+        if path == None: path = self.__path
+        
+        downloads_path = sf.get_downloading_path(path)
+        with ssr.SearchIndex(os.path.join(downloads_path, ssr.SEARCH_DIR_NAME)) as search_index:
+            return search_index.search(terms)
+    
+    def iter_medicines(self, limit = None, refresh = False):
+        """
+        Generate the medicines of the table Published as they are loaded, from the index if it is fresh.
+
+        Parameters
+        ----------
+        limit : int, optional
+            The number of first medicines to generate. The default is None.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+
+        Yields
+        ------
+        record : ScrapingFunctions.MedicineRecord
+            A medicine with its ID, name and webpage link.
+
+        """
+        if limit == None: limit = self.__limit
+        
+        index = self.__fresh_index(limit = limit, refresh = refresh)
+        if index != None:
+            data_dict = index.data_dict(limit)
+            rows = zip(data_dict['IDs'], data_dict['Names'], data_dict['Links'])
+            for ID, name, link in rows: yield sf.MedicineRecord(ID, name, link)
+            return
+        
+        # the table is loaded by whole pages, the rows after the limit are not generated
+        with closing(self.__table_rows(limit)) as table_rows:
+            rows = itertools.islice(table_rows, limit) if limit != None else table_rows
+            for ID, name, link in rows: yield sf.MedicineRecord(ID, name, link)
+    
+    def iter_downloads(self, IDs_list = None, names_list = None, limit = None, path = None, workers = None,
+                       refresh = False):
+        """
+        Download detailed advice pdf files and generate the record of each medicine as soon as it is processed.
+        The table is read while the files are downloading, and nothing is kept once generated.
+
+        Parameters
+        ----------
+        IDs_list : list, optional
+            Download only the medicines with these SMC identifiers.
+        names_list : list, optional
+            Download only the medicines with these names, compared ignoring case and repeated spaces.
+        limit : int, optional
+            The number of files to download. The default is None.
+        path : str, optional
+            The path for downloading directory. If None a default path will be used.
+        workers : int, optional
+            The number of medicines processed concurrently. If None a default value will be used.
+        refresh : bool, optional
+            If True the table is scraped again even if the index is fresh. The default is False.
+
+        Yields
+        ------
+        record : ScrapingFunctions.MedicineRecord
+            A medicine with its pdf link, the status of the download and the bytes downloaded.
+
+        """
+        if limit == None: limit = self.__limit
+        if path == None: path = self.__path
+        if workers == None: workers = self.__workers
+        
+        IDs_set = set(IDs_list) if IDs_list != None else None
+        names_set = set(si.normalize_name(name) for name in names_list) if names_list != None else None
+        # without a filter, only the first rows of the table are needed
+        filtered = IDs_set != None or names_set != None
+        
+        rows = ((record.id, record.name, record.link)
+                for record in self.iter_medicines(limit = None if filtered else limit, refresh = refresh)
+                if (IDs_set == None or record.id in IDs_set) and
+                (names_set == None or si.normalize_name(record.name) in names_set))
+        
+        downloads_path = sf.get_downloading_path(path)
+        # the table keeps loading in the background while the files are downloading
+        with closing(sf.iter_in_background(rows)) as background_rows:
+            yield from sf.iter_records(background_rows, limit, downloads_path, workers, self.__client,
+                                       self.__chunk_size, self.__sync, self.__dedup, self.__archive,
+                                       self.__shard_size, self.__link_cache)
@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 09:12:20 2026
+
+@author: Hichem Dridi
+"""
+
+import threading
+import time
+import random
+import weakref
+# requests is slow to import, it is imported when a client is created
+
+DEFAULT_POOL_SIZE = 16 # maximum number of connections kept alive per host
+DEFAULT_CONNECT_TIMEOUT = 5 # seconds
+DEFAULT_READ_TIMEOUT = 30 # seconds
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5 # seconds, doubled after each failed attempt
+MAX_BACKOFF = 30 # seconds
+
+# responses worth another attempt: rate limiting and server side errors
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# responses telling the client to slow down
+THROTTLE_STATUSES = frozenset([429, 503])
+
+# politeness budgets of the scheduler: requests per second and concurrent requests, at start and at most
+HTML_BUDGET = {"rate": 10.0, "max_rate": 50.0, "concurrency": 8, "max_concurrency": 32, "target_latency": 2.0}
+PDF_BUDGET = {"rate": 5.0, "max_rate": 20.0, "concurrency": 4, "max_concurrency": 16, "target_latency": 5.0}
+MIN_RATE = 0.5 # requests per second, the rate is never decreased below
+RATE_INCREASE = 1.0 # requests per second added for about a second of successful requests
+RATE_DECREASE = 0.5 # factor applied to the rate and concurrency on congestion
+DECREASE_INTERVAL = 1.0 # seconds between two decreases, so a burst of signals counts once
+
+class HttpClient():
+    """
+    Pooled HTTP client shared by all the network calls of the scraper.
+    Connections are kept alive between requests, every request has connect/read timeouts\
+    and failed requests (connection errors, 429 and 5xx responses) are retried with exponential backoff.
+    """
+
+    def __init__(self, pool_size = DEFAULT_POOL_SIZE, connect_timeout = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout = DEFAULT_READ_TIMEOUT, retries = DEFAULT_RETRIES, backoff = DEFAULT_BACKOFF,
+                 headers = None, scheduler = None):
+        self.__timeout = (connect_timeout, read_timeout)
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__scheduler = scheduler # paces the requests if provided
+        self.__settings = {"pool_size": pool_size, "connect_timeout": connect_timeout, "read_timeout": read_timeout,
+                           "retries": retries, "backoff": backoff, "headers": dict(headers) if headers != None else None}
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # the adapter keeps a pool of reusable connections; retries are handled by get
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size, max_retries = 0)
+        self.__session = requests.Session()
+        self.__session.mount('https://', adapter)
+        self.__session.mount('http://', adapter)
+        if headers != None: self.__session.headers.update(headers)
+
+    def __repr__(self):
+        return "HttpClient"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def timeout(self):
+        return self.__timeout
+
+    @property
+    def retries(self):
+        return self.__retries
+    
+    @property
+    def scheduler(self):
+        return self.__scheduler
+
+    @property
+    def settings(self):
+        '''
+        The arguments the client was created with, a scheduler is given as True,\
+        to create a similar client in another process, see client_from_settings.
+
+        '''
+        return dict(self.__settings, scheduler = self.__scheduler != None)
+
+    def backoff_delay(self, attempt):
+        '''
+        Returns the waiting time before a new attempt, with a random jitter.
+
+        Parameters
+        ----------
+        attempt : int
+            The number of the failed attempt, starting from 0.
+
+        Returns
+        -------
+        float
+            The delay in seconds.
+
+        '''
+        delay = min(MAX_BACKOFF, self.__backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1)
+
+    def get(self, link, kind = 'html', **kwargs):
+        '''
+        Send a GET request through the pooled session, retrying transient failures.
+
+        Parameters
+        ----------
+        link : str
+            The requested url.
+        kind : str, optional
+            The scheduler budget of the request, 'html' for web pages or 'pdf' for files.\
+            The default is 'html'.
+        **kwargs :
+            Keyword arguments passed to requests.Session.get. The client timeouts\
+            are used if no timeout is given.
+
+        Raises
+        ------
+        requests.ConnectionError, requests.Timeout
+            If the request still fails after the last attempt.
+
+        Returns
+        -------
+        response : requests.Response
+            The last response received.
+
+        '''
+        import requests
+
+        kwargs.setdefault('timeout', self.__timeout)
+
+        for attempt in range(self.__retries + 1):
+            last_attempt = attempt == self.__retries
+            if self.__scheduler != None: start = self.__scheduler.acquire(kind)
+            try:
+                response = self.__session.get(link, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if self.__scheduler != None: self.__scheduler.release(kind, start)
+                if last_attempt: raise
+                delay = self.backoff_delay(attempt)
+            except BaseException:
+                # e.g. an invalid url, which says nothing about the server
+                if self.__scheduler != None: self.__scheduler.cancel(kind)
+                raise
+            else:
+                # the server may tell how long to wait
+                delay = retry_after(response) if response.status_code in RETRY_STATUSES else None
+                if last_attempt or response.status_code not in RETRY_STATUSES:
+                    if self.__scheduler != None:
+                        if kwargs.get('stream'): self.__hold_slot(response, kind, start, delay)
+                        else: self.__scheduler.release(kind, start, response.status_code, delay)
+                    return response
+                if self.__scheduler != None: self.__scheduler.release(kind, start, response.status_code, delay)
+                if delay == None: delay = self.backoff_delay(attempt)
+                response.close() # release the connection to the pool
+            time.sleep(delay)
+
+    def __hold_slot(self, response, kind, start, delay):
+        # the body of a streamed response is still to be transferred: the slot of the scheduler is released\
+        # once it is read to the end or the response is closed, so the latency covers the whole transfer
+        scheduler, status, released = self.__scheduler, response.status_code, []
+
+        def release():
+            if not released:
+                released.append(True)
+                scheduler.release(kind, start, status, delay)
+
+        iter_content, close = response.iter_content, response.close
+
+        def iter_content_held(*args, **kwargs):
+            yield from iter_content(*args, **kwargs)
+            release()
+
+        def close_held():
+            try:
+                close()
+            finally:
+                release()
+
+        response.iter_content, response.close = iter_content_held, close_held
+        # a response dropped without being read or closed frees its slot when collected
+        weakref.finalize(response, release)
+
+    def close(self):
+        '''
+        Close the pooled connections.
+
+        '''
+        self.__session.close()
+
+def retry_after(response):
+    '''
+    Returns the delay requested by the Retry-After header of a response.
+
+    Parameters
+    ----------
+    response : requests.Response
+        The response to check.
+
+    Returns
+    -------
+    float or None
+        The delay in seconds, None if the header is missing or invalid.
+
+    '''
+    from email.utils import parsedate_to_datetime
+
+    value = response.headers.get('Retry-After')
+    if value == None: return None
+
+    # the header is either a number of seconds or an HTTP date
+    try:
+        return min(MAX_BACKOFF, max(0.0, float(value)))
+    except ValueError:
+        pass
+    try:
+        return min(MAX_BACKOFF, max(0.0, parsedate_to_datetime(value).timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket():
+    """
+    Thread safe token bucket: tokens are added at rate per second, up to burst tokens,\
+    and each request takes one.
+    """
+
+    def __init__(self, rate, burst = None):
+        self.__lock = threading.Lock()
+        self.__rate = rate
+        self.__burst = burst if burst != None else max(1.0, rate)
+        self.__tokens = self.__burst
+        self.__updated = time.monotonic()
+
+    def __repr__(self):
+        return "TokenBucket"
+
+    @property
+    def rate(self):
+        return self.__rate
+
+    @rate.setter
+    def rate(self, rate):
+        with self.__lock:
+            self.__refill()
+            self.__rate = rate
+
+    def __refill(self):
+        now = time.monotonic()
+        self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated) * self.__rate)
+        self.__updated = now
+
+    def take(self):
+        '''
+        Take a token, waiting for it if the bucket is empty.
+
+        '''
+        while True:
+            with self.__lock:
+                self.__refill()
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.__rate
+            time.sleep(wait)
+
+class RequestBudget():
+    """
+    Rate and concurrency budget of a kind of requests, adjusted by AIMD: both grow slowly while the\
+    requests succeed fast and are halved when the server answers slowly or asks to slow down.
+    """
+
+    def __init__(self, rate, max_rate, concurrency, max_concurrency, target_latency):
+        self.__bucket = TokenBucket(rate)
+        self.__max_rate = max_rate
+        self.__concurrency = float(concurrency)
+        self.__max_concurrency = max_concurrency
+        self.__target_latency = target_latency
+        self.__condition = threading.Condition()
+        self.__in_flight = 0
+        self.__paused_until = 0.0 # monotonic time before which no request is sent
+        self.__last_decrease = 0.0
+        self.__requests = 0
+        self.__throttled = 0
+        self.__latency = None # moving average of the response latency
+
+    def __repr__(self):
+        return "RequestBudget"
+
+    def acquire(self):
+        '''
+        Wait for a free slot, the end of a pause and a token. Returns the start time of the request.
+
+        '''
+        with self.__condition:
+            while True:
+                pause = self.__paused_until - time.monotonic()
+                if pause > 0: self.__condition.wait(pause)
+                elif self.__in_flight >= int(self.__concurrency): self.__condition.wait()
+                else: break
+            self.__in_flight += 1
+        try:
+            self.__bucket.take()
+        except BaseException:
+            self.cancel()
+            raise
+        return time.monotonic()
+
+    def cancel(self):
+        '''
+        Free the slot of a request which was not sent, without adjusting the budget.
+
+        '''
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__condition.notify_all()
+
+    def release(self, start, status = None, delay = None):
+        '''
+        Free the slot of a request and adjust the budget to its outcome.
+
+        Parameters
+        ----------
+        start : float
+            The start time returned by acquire.
+        status : int, optional
+            The status code of the response, None if no response was received.
+        delay : float, optional
+            The delay asked by a Retry-After header.
+
+        '''
+        latency = time.monotonic() - start
+        with self.__condition:
+            self.__requests += 1
+            self.__latency = latency if self.__latency == None else 0.8 * self.__latency + 0.2 * latency
+            if status in THROTTLE_STATUSES:
+                self.__throttled += 1
+                # pause all the requests of the budget as the server asked
+                if delay != None: self.__paused_until = max(self.__paused_until, time.monotonic() + delay)
+            if status == None or status in RETRY_STATUSES or latency > self.__target_latency: self.__decrease()
+            else:
+                # additive increase: about RATE_INCREASE more per second of successful requests
+                self.__bucket.rate = min(self.__max_rate, self.__bucket.rate + RATE_INCREASE / self.__bucket.rate)
+                self.__concurrency = min(self.__max_concurrency, self.__concurrency + 1 / self.__concurrency)
+            self.__in_flight -= 1
+            self.__condition.notify_all()
+
+    def __decrease(self):
+        # multiplicative decrease, once per interval
+        now = time.monotonic()
+        if now - self.__last_decrease < DECREASE_INTERVAL: return
+        self.__last_decrease = now
+        self.__bucket.rate = max(MIN_RATE, self.__bucket.rate * RATE_DECREASE)
+        self.__concurrency = max(1.0, self.__concurrency * RATE_DECREASE)
+
+    def stats(self):
+        '''
+        Returns the live rate, concurrency and counters of the budget.
+
+        '''
+        with self.__condition:
+            return {"rate": self.__bucket.rate, "concurrency": int(self.__concurrency),
+                    "in_flight": self.__in_flight, "requests": self.__requests, "throttled": self.__throttled,
+                    "latency": self.__latency, "paused": max(0.0, self.__paused_until - time.monotonic())}
+
+class AdaptiveScheduler():
+    """
+    Politeness scheduler shared by the requests of a client, with separate budgets for the web pages\
+    ('html') and the pdf files ('pdf'). See RequestBudget.
+    """
+
+    def __init__(self, html_budget = None, pdf_budget = None):
+        self.__budgets = {"html": RequestBudget(**(html_budget if html_budget != None else HTML_BUDGET)),
+                          "pdf": RequestBudget(**(pdf_budget if pdf_budget != None else PDF_BUDGET))}
+
+    def __repr__(self):
+        return "AdaptiveScheduler"
+
+    def budget(self, kind):
+        '''
+        Returns the budget of a kind of requests, 'html' or 'pdf'.
+
+        '''
+        try:
+            return self.__budgets[kind]
+        except KeyError:
+            raise ValueError(f"Unknown kind of request: {kind}") from None
+
+    def acquire(self, kind):
+        '''
+        Wait until a request of a kind can be sent. Returns its start time, see RequestBudget.acquire.
+
+        '''
+        return self.budget(kind).acquire()
+
+    def release(self, kind, start, status = None, delay = None):
+        '''
+        Report the outcome of a request, see RequestBudget.release.
+
+        '''
+        self.budget(kind).release(start, status, delay)
+
+    def cancel(self, kind):
+        '''
+        Free the slot of a request which was not sent, see RequestBudget.cancel.
+
+        '''
+        self.budget(kind).cancel()
+
+    def stats(self):
+        '''
+        Returns the live rate, concurrency and counters of each budget.
+
+        '''
+        return {kind: budget.stats() for kind, budget in self.__budgets.items()}
+
+class TransferMeter():
+    """
+    Thread safe counter of the bytes transferred and files skipped, used to report the downloading rate.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__bytes = 0
+        self.__skipped = 0
+        self.__start = time.monotonic()
+
+    def __repr__(self):
+        return "TransferMeter"
+
+    def add(self, nbytes):
+        '''
+        Count a number of bytes transferred.
+
+        Parameters
+        ----------
+        nbytes : int
+            The number of bytes.
+
+        '''
+        with self.__lock:
+            self.__bytes += nbytes
+
+    def skip(self):
+        '''
+        Count a file which did not need to be transferred.
+
+        '''
+        with self.__lock:
+            self.__skipped += 1
+
+    @property
+    def bytes(self):
+        return self.__bytes
+
+    @property
+    def skipped(self):
+        return self.__skipped
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.__start
+
+    @property
+    def rate(self):
+        # bytes per second since the meter was created
+        elapsed = self.elapsed
+        return self.__bytes / elapsed if elapsed > 0 else 0.0
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    '''
+    Returns the HTTP client shared by the scraping functions, created on first use.
+    Its requests are paced by an AdaptiveScheduler.
+
+    Returns
+    -------
+    HttpClient
+        The default client.
+
+    '''
+    global _default_client
+    with _default_client_lock:
+        if _default_client == None: _default_client = HttpClient(scheduler = AdaptiveScheduler())
+    return _default_client
+
+def client_from_settings(settings):
+    '''
+    Returns a new client created with the settings of another one, see HttpClient.settings.
+    The sessions and the schedulers cannot be shared between processes: the new client has its own,\
+    with the default budgets if the other client was paced.
+
+    '''
+    settings = dict(settings)
+    scheduler = AdaptiveScheduler() if settings.pop('scheduler', False) else None
+    return HttpClient(scheduler = scheduler, **settings)
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:17:46 2026
+
+@author: Hichem Dridi
+"""
+
+import os
+import re
+import json
+import zlib
+import sqlite3
+import hashlib
+import threading
+import functools
+import importlib.util
+from contextlib import closing, contextmanager
+# pypdf is an optional dependency, it is imported by the extracting processes;
+# multiprocessing is slow to import, it is imported when an extractor is created
+
+EXTRACTS_NAME = '.extracts.sqlite'
+HASH_CHUNK_SIZE = 1024 * 1024 # bytes read at a time when hashing a pdf file
+
+STATUS_EXTRACTED = "extracted"
+STATUS_UNCHANGED = "unchanged" # same file as the last extraction
+
+# the decision of the advice, the most specific first
+DECISION_PATTERN = re.compile(r'accepted for restricted use|accepted for use|not recommended for use|'
+                              r'not recommended', re.IGNORECASE)
+SMC_ID_PATTERN = re.compile(r'\bSMC\s?(\d{2,5})\b')
+
+def file_sha256(file_path):
+    '''
+    Returns the sha256 hash of a file, read by chunks.
+
+    '''
+    sha256 = hashlib.sha256()
+    with open(file_path, mode = 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''): sha256.update(chunk)
+    return sha256.hexdigest()
+
+def advice_metadata(text):
+    '''
+    Returns the advice metadata found in the text of a detailed advice document:\
+    the decision and the SMC ID, None for those not found.
+
+    '''
+    decision = DECISION_PATTERN.search(text)
+    smc_id = SMC_ID_PATTERN.search(text)
+    return {"decision": decision.group(0).lower() if decision != None else None,
+            "smc_id": "SMC" + smc_id.group(1) if smc_id != None else None}
+
+def extract_pdf(file_path, known_sha256 = None):
+    '''
+    Extract the text, the page count and the metadata of a pdf file. Runs in a worker process.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the pdf file.
+    known_sha256 : str, optional
+        The hash of the file at the last extraction, the file is not read again if it is unchanged.
+
+    Returns
+    -------
+    dict or None
+        The file hash, page count, document and advice metadata and text.\
+        None if the file is unchanged.
+
+    '''
+    sha256 = file_sha256(file_path)
+    if sha256 == known_sha256: return None
+
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    text = "\n".join(page.extract_text() or "" for page in reader.pages)
+    info = reader.metadata or {}
+    metadata = {key.lstrip('/').lower(): str(value) for key, value in info.items()}
+    metadata.update(advice_metadata(text))
+    return {"sha256": sha256, "pages": len(reader.pages), "metadata": metadata, "text": text}
+
+class ExtractStore():
+    """
+    Compact SQLite store of the text and metadata extracted from the pdf files, keyed by medicine SMC ID.
+    The text is kept compressed.
+    """
+
+    def __init__(self, db_path):
+        self.__db_path = db_path
+        with self.__connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS extracts (
+                    id TEXT PRIMARY KEY,
+                    file TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    pages INTEGER NOT NULL,
+                    metadata TEXT NOT NULL,
+                    text BLOB NOT NULL)""")
+
+    def __repr__(self):
+        return "ExtractStore"
+
+    @contextmanager
+    def __connect(self):
+        # a connection per call, results are stored from the pool threads; committed and closed on exit
+        with closing(sqlite3.connect(self.__db_path, timeout = 30)) as connection, connection:
+            yield connection
+
+    @property
+    def db_path(self):
+        return self.__db_path
+
+    def __len__(self):
+        with self.__connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM extracts").fetchone()[0]
+
+    def sha256(self, ID):
+        '''
+        Returns the hash of the file of a medicine at its last extraction, None if it was never extracted.
+
+        '''
+        with self.__connect() as connection:
+            row = connection.execute("SELECT sha256 FROM extracts WHERE id = ?", (ID,)).fetchone()
+        return row[0] if row != None else None
+
+    def put(self, ID, file_name, extract):
+        '''
+        Store the extract of a medicine pdf file, see extract_pdf.
+
+        '''
+        with self.__connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO extracts VALUES (?, ?, ?, ?, ?, ?)",
+                               (ID, file_name, extract["sha256"], extract["pages"], json.dumps(extract["metadata"]),
+                                zlib.compress(extract["text"].encode('utf-8'))))
+
+    def hashes(self):
+        '''
+        Returns the hash of the file extracted for each medicine SMC ID.
+
+        '''
+        with self.__connect() as connection:
+            return dict(connection.execute("SELECT id, sha256 FROM extracts").fetchall())
+
+    def get(self, ID):
+        '''
+        Returns the extract of a medicine pdf file, None if it was never extracted.
+
+        Returns
+        -------
+        dict or None
+            The file name, hash, page count, metadata and text.
+
+        '''
+        with self.__connect() as connection:
+            row = connection.execute("SELECT file, sha256, pages, metadata, text FROM extracts WHERE id = ?",
+                                     (ID,)).fetchone()
+        if row == None: return None
+        return {"file": row[0], "sha256": row[1], "pages": row[2], "metadata": json.loads(row[3]),
+                "text": zlib.decompress(row[4]).decode('utf-8')}
+
+class PdfExtractor():
+    """
+    Post-download stage extracting the text and metadata of the pdf files in a pool of processes.
+    Each file is submitted as soon as it is downloaded and its extract is stored in an ExtractStore\
+    as soon as it is returned, so the texts are not kept in memory; the files unchanged since their\
+    last extraction are skipped.
+    """
+
+    def __init__(self, downloads_path, processes = None, db_path = None):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        
+        if importlib.util.find_spec('pypdf') == None:
+            raise ImportError("The pdf extraction requires pypdf: pip install pypdf")
+        if db_path == None: db_path = str(os.path.join(downloads_path, EXTRACTS_NAME))
+        self.__store = ExtractStore(db_path)
+        # spawned processes do not inherit the threads and locks of the downloading process
+        self.__executor = ProcessPoolExecutor(max_workers = processes,
+                                              mp_context = multiprocessing.get_context('spawn'))
+        self.__condition = threading.Condition()
+        self.__pending = {} # ID -> future of the extractions not stored yet
+        self.__status_dict = {} # ID -> extraction status of the extractions stored
+
+    def __repr__(self):
+        return "PdfExtractor"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def store(self):
+        return self.__store
+
+    def submit(self, ID, file_path):
+        '''
+        Extract a downloaded pdf file in the background.
+
+        Parameters
+        ----------
+        ID : str
+            The medicine SMC ID.
+        file_path : str
+            The path of the pdf file.
+
+        '''
+        future = self.__executor.submit(extract_pdf, file_path, self.__store.sha256(ID))
+        with self.__condition:
+            self.__pending[ID] = future
+        future.add_done_callback(functools.partial(self.__store_extract, ID, os.path.basename(file_path)))
+
+    def __store_extract(self, ID, file_name, future):
+        # called by the pool when an extraction completes, the future is not kept once its extract is stored
+        if future.cancelled():
+            status = 'Extraction cancelled'
+        else:
+            try:
+                extract = future.result()
+                if extract == None:
+                    status = STATUS_UNCHANGED
+                else:
+                    self.__store.put(ID, file_name, extract)
+                    status = STATUS_EXTRACTED
+            except Exception as e:
+                status = 'Extraction failed: {}, {}'.format(type(e).__name__, str(e))
+        with self.__condition:
+            if self.__pending.get(ID) is future: del self.__pending[ID]
+            self.__status_dict[ID] = status
+            self.__condition.notify_all()
+
+    def wait(self):
+        '''
+        Wait until the extracts of the files submitted are stored.
+
+        Returns
+        -------
+        status_dict : dict
+            The extraction status of each medicine SMC ID: STATUS_EXTRACTED, STATUS_UNCHANGED\
+            or the failure message.
+
+        '''
+        with self.__condition:
+            while self.__pending: self.__condition.wait()
+            status_dict, self.__status_dict = self.__status_dict, {}
+        return status_dict
+
+    def close(self):
+        '''
+        Stop the extracting processes, the files not extracted yet are abandoned.
+
+        '''
+        self.__executor.shutdown(wait = True, cancel_futures = True)
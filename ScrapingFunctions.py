@@ -5,27 +5,67 @@ Created on Thu Oct 13 14:06:41 2022
 @author: Hichem Dridi
 """
 
+# selenium, webdriver_manager, requests and bs4 are slow to import: they are imported
+# by the functions using them, so that importing the package stays cheap
 import functools
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.firefox.service import Service as FirefoxService
-from selenium.webdriver.edge.service import Service as EdgeService
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.firefox import GeckoDriverManager
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
-from selenium.common.exceptions import SessionNotCreatedException, NoSuchElementException
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait as wait
+import importlib
 import sys
-import time
 import os
+import tempfile
 from pathlib import Path
-import requests
-from bs4 import BeautifulSoup
+from http import HTTPStatus
+import html
 import re
+import ScrapingClient as sc
+import ScrapingStorage as ss
+import ScrapingMetrics as sm
+import ScrapingExtract as se
+import ScrapingSearch as ssr
+import hashlib
+import math
+import itertools
+import queue
+from contextlib import closing
+import json
+import atexit
+import threading
+from urllib.parse import urljoin
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 url = 'https://www.scottishmedicines.org.uk/medicines-advice/'
+# the website root, pdf links in the medicines webpages are relative to it
+base_url = re.findall('(^https?.*)/medicines', url)[0]
+# the 'Published' table page requested by the button 'load more', page numbers start at 1
+table_page_url = url + '?page={page}'
+TABLE_PAGE_ROWS = 20 # rows added to the table by each page
+
+# patterns finding the title and the detailed advice pdf link in the raw medicine webpage
+TITLE_PATTERN = re.compile(rb'<title[^>]*>(.*?)</title', re.IGNORECASE | re.DOTALL)
+PDF_HREF_PATTERN = re.compile(rb'<a\s[^>]*?href\s*=\s*["\']([^"\']*for-website\.pdf[^"\']*)["\']', re.IGNORECASE)
+PDF_LINK_PATTERN = re.compile(r'.*for-website\.pdf.*')
+DRAIN_LIMIT = 256 * 1024 # bytes still read after the pdf link to keep the connection alive
+
+DEFAULT_WORKERS = 8 # number of medicines processed concurrently by dwn_process
+DEFAULT_CHUNK_SIZE = 64 * 1024 # bytes written at a time when downloading a pdf file
+
+# timers and counters of the scraping functions called without the metrics of a run, see fetch_call
+default_metrics = sm.Metrics()
+
+def set_url(new_url):
+    '''
+    Point the scraping functions at another 'Medicines advice' webpage, e.g. a local copy.
+
+    Parameters
+    ----------
+    new_url : str
+        The url of the 'Medicines advice' webpage, ending with /medicines-advice/.
+
+    '''
+    global url, base_url, table_page_url
+    url = new_url
+    base_url = re.findall('(^https?.*)/medicines', url)[0]
+    table_page_url = url + '?page={page}'
 
 def get_WebDriver(func):
     '''
@@ -43,10 +83,12 @@ def get_WebDriver(func):
 
     '''
     @functools.wraps(func)
-    def wrapper_get_driver():
+    def wrapper_get_driver(*args, **kwargs):
+        from selenium.common.exceptions import SessionNotCreatedException
+        
         driver = None
         try:
-            driver = func()
+            driver = func(*args, **kwargs)
         except SessionNotCreatedException as e:
             print('Fail! Code: {}, {}'.format(type(e).__name__, str(e)))
         except Exception as e:
@@ -56,64 +98,243 @@ def get_WebDriver(func):
     return wrapper_get_driver
 
 @get_WebDriver
-def get_ChromeDriver():
+def get_ChromeDriver(driver_path = None):
     '''
     Returns a selenium driver object for Chrome
 
+    Parameters
+    ----------
+    driver_path : str, optional
+        The path to the driver binary. If None the driver is installed with webdriver_manager.
+
     Returns
     -------
     driver : selenium.webdriver.chrome.webdriver.WebDriver
 
     '''
-    print("Trying to install a driver for Chrome. Please wait...")
+
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
     
     # create selenium driver object for Chrome
     opts = webdriver.ChromeOptions()
     opts.headless = True # prevent the browser from running in the background
     
-    service = ChromeService(ChromeDriverManager().install()) # Selenium requires a driver to interface with the chosen browser.
+    # Selenium requires a driver to interface with the chosen browser.
+    if driver_path == None: driver_path = install_driver("Chrome")
+    service = ChromeService(driver_path)
     driver = webdriver.Chrome(service = service, options=opts)
     
     return driver
 
 @get_WebDriver
-def get_FirefoxDriver():
+def get_FirefoxDriver(driver_path = None):
     '''
     Returns a selenium driver object for Firefox
 
+    Parameters
+    ----------
+    driver_path : str, optional
+        The path to the driver binary. If None the driver is installed with webdriver_manager.
+
     Returns
     -------
     driver : selenium.webdriver.firefox.webdriver.WebDriver
 
     '''
-    print("Trying to install a driver for Firefox. Please wait...")
+
+    from selenium import webdriver
+    from selenium.webdriver.firefox.service import Service as FirefoxService
     
     opts = webdriver.FirefoxOptions()
     opts.headless = True
     
-    service = FirefoxService(GeckoDriverManager().install())
+    if driver_path == None: driver_path = install_driver("Firefox")
+    service = FirefoxService(driver_path)
     driver = webdriver.Firefox(service = service, options=opts)
     return driver
 
 @get_WebDriver
-def get_EdgeDriver():
+def get_EdgeDriver(driver_path = None):
     '''
     Returns a selenium driver object for Edge
 
+    Parameters
+    ----------
+    driver_path : str, optional
+        The path to the driver binary. If None the driver is installed with webdriver_manager.
+
     Returns
     -------
     driver : selenium.webdriver.Edge.webdriver.WebDriver
 
     '''
-    print("Trying to install a driver for Edge. Please wait...")
+
+    from selenium import webdriver
+    from selenium.webdriver.edge.service import Service as EdgeService
     
     opts = webdriver.EdgeOptions()
     opts.headless = True
     
-    service = EdgeService(EdgeChromiumDriverManager().install())
+    if driver_path == None: driver_path = install_driver("Edge")
+    service = EdgeService(driver_path)
     driver = webdriver.Edge(service = service, options=opts)
     return driver
 
+# webdriver_manager modules and classes installing the driver of each browser, in the order they are tried
+DRIVER_MANAGERS = {"Chrome": ("webdriver_manager.chrome", "ChromeDriverManager"),
+                   "Firefox": ("webdriver_manager.firefox", "GeckoDriverManager"),
+                   "Edge": ("webdriver_manager.microsoft", "EdgeChromiumDriverManager")}
+# the browser which worked last and the path to its driver, shared between runs
+DRIVER_CACHE = str(os.path.join(Path.home(), '.cache', 'medicines-advice', 'webdriver.json'))
+
+def install_driver(browser):
+    '''
+    Install the driver of a browser with webdriver_manager and return its path.
+
+    Parameters
+    ----------
+    browser : str
+        One of the keys of DRIVER_MANAGERS.
+
+    Returns
+    -------
+    str
+        The path to the driver binary.
+
+    '''
+    print(f"Trying to install a driver for {browser}. Please wait...")
+    module_name, class_name = DRIVER_MANAGERS[browser]
+    return getattr(importlib.import_module(module_name), class_name)().install()
+
+class DriverProvider():
+    """
+    Provides selenium drivers, trying the browsers lazily one after the other.
+    The browser which worked and the path to its driver are cached on disk, so the next runs\
+    start it directly without webdriver_manager. With keep_alive the driver is not quit after use\
+    and the next request in the process gets it warm.
+    """
+    
+    def __init__(self, cache_path = DRIVER_CACHE):
+        self.__cache_path = cache_path
+        self.__lock = threading.Lock()
+        self.__warm_driver = None # idle driver kept alive between calls
+        self.__cache = None
+        
+    def __repr__(self):
+        return "DriverProvider"
+    
+    @property
+    def browser(self):
+        return self.__load_cache().get("browser")
+    
+    def __load_cache(self):
+        if self.__cache == None:
+            self.__cache = {}
+            try:
+                with open(self.__cache_path, encoding = 'utf-8') as fh:
+                    self.__cache = json.load(fh)
+            except (OSError, ValueError):
+                pass
+        return self.__cache
+    
+    def __save_cache(self, browser, driver_path):
+        self.__cache = {"browser": browser, "driver_path": driver_path}
+        try:
+            os.makedirs(os.path.dirname(self.__cache_path), exist_ok = True)
+            ss.write_json(self.__cache_path, self.__cache)
+        except OSError as e:
+            print('Unable to cache the driver path! Code: {}, {}'.format(type(e).__name__, str(e)))
+    
+    def __start(self):
+        cache = self.__load_cache()
+        # try the browser which worked last time first
+        browsers = sorted(DRIVER_MANAGERS, key = lambda browser: browser != cache.get("browser"))
+        factories = {"Chrome": get_ChromeDriver, "Firefox": get_FirefoxDriver, "Edge": get_EdgeDriver}
+        
+        for browser in browsers:
+            driver = None
+            driver_path = cache.get("driver_path") if browser == cache.get("browser") else None
+            # start the cached driver, it may have been removed or outdated by a browser update
+            if driver_path != None and os.path.exists(driver_path):
+                driver = factories[browser](driver_path)
+            if driver == None:
+                try:
+                    driver_path = install_driver(browser)
+                except Exception as e:
+                    print('Fail! Code: {}, {}'.format(type(e).__name__, str(e)))
+                    continue
+                driver = factories[browser](driver_path)
+            if driver != None:
+                if browser != cache.get("browser") or driver_path != cache.get("driver_path"):
+                    self.__save_cache(browser, driver_path)
+                return driver
+        
+        return None
+    
+    def acquire(self, metrics = None):
+        '''
+        Returns a driver, the warm one if there is any.
+
+        Parameters
+        ----------
+        metrics : ScrapingMetrics.Metrics, optional
+            Records the startup of a new driver. If None default_metrics is used.
+
+        Returns
+        -------
+        selenium.webdriver or None
+            None if none of the browsers can be started.
+
+        '''
+        with self.__lock:
+            driver, self.__warm_driver = self.__warm_driver, None
+        
+        if driver != None:
+            try:
+                driver.current_url # check that the session is still alive
+                return driver
+            except Exception:
+                driver = None
+        
+        if metrics == None: metrics = default_metrics
+        with metrics.timer('driver_startup') as event:
+            driver = self.__start()
+            event['browser'] = self.__load_cache().get("browser") if driver != None else None
+        return driver
+    
+    def release(self, driver, keep_alive = False):
+        '''
+        Quit a driver, or keep it for the next call.
+
+        Parameters
+        ----------
+        driver : selenium.webdriver
+            A driver returned by acquire.
+        keep_alive : bool, optional
+            If True the driver is kept warm for the next call. The default is False.
+
+        '''
+        if keep_alive:
+            with self.__lock:
+                if self.__warm_driver == None:
+                    self.__warm_driver = driver
+                    return
+        driver.quit() # end The WebDriver session
+    
+    def close(self):
+        '''
+        Quit the warm driver if there is any.
+
+        '''
+        with self.__lock:
+            driver, self.__warm_driver = self.__warm_driver, None
+        if driver != None: driver.quit()
+
+# the provider shared by the scraping functions
+driver_provider = DriverProvider()
+atexit.register(driver_provider.close)
+
 def parse_url(func):
     '''
     Function to parse a webpage using selenium webdriver.
@@ -127,14 +348,17 @@ def parse_url(func):
     -------
     dictionnary or None
         Dictionnary of data retrieved or None if the scrapping method failed.
+        
+    The wrapped function accepts a keep_driver keyword: if True the driver is kept\
+    alive for the next call instead of being quit, and a metrics keyword passed to func.
 
     '''
     @functools.wraps(func)
-    def wrapper_parse_url(*args, **kwargs):
+    def wrapper_parse_url(*args, keep_driver = False, metrics = None, **kwargs):
+        from selenium.common.exceptions import NoSuchElementException
+        
         # instantiate the webdriver object
-        for getDriver in [get_ChromeDriver(), get_FirefoxDriver(), get_EdgeDriver()]:
-            driver = getDriver
-            if driver != None: break
+        driver = driver_provider.acquire(metrics)
         
         # exit if the none of the browsers are found
         try:
@@ -147,27 +371,226 @@ def parse_url(func):
         
         # scrap the webpage
         try:
-            data_dict = func(driver, *args, **kwargs)
+            data_dict = func(driver, *args, metrics = metrics, **kwargs)
         except NoSuchElementException:
             # returns None if the scraping failed
             data_dict = None
+        except BaseException:
+            driver_provider.release(driver)
+            raise
         
-        driver.quit() # end The WebDriver session
+        driver_provider.release(driver, keep_alive = keep_driver)
         return data_dict     
     return wrapper_parse_url               
 
-@parse_url
-def get_table_data(driver, limit = None):
+def get_table_data(limit = None, client = None, browserless = True, keep_driver = False, metrics = None):
     '''
-    A function to parse the 'Medecines advice' webpage to retrieve medication IDs,\
-    names and links to the medication webpage from the 'Published' table.
+    Retrieve medication IDs, names and links to the medication webpage from the 'Published' table\
+    of the 'Medecines advice' webpage. The table pages are requested directly over HTTP and\
+    the browser is only started if that fails.
+
+    Parameters
+    ----------
+    limit : int, Optional
+        the number of rows to retrieve from Published table.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client sending the requests. If None the default client is used.
+    browserless : bool, optional
+        If False the browser is used directly. The default is True.
+    keep_driver : bool, optional
+        If True the browser is kept alive for the next call. The default is False.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the page loads. If None default_metrics is used.
+
+    Returns
+    -------
+    data_dict : dict or None
+        A JSON like dictionnary with lists of medication IDs, names and links.
+        None if the scraping method failed.
+
+    '''
+    if browserless:
+        try:
+            return get_table_data_http(limit = limit, client = client, metrics = metrics)
+        except Exception as e:
+            print('Browserless harvesting failed! Code: {}, {}'.format(type(e).__name__, str(e)))
+            print('Falling back to the browser...')
+    
+    return get_table_data_selenium(limit = limit, keep_driver = keep_driver, metrics = metrics)
+
+def parse_table_rows(html, base_url = None):
+    '''
+    Parse the rows of the 'Published' table from a webpage or a table fragment.
+
+    Parameters
+    ----------
+    html : str or bytes
+        The 'Medecines advice' webpage or a fragment with the rows of a table page.
+    base_url : str, optional
+        The url relative links are resolved against. If None the 'Medecines advice' url is used.
+
+    Returns
+    -------
+    data_dict : dict
+        A JSON like dictionnary with lists of medication IDs, names and links.
+
+    '''
+    from bs4 import BeautifulSoup
+    
+    if base_url == None: base_url = url
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # the first table of the tabs is the table Published, a fragment only has rows
+    # texts are read with their whitespace collapsed, as the browser renders them
+    tabs_content = soup.find(class_ = "tabs__content")
+    table_published = tabs_content.find("table") if tabs_content != None else soup
+    
+    data_dict = {
+        "IDs": [" ".join(ID_element.get_text().split()) for ID_element in \
+                table_published.find_all(class_ = "medicine-advice-table__id-row")],
+        "Names": [" ".join(medecine_element.find(class_ = "medicine-advice-table__link").get_text().split())
+                  for medecine_element in table_published.find_all(class_ = "medicine-advice-table__medicine-row")],
+        "Links": [urljoin(base_url, link_element.find('a').get('href')) \
+                  for link_element in table_published.find_all(class_ = "medicine-advice-table__link-row")]
+        }
+    
+    return data_dict
+
+def iter_table_pages_http(limit = None, client = None, workers = None, metrics = None):
+    '''
+    Generate the pages of the 'Published' table without a browser: the first page is parsed\
+    for the number of pages, then the following table pages are requested concurrently and\
+    generated in table order as soon as they are parsed. At most workers pages are requested\
+    ahead of the page being consumed, the next one is requested when a page is consumed.
+
+    Parameters
+    ----------
+    limit : int, Optional
+        the number of rows to retrieve from Published table.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client sending the requests. If None the default client is used.
+    workers : int, optional
+        The number of pages requested ahead. If None DEFAULT_WORKERS is used.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the page loads. If None default_metrics is used.
+
+    Raises
+    ------
+    ValueError
+        If a page is not retrieved or its content is not the expected table.
+
+    Yields
+    ------
+    page_dict : dict
+        A JSON like dictionnary with lists of medication IDs, names and links of a page.
+
+    '''
+    if client == None: client = sc.get_default_client()
+    if workers == None: workers = DEFAULT_WORKERS
+    if metrics == None: metrics = default_metrics
+    
+    print('Collecting data from ' + url)
+    
+    with metrics.timer('page_load', url = url) as event:
+        response = client.get(url)
+        event['status'] = response.status_code
+    if response.status_code != HTTPStatus.OK:
+        raise ValueError(f"Unable to rertieve data from {url}, status code {response.status_code}")
+    
+    totalPages = table_pages_count(response.content, limit)
+    
+    def get_page(page):
+        with metrics.timer('table_page', page = page) as event:
+            page_response = client.get(table_page_url.format(page = page))
+            event['status'] = page_response.status_code
+        if page_response.status_code != HTTPStatus.OK:
+            raise ValueError(f"Unable to rertieve page {page}, status code {page_response.status_code}")
+        return parse_table_rows(page_response.content)
+    
+    executor = ThreadPoolExecutor(max_workers = workers)
+    next_pages = iter(range(2, totalPages + 1))
+    # the pages requested ahead, in table order
+    pending = deque(executor.submit(get_page, page) for page in itertools.islice(next_pages, workers))
+    try:
+        seen_IDs = set()
+        page_dict = parse_table_rows(response.content)
+        for page in range(1, totalPages + 1):
+            if page > 1:
+                page_dict = pending.popleft().result()
+                # a page is consumed: the next one is requested
+                for next_page in itertools.islice(next_pages, 1): pending.append(executor.submit(get_page, next_page))
+            check_table_page(page, page_dict, seen_IDs)
+            yield page_dict
+    finally:
+        # the pages not needed anymore are not requested
+        executor.shutdown(wait = False, cancel_futures = True)
+
+def table_pages_count(content, limit = None):
+    '''
+    Returns the number of table pages to request, read from the first page of the table.
+
+    Parameters
+    ----------
+    content : bytes
+        The content of the 'Medicines advice' webpage.
+    limit : int, Optional
+        the number of rows to retrieve from Published table.
+
+    Raises
+    ------
+    ValueError
+        If the content is not the expected page.
+
+    '''
+    from bs4 import BeautifulSoup
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    if soup.title == None or soup.title.get_text().strip() != "Medicines advice":
+        raise ValueError(f"Unexpected page title for {url}")
+    
+    # get the number of pages i.e. the number of times to click on the button load more
+    max_page = soup.find(id = "max-page-0")
+    if max_page == None: raise ValueError("The number of pages of the table is missing")
+    totalPages = int(max_page.get("value"))
+    if limit != None: totalPages = min(totalPages, max(1, math.ceil(limit / TABLE_PAGE_ROWS)))
+    return totalPages
+
+def check_table_page(page, page_dict, seen_IDs):
+    '''
+    Check that a table page adds new and complete rows to the table, and add its IDs to seen_IDs.
+
+    Raises
+    ------
+    ValueError
+        If the page is empty, incomplete or repeats rows of the previous pages.
+
+    '''
+    rows_count = len(page_dict['IDs'])
+    if rows_count == 0 or len(page_dict['Names']) != rows_count or len(page_dict['Links']) != rows_count:
+        raise ValueError(f"Page {page} of the table is empty or incomplete")
+    if not seen_IDs.isdisjoint(page_dict['IDs']):
+        raise ValueError(f"Page {page} of the table repeats rows of the previous pages")
+    seen_IDs.update(page_dict['IDs'])
+
+def get_table_data_http(limit = None, client = None, workers = None, metrics = None):
+    '''
+    Retrieve the 'Published' table without a browser, see iter_table_pages_http.
 
     Parameters
     ----------
-    driver : selenium webdriver object, Optional
-        generated automatically.
     limit : int, Optional
         the number of rows to retrieve from Published table.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client sending the requests. If None the default client is used.
+    workers : int, optional
+        The number of pages requested concurrently. If None DEFAULT_WORKERS is used.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the page loads. If None default_metrics is used.
+
+    Raises
+    ------
+    ValueError
+        If a page is not retrieved or its content is not the expected table.
 
     Returns
     -------
@@ -175,9 +598,48 @@ def get_table_data(driver, limit = None):
         A JSON like dictionnary with lists of medication IDs, names and links.
 
     '''
+    return merge_pages(iter_table_pages_http(limit = limit, client = client, workers = workers, metrics = metrics))
+
+def merge_pages(pages):
+    '''
+    Returns a single dictionnary of IDs, names and links from the dictionnaries of the table pages.
+
+    '''
+    data_dict = {"IDs": [], "Names": [], "Links": []}
+    for page_dict in pages:
+        for key in data_dict: data_dict[key].extend(page_dict[key])
+    return data_dict
+
+def iter_table_pages_selenium(driver, limit = None, metrics = None):
+    '''
+    Generate the rows of the 'Published' table loaded in a browser, page by page: the rows\
+    added by each click on the button 'load more' are generated as soon as they are displayed.
+
+    Parameters
+    ----------
+    driver : selenium webdriver object
+        The driver loading the 'Medecines advice' webpage.
+    limit : int, Optional
+        the number of rows to retrieve from Published table.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the page load, the clicks and the extractions. If None default_metrics is used.
+
+    Yields
+    ------
+    page_dict : dict
+        A JSON like dictionnary with lists of medication IDs, names and links of the new rows.
+
+    '''
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait as wait
+    
+    if metrics == None: metrics = default_metrics
     print('Collecting data from ' + url)
     
-    driver.get(url) # send the GET request
+    with metrics.timer('page_load', url = url):
+        driver.get(url) # send the GET request
     
     # exit if the page for "Medicines advice" is not rtrieved
     try:
@@ -187,24 +649,232 @@ def get_table_data(driver, limit = None):
         print('Fail! Code: {}, Message: {}'.format(type(e).__name__, error_msg))
         sys.exit()
         
-    # close cookies popup
-    wait(driver, 10).until(EC.element_to_be_clickable((By.ID, "ccc-dismiss-button"))).click()
+    # close cookies popup, a warm driver has already dismissed it
+    try:
+        wait(driver, 10).until(EC.element_to_be_clickable((By.ID, "ccc-dismiss-button"))).click()
+    except TimeoutException:
+        pass
     
     # get the number of pages i.e. the number of times to click on the button load more
     totalPages = driver.find_element(By.ID, "max-page-0").get_attribute("value")
     
+    # the rows displayed initially
+    page_dict = extract_table_rows(driver, metrics = metrics)
+    rows_count = len(page_dict['IDs'])
+    yield page_dict
+    
     # click the button "load more" to the rows in the table
-    rows_count = 20 # the table has 20 rows initially
     for i in range(int(totalPages) - 1):
         # stop clicking the button 'Load more' if the desired number of rows is attained
         if (limit != None):
             if (rows_count >= limit): break
-        wait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, '//*[@id="btn-more-0"]'))).click()
-        time.sleep(3)
-        # increase the rows count by 20 after each click
-        rows_count += 20
-    
+        try:
+            with metrics.timer('load_more', page = i + 2):
+                wait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, '//*[@id="btn-more-0"]'))).click()
+                # wait for the new rows instead of a fixed delay
+                wait(driver, 30).until(lambda driver: driver.execute_script(TABLE_COUNT_SCRIPT) > rows_count)
+        except TimeoutException:
+            print(f'The table stopped loading after {rows_count} rows.')
+            break
+        # extract only the rows added since the last page
+        page_dict = extract_table_rows(driver, start = rows_count, metrics = metrics)
+        rows_count += len(page_dict['IDs'])
+        yield page_dict
+
+@parse_url
+def get_table_data_selenium(driver, limit = None, metrics = None):
+    '''
+    A function to parse the 'Medecines advice' webpage to retrieve medication IDs,\
+    names and links to the medication webpage from the 'Published' table.
+
+    Parameters
+    ----------
+    driver : selenium webdriver object, Optional
+        generated automatically.
+    limit : int, Optional
+        the number of rows to retrieve from Published table.
+    metrics : ScrapingMetrics.Metrics, optional
+        See iter_table_pages_selenium.
+
+    Returns
+    -------
+    data_dict : dict
+        A JSON like dictionnary with lists of medication IDs, names and links.
+
+    '''
     # get IDs, names and links to medicine webpage in a JSON like dictionnary
+    return merge_pages(iter_table_pages_selenium(driver, limit = limit, metrics = metrics))
+
+def iter_table_rows(limit = None, client = None, browserless = True, keep_driver = False, page_workers = None,
+                    metrics = None):
+    '''
+    Generate the rows of the 'Published' table as soon as their page is loaded. The table pages\
+    are requested directly over HTTP and the browser is only started if that fails, in which\
+    case the rows already generated are skipped.
+
+    Parameters
+    ----------
+    limit : int, Optional
+        the number of rows to retrieve from Published table.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client sending the requests. If None the default client is used.
+    browserless : bool, optional
+        If False the browser is used directly. The default is True.
+    keep_driver : bool, optional
+        If True the browser is kept alive for the next call. The default is False.
+    page_workers : int, optional
+        The number of table pages requested concurrently. If None DEFAULT_WORKERS is used.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the page loads. If None default_metrics is used.
+
+    Yields
+    ------
+    tuple
+        The medicine ID, name and webpage link.
+
+    '''
+    seen_IDs = set()
+    if browserless:
+        try:
+            for page_dict in iter_table_pages_http(limit = limit, client = client, workers = page_workers,
+                                                   metrics = metrics):
+                for row in zip(page_dict['IDs'], page_dict['Names'], page_dict['Links']):
+                    seen_IDs.add(row[0])
+                    yield row
+            return
+        except Exception as e:
+            print('Browserless harvesting failed! Code: {}, {}'.format(type(e).__name__, str(e)))
+            print('Falling back to the browser...')
+    
+    driver = driver_provider.acquire(metrics)
+    if driver == None:
+        error_msg = ". ".join(["This program requires Chrome, Edge or Firefox to run",
+                         "Please ensure that at least one of these browsers is installed."])
+        print('Fail! Code: SessionNotCreatedException, Message: ' + error_msg)
+        sys.exit()
+    
+    keep_alive = False
+    try:
+        for page_dict in iter_table_pages_selenium(driver, limit = limit, metrics = metrics):
+            for row in zip(page_dict['IDs'], page_dict['Names'], page_dict['Links']):
+                if row[0] not in seen_IDs: yield row
+        keep_alive = keep_driver
+    finally:
+        driver_provider.release(driver, keep_alive = keep_alive)
+
+def iter_new_rows(known, limit = None, client = None, keep_driver = False, metrics = None):
+    '''
+    Generate the rows of the 'Published' table until the first known medicine: the newest advice\
+    comes first, so the table pages after it are never loaded.
+
+    Parameters
+    ----------
+    known : ScrapingStorage.KnownIDs
+        The IDs of the medicines already downloaded.
+    limit, client, keep_driver, metrics :
+        See iter_table_rows.
+
+    Yields
+    ------
+    tuple
+        The medicine ID, name and webpage link.
+
+    '''
+    # a single table page is requested ahead of the rows consumed, the next ones are likely not needed
+    for ID, name, link in iter_table_rows(limit = limit, client = client, keep_driver = keep_driver,
+                                          page_workers = 1, metrics = metrics):
+        if ID in known: return
+        yield ID, name, link
+
+# returns the rows of the table Published from a row number in a single WebDriver call, or null without the table
+TABLE_ROWS_SCRIPT = '''
+var start = arguments[0] || 0;
+var tabs = document.getElementsByClassName("tabs__content")[0];
+var table = tabs ? tabs.getElementsByTagName("table")[0] : undefined;
+if (!table) return null;
+function rows(className, read) {
+    return Array.prototype.slice.call(table.getElementsByClassName(className), start).map(read);
+}
+return {
+    IDs: rows("medicine-advice-table__id-row", function (cell) { return cell.innerText.trim(); }),
+    Names: rows("medicine-advice-table__medicine-row", function (cell) {
+        return cell.getElementsByClassName("medicine-advice-table__link")[0].innerText.trim(); }),
+    Links: rows("medicine-advice-table__link-row", function (cell) {
+        return cell.getElementsByTagName("a")[0].href; })
+};
+'''
+# returns the number of rows of the table Published
+TABLE_COUNT_SCRIPT = '''
+var tabs = document.getElementsByClassName("tabs__content")[0];
+var table = tabs ? tabs.getElementsByTagName("table")[0] : undefined;
+return table ? table.getElementsByClassName("medicine-advice-table__id-row").length : 0;
+'''
+
+def extract_table_rows(driver, method = 'script', start = 0, metrics = None):
+    '''
+    Extract the IDs, names and links of the table Published from the page loaded by a driver.
+
+    Parameters
+    ----------
+    driver : selenium webdriver object
+        A driver on the 'Medecines advice' webpage.
+    method : str, optional
+        'script' extracts all the rows with a single javascript call, 'source' parses a snapshot\
+        of the page source locally and 'elements' queries each cell through the driver,\
+        with one WebDriver round trip per cell. The default is 'script'.
+    start : int, optional
+        The number of the first row to extract, the rows before it are ignored. The default is 0.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the extraction. If None default_metrics is used.
+
+    Raises
+    ------
+    NoSuchElementException
+        If the table is not found.
+
+    Returns
+    -------
+    data_dict : dict
+        A JSON like dictionnary with lists of medication IDs, names and links.
+
+    '''
+    if metrics == None: metrics = default_metrics
+    with metrics.timer('table_extraction', method = method) as event:
+        data_dict = extract_rows(driver, method, start)
+        event['rows'] = len(data_dict['IDs'])
+    return data_dict
+
+def extract_rows(driver, method, start):
+    # the extraction of extract_table_rows, without the timer
+    from selenium.common.exceptions import NoSuchElementException
+    
+    if method == 'script':
+        data_dict = driver.execute_script(TABLE_ROWS_SCRIPT, start)
+        if data_dict == None: raise NoSuchElementException("The table Published is not found")
+        return {key: data_dict[key] for key in ("IDs", "Names", "Links")}
+    
+    if method == 'source':
+        from bs4 import BeautifulSoup
+        
+        page_source = driver.page_source
+        if BeautifulSoup(page_source, 'html.parser').find(class_ = "tabs__content") == None:
+            raise NoSuchElementException("The table Published is not found")
+        data_dict = parse_table_rows(page_source, base_url = driver.current_url)
+    
+    elif method == 'elements':
+        data_dict = extract_table_elements(driver)
+    
+    else: raise ValueError(f"Unknown extraction method: {method}")
+    
+    return {key: values[start:] for key, values in data_dict.items()}
+
+def extract_table_elements(driver):
+    '''
+    Extract the IDs, names and links of the table Published, querying each cell through the driver.
+
+    '''
+    from selenium.webdriver.common.by import By
+    
     # get the table Published
     table_published = driver.find_element(By.CLASS_NAME, "tabs__content").find_element(By.TAG_NAME, "table")
     
@@ -220,10 +890,15 @@ def get_table_data(driver, limit = None):
     
     return data_dict
      
-def get_file_link(file_id, file_name, file_url):
+def get_file_link(file_id, file_name, file_url, client = None, cache = None):
     """
     Scrap the webpage for a given medicine and return the detailed advice pdf link.
     Return None for failure
+    
+    The webpage is streamed and scanned with precompiled patterns, the download stops as soon\
+    as the pdf link is found. The page is only parsed with BeautifulSoup if the patterns fail.
+    With a cache, a fresh cached link is returned without any request, and an older one is\
+    revalidated with a conditional request, provided that it was found in a webpage titled file_name.
 
     Parameters
     ----------
@@ -233,32 +908,174 @@ def get_file_link(file_id, file_name, file_url):
         medicine name.
     file_url : str
         medicine webpage.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client sending the request. If None the default client is used.
+    cache : ScrapingStorage.LinkCache, optional
+        The pdf links already found, by webpage.
 
     Returns
     -------
     dict
-        a dictionnary with the medicine ID, name and pdf downloading link.
+        a dictionnary with the medicine ID, name and pdf downloading link, and 'Cached' True\
+        if the link comes from the cache without a request.
 
     """
+    if client == None: client = sc.get_default_client()
+    
+    entry = cache.get(file_url) if cache != None else None
+    # a cached link is only used for the medicine name matching the webpage title it was found with
+    if entry != None and entry.get('title') != file_name: entry = None
+    if entry != None and entry['fresh']:
+        return {"ID": file_id, "Name": file_name, "File link": entry['link'], "Cached": True}
+    
+    # ask for the webpage only if it changed since the link was cached
+    headers = {}
+    if entry != None and entry['etag']: headers['If-None-Match'] = entry['etag']
+    if entry != None and entry['last_modified']: headers['If-Modified-Since'] = entry['last_modified']
     
     try:
-        response = requests.get(file_url) # send the GET request
-        soup = BeautifulSoup(response.content, 'html.parser') # soup object
+        with client.get(file_url, headers = headers, stream = True) as response: # send the GET request
+            if response.status_code == HTTPStatus.NOT_MODIFIED and entry != None:
+                cache.revalidated(file_url)
+                return {"ID": file_id, "Name": file_name, "File link": entry['link'], "Cached": False}
+            # for inaccessible web page
+            if response.status_code != HTTPStatus.OK: return None
+            
+            href = find_file_link(response.iter_content(chunk_size = DEFAULT_CHUNK_SIZE), file_name)
+            
+            # read the rest of a short page so that the connection goes back to the pool
+            remaining = int(response.headers.get('Content-Length', DRAIN_LIMIT + 1)) - response.raw.tell()
+            if href != None and remaining <= DRAIN_LIMIT:
+                for _ in response.iter_content(chunk_size = DEFAULT_CHUNK_SIZE): pass
         
-        # for inaccessible or erroneous web page
-        success_conditions = (response.status_code == requests.codes.ok) &\
-                            (soup.title.string.strip() == file_name)                      
-        if not success_conditions: return None
+        if href == None: return None
         
         # get the link the detailed advice pdf file and ignore public summary file if exist
-        base_url = re.findall('(^https.*)/medicines', url)[0]
-        pdf_link = base_url + soup.find('a', {'href': re.compile('.*for-website\.pdf.*')}).get('href')
+        pdf_link = urljoin(base_url, href)
+        if cache != None:
+            cache.put(file_url, pdf_link, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                      file_name)
         
-        return {"ID": file_id, "Name": file_name, "File link": pdf_link}
+        return {"ID": file_id, "Name": file_name, "File link": pdf_link, "Cached": False}
         
     except:
         return None
 
+def find_file_link(chunks, file_name):
+    """
+    Find the detailed advice pdf link in a medicine webpage read by chunks.
+    The chunks are consumed only until the link is found.
+
+    Parameters
+    ----------
+    chunks : iterable
+        The webpage content as bytes chunks.
+    file_name : str
+        medicine name, expected as the title of the webpage.
+
+    Returns
+    -------
+    str or None
+        The href of the pdf link, None if the title does not match or no link is found.
+
+    """
+    scanner = FileLinkScanner(file_name)
+    for chunk in chunks:
+        if scanner.feed(chunk): break
+    return scanner.result()
+
+class FileLinkScanner():
+    """
+    Incremental scan of a medicine webpage for the detailed advice pdf link, fed chunk by chunk\
+    so that the same scan serves blocking and asynchronous downloads.
+    """
+    
+    def __init__(self, file_name):
+        self.__file_name = file_name
+        self.__content = b''
+        self.__title = None
+        self.__href = None
+        self.__done = False
+    
+    def __repr__(self):
+        return "FileLinkScanner"
+    
+    def feed(self, chunk):
+        '''
+        Scan a new chunk of the webpage.
+
+        Returns
+        -------
+        bool
+            True if the scan is over: the link is found or the title does not match.
+
+        '''
+        # scan again only the end of the previous content where a match may have been cut
+        start = max(0, len(self.__content) - 1024)
+        self.__content += chunk
+        
+        if self.__title == None:
+            match = TITLE_PATTERN.search(self.__content)
+            if match == None: return False
+            self.__title = html.unescape(match.group(1).decode('utf-8', 'replace')).strip()
+            # for incorrect web page
+            if self.__title != self.__file_name:
+                self.__done = True
+                return True
+            start = match.end()
+        
+        match = PDF_HREF_PATTERN.search(self.__content, start)
+        if match != None:
+            self.__href = html.unescape(match.group(1).decode('utf-8', 'replace'))
+            self.__done = True
+        return self.__done
+    
+    def result(self):
+        '''
+        Returns the href of the pdf link, None if the title does not match or no link is found.
+        The page is parsed if the scan did not end, e.g. for an unusual markup.
+
+        '''
+        if self.__done: return self.__href
+        return parse_file_link(self.__content, self.__file_name)
+
+def parse_file_link(content, file_name):
+    """
+    Find the detailed advice pdf link in a medicine webpage with BeautifulSoup.
+    Only the title and anchors are parsed.
+
+    Parameters
+    ----------
+    content : bytes
+        The webpage content.
+    file_name : str
+        medicine name, expected as the title of the webpage.
+
+    Returns
+    -------
+    str or None
+        The href of the pdf link, None if the title does not match or no link is found.
+
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+    
+    soup = BeautifulSoup(content, html_parser(), parse_only = SoupStrainer(['title', 'a']))
+    if soup.title == None or soup.title.string == None or soup.title.string.strip() != file_name: return None
+    
+    anchor = soup.find('a', {'href': PDF_LINK_PATTERN})
+    return anchor.get('href') if anchor != None else None
+
+@functools.lru_cache(maxsize = None)
+def html_parser():
+    """
+    Returns the fastest parser available to BeautifulSoup: lxml if installed, html.parser otherwise.
+
+    """
+    try:
+        importlib.import_module('lxml')
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
 
 def folder_path(path, name):
     '''
@@ -313,12 +1130,55 @@ def get_downloading_path(path = None):
     else:
         medicines_folder_path = folder_path(path, "Medicines advice")
      
-    time.sleep(2)
     return medicines_folder_path
 
-def dwn_pdf_file(ID, name, pdf_link, dwn_path):
+def write_stream(response, file_path, chunk_size = DEFAULT_CHUNK_SIZE, meter = None):
+    """
+    Write the body of a streamed response to a file, chunk by chunk.
+    The data goes to a temporary file in the same directory which replaces the final file\
+    only once complete, so an interrupted download never leaves a truncated file behind.
+
+    Parameters
+    ----------
+    response : requests.Response
+        A response opened with stream = True.
+    file_path : str
+        The path of the final file.
+    chunk_size : int, optional
+        The number of bytes read and written at a time.
+    meter : ScrapingClient.TransferMeter, optional
+        A counter for the bytes written.
+
+    Returns
+    -------
+    nbytes : int
+        The size of the file.
+
+    """
+    directory, file_name = os.path.split(file_path)
+    fd, temp_path = tempfile.mkstemp(dir = directory, prefix = '.' + file_name + '.', suffix = '.part')
+    nbytes = 0
+    try:
+        with os.fdopen(fd, mode = 'wb') as fh:
+            for chunk in response.iter_content(chunk_size = chunk_size):
+                fh.write(chunk)
+                nbytes += len(chunk)
+                if meter != None: meter.add(len(chunk))
+            # make sure the data is on disk before the file becomes visible
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path): os.remove(temp_path)
+        raise
+    
+    return nbytes
+
+def dwn_pdf_file(ID, name, pdf_link, dwn_path, client = None, chunk_size = DEFAULT_CHUNK_SIZE, meter = None,
+                 manifest = None, record = None, store = None, archive = None, metrics = None):
     """
     Download the detailed advice pdf file. Return None on successful download.
+    The file is streamed to disk so its content is never held in memory.
 
     Parameters
     ----------
@@ -330,6 +1190,22 @@ def dwn_pdf_file(ID, name, pdf_link, dwn_path):
         The pdf file link.
     dwn_path : str
         The directory path to store the file.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client sending the request. If None the default client is used.
+    chunk_size : int, optional
+        The number of bytes read and written at a time.
+    meter : ScrapingClient.TransferMeter, optional
+        A counter for the bytes downloaded.
+    manifest : ScrapingStorage.DownloadManifest, optional
+        If provided, the file is synchronized with sync_pdf_file instead.
+    record : MedicineRecord, optional
+        A record completed with the status of the file, the bytes downloaded and the file path.
+    store : ScrapingStorage.ContentStore, optional
+        If provided, the file is stored once by content and named after the ID, see ContentStore.
+    archive : ScrapingArchive.ShardedArchive, optional
+        If provided, the file is appended to the archive instead of being written to dwn_path.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the download. If None default_metrics is used.
 
     Returns
     -------
@@ -341,25 +1217,310 @@ def dwn_pdf_file(ID, name, pdf_link, dwn_path):
         error message.
 
     """
-    try:
-        res = requests.get(pdf_link) # send GET request for the pdf file link
+    if client == None: client = sc.get_default_client()
+    if manifest != None:
+        return sync_pdf_file(ID, name, pdf_link, dwn_path, manifest, client, chunk_size, meter, record, store,
+                             metrics = metrics)
     
-        # check status code
-        if res.status_code != requests.codes.ok: return (ID, name, "Inaccessible link for pdf file")
-        # set downloading path
-        dwn_path = str(os.path.join(dwn_path, pdf_link.split('/')[-1]))
-        
-        with open(dwn_path, mode = 'wb') as fh:
-            fh.write(res.content)
-        
-        return None
-    except:
-        return (ID, name, "Incorrect link for pdf file")
+    if metrics == None: metrics = default_metrics
+    with metrics.timer('dwn_pdf_file', ID = ID) as event:
+        try:
+            # send GET request for the pdf file link, the body is read later
+            with client.get(pdf_link, kind = 'pdf', stream = True) as res:
+                event['status'] = res.status_code
+                # check status code
+                if res.status_code != HTTPStatus.OK: return (ID, name, "Inaccessible link for pdf file")
+                file_name = pdf_link.split('/')[-1]
+                if store != None:
+                    file_path, event['bytes'] = store.write(ID, file_name, res.iter_content(chunk_size = chunk_size),
+                                                            meter)
+                elif archive != None:
+                    file_path, event['bytes'] = archive.write(ID, file_name,
+                                                              res.iter_content(chunk_size = chunk_size), meter)
+                else:
+                    # set downloading path
+                    file_path = str(os.path.join(dwn_path, file_name))
+                    event['bytes'] = write_stream(res, file_path, chunk_size, meter)
+            
+            if record != None: record.done(STATUS_DOWNLOADED, event['bytes'], file_path)
+            return None
+        except:
+            return (ID, name, "Incorrect link for pdf file")
+    
+def sync_pdf_file(ID, name, pdf_link, dwn_path, manifest, client = None, chunk_size = DEFAULT_CHUNK_SIZE,
+                  meter = None, record = None, store = None, resume = True, metrics = None):
+    """
+    Download the detailed advice pdf file only if it changed since the last run. Return None on success.
+    A conditional request is sent for a file recorded in the manifest and still on disk, and an\
+    interrupted download is resumed from its partial file with a range request. The file is downloaded\
+    again from scratch if the range cannot be served or the response does not start at the range.
+
+    Parameters
+    ----------
+    ID : str
+        The medicine SMC ID.
+    name : str
+        The medicine name.
+    pdf_link : str
+        The pdf file link.
+    dwn_path : str
+        The directory path to store the file.
+    manifest : ScrapingStorage.DownloadManifest
+        The record of the files already downloaded in dwn_path.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client sending the request. If None the default client is used.
+    chunk_size : int, optional
+        The number of bytes read and written at a time.
+    meter : ScrapingClient.TransferMeter, optional
+        A counter for the bytes downloaded and the files skipped.
+    record : MedicineRecord, optional
+        A record completed with the status of the file, the bytes downloaded and the file path.
+    store : ScrapingStorage.ContentStore, optional
+        If provided, the file is stored once by content and named after the ID, see dwn_pdf_file.
+    resume : bool, optional
+        If False a partial file is not resumed, the file is downloaded from scratch. The default is True.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the download. If None default_metrics is used.
+
+    Returns
+    -------
+    ID : str
+        The medicine SMC ID.
+    name : str
+        The medicine name.
+    message: str
+        error message.
+
+    """
+    if client == None: client = sc.get_default_client()
+    if metrics == None: metrics = default_metrics
+    
+    file_name = pdf_link.split('/')[-1]
+    file_path = str(os.path.join(dwn_path, file_name))
+    # the partial file is named after the ID so that it can be found by the next run
+    part_path = str(os.path.join(dwn_path, '.' + re.sub(r'[^\w.-]', '_', ID) + '.part'))
+    
+    entry = manifest.get(ID)
+    same_file = entry != None and entry.get('url') == pdf_link
+    validator = (entry.get('etag') or entry.get('last_modified')) if same_file else None
+    # a stored file is checked through its object
+    if store != None and same_file and entry.get('sha256'): file_path = store.object_path(entry['sha256'])
+    
+    headers = {}
+    offset = 0
+    if same_file and entry.get('size') != None and os.path.exists(file_path) \
+            and os.path.getsize(file_path) == entry['size']:
+        # the file is complete on disk: ask for it only if it changed
+        if entry.get('etag'): headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'): headers['If-Modified-Since'] = entry['last_modified']
+    elif resume and validator and os.path.exists(part_path):
+        # resume the partial file, unless the document changed in the meantime
+        offset = os.path.getsize(part_path)
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = validator
+    
+    restart = False # True if the partial file cannot be resumed
+    with metrics.timer('dwn_pdf_file', ID = ID, sync = True) as event:
+        try:
+            with client.get(pdf_link, kind = 'pdf', headers = headers, stream = True) as res:
+                event['status'] = res.status_code
+                if res.status_code == HTTPStatus.NOT_MODIFIED:
+                    if meter != None: meter.skip()
+                    if store != None:
+                        file_path = store.link(file_path, str(os.path.join(dwn_path, ss.readable_name(ID, file_name))))
+                    if record != None: record.done(STATUS_UP_TO_DATE, 0, file_path)
+                    return None
+                # the partial file is unusable, or the server sent another range than the one requested
+                partial = res.status_code == HTTPStatus.PARTIAL_CONTENT
+                if res.status_code == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE and offset or \
+                        partial and offset and content_range_start(res) != offset:
+                    restart = True
+                    event['bytes'] = 0
+                elif res.status_code not in (HTTPStatus.OK, HTTPStatus.PARTIAL_CONTENT) or \
+                        partial and content_range_start(res) != offset:
+                    return (ID, name, "Inaccessible link for pdf file")
+                else:
+                    # a full response replaces the partial file
+                    if res.status_code == HTTPStatus.OK: offset = 0
+                    etag = res.headers.get('ETag')
+                    last_modified = res.headers.get('Last-Modified')
+                    # record the validators first so that an interrupted download can be resumed
+                    manifest.update(ID, url = pdf_link, file = file_name, size = None, sha256 = None,
+                                    etag = etag, last_modified = last_modified)
+                    size, sha256 = write_part(res, part_path, offset, chunk_size, meter)
+            
+            if not restart:
+                event['bytes'] = size - offset
+                if store != None: file_path, _ = store.add(ID, file_name, part_path, sha256, size)
+                else: os.replace(part_path, file_path)
+                manifest.update(ID, url = pdf_link, file = file_name, size = size, sha256 = sha256,
+                                etag = etag, last_modified = last_modified)
+                if record != None: record.done(STATUS_DOWNLOADED, size - offset, file_path)
+                return None
+        except:
+            return (ID, name, "Incorrect link for pdf file")
+    
+    # the response is closed and its scheduler slot released: download again from scratch, only once
+    if os.path.exists(part_path): os.remove(part_path)
+    return sync_pdf_file(ID, name, pdf_link, dwn_path, manifest, client, chunk_size, meter, record, store,
+                         resume = False, metrics = metrics)
+
+def content_range_start(response):
+    '''
+    Returns the first byte position of a partial response, from its Content-Range header,\
+    None if the header is missing or invalid.
+
+    '''
+    match = re.match(r'bytes\s+(\d+)-\d+/(?:\d+|\*)$', response.headers.get('Content-Range', '').strip())
+    return int(match.group(1)) if match != None else None
+
+def write_part(response, part_path, offset, chunk_size = DEFAULT_CHUNK_SIZE, meter = None):
+    '''
+    Write the body of a streamed response to a partial file, appended to its first offset bytes.
+
+    Parameters
+    ----------
+    response : requests.Response
+        A response opened with stream = True.
+    part_path : str
+        The partial file.
+    offset : int
+        The bytes of the partial file kept, 0 to write it from scratch.
+    chunk_size : int, optional
+        The number of bytes read and written at a time.
+    meter : ScrapingClient.TransferMeter, optional
+        A counter for the bytes downloaded.
+
+    Returns
+    -------
+    size : int
+        The size of the file.
+    sha256 : str
+        The hash of the whole file.
+
+    '''
+    sha256 = hashlib.sha256()
+    with open(part_path, mode = 'r+b' if offset else 'wb') as fh:
+        # hash the bytes already on disk before appending the new ones
+        if offset:
+            for chunk in iter(lambda: fh.read(chunk_size), b''): sha256.update(chunk)
+            fh.truncate(offset)
+        for chunk in response.iter_content(chunk_size = chunk_size):
+            fh.write(chunk)
+            sha256.update(chunk)
+            if meter != None: meter.add(len(chunk))
+        fh.flush()
+        os.fsync(fh.fileno())
+        return fh.tell(), sha256.hexdigest()
+    
+STATUS_DOWNLOADED = "downloaded"
+STATUS_UP_TO_DATE = "up to date" # unchanged since the last sync
+
+class MedicineRecord():
+    """
+    Compact record of a medicine row of the table Published and of its download.
+    status is None until the medicine is processed, then STATUS_DOWNLOADED, STATUS_UP_TO_DATE\
+    or the failure message.
+    """
+    
+    __slots__ = ('id', 'name', 'link', 'pdf_link', 'status', 'bytes', 'path')
+    
+    def __init__(self, ID, name, link, pdf_link = None, status = None, nbytes = 0, path = None):
+        self.id = ID
+        self.name = name
+        self.link = link
+        self.pdf_link = pdf_link
+        self.status = status
+        self.bytes = nbytes
+        self.path = path # the file on disk once downloaded or up to date, or its shard/entry in an archive
+    
+    def __repr__(self):
+        return f"MedicineRecord({self.id!r}, {self.name!r}, status={self.status!r})"
+    
+    def done(self, status, nbytes = 0, path = None):
+        '''
+        Set the status of the record, the bytes downloaded and the file path.
+
+        '''
+        self.status = status
+        self.bytes = nbytes
+        self.path = path
+    
+    @property
+    def resolved(self):
+        # True if the pdf link was found on the medicine webpage
+        return self.pdf_link != None
+    
+    @property
+    def failure(self):
+        # ID, name and short message for an undownloaded file, None on success
+        if self.status in (None, STATUS_DOWNLOADED, STATUS_UP_TO_DATE): return None
+        return (self.id, self.name, self.status)
+
+def process_row(ID, name, link, downloads_path, client = None, cache = None, metrics = None, **dwn_kwargs):
+    """
+    Resolve the detailed advice pdf link of a medicine and download the file.
+
+    Parameters
+    ----------
+    ID : str
+        The medicine SMC ID.
+    name : str
+        The medicine name.
+    link : str
+        The medicine webpage.
+    downloads_path : str
+        The directory path to store the file.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client sending the requests. If None the default client is used.
+    cache : ScrapingStorage.LinkCache, optional
+        The pdf links already found, a cached link goes straight to the download, see get_file_link.
+    metrics : ScrapingMetrics.Metrics, optional
+        Records the link lookup and the download. If None default_metrics is used.
+    **dwn_kwargs :
+        Keyword arguments passed to dwn_pdf_file.
+
+    Returns
+    -------
+    record : MedicineRecord
+        The medicine with its pdf link, the status of the download and the bytes downloaded.
+
+    """
+    if metrics == None: metrics = default_metrics
+    record = MedicineRecord(ID, name, link)
+    
+    # get the link to the detailed advice pdf file
+    with metrics.timer('get_file_link', ID = ID) as event:
+        med_data = get_file_link(file_id = ID, file_name = name, file_url = link, client = client, cache = cache)
+        event['found'] = med_data != None
+        event['cached'] = med_data != None and med_data['Cached']
+    if event['cached']: metrics.incr('link_cache_hits')
     
-def dwn_process(data_dict, limit = None, path = None):
+    # if there is no link to the pdf file
+    if med_data == None:
+        record.done("Inaccessible or incorrect web page")
+        return record
+    
+    # download the file
+    record.pdf_link = med_data['File link']
+    dwn_result = dwn_pdf_file(ID, name, record.pdf_link, downloads_path, client = client, record = record,
+                              metrics = metrics, **dwn_kwargs)
+    if dwn_result != None and med_data['Cached']:
+        # the cached link may be outdated: the webpage is requested again
+        cache.discard(link)
+        return process_row(ID, name, link, downloads_path, client, cache, metrics, **dwn_kwargs)
+    if dwn_result != None: record.done(dwn_result[2])
+    return record
+
+def dwn_process(data_dict, limit = None, path = None, workers = None, client = None,
+                chunk_size = DEFAULT_CHUNK_SIZE, sync = False, extract = False, dedup = False, archive = None,
+                shard_size = None, link_cache = None, metrics = None):
     """
     Download detailed advice pdf files from drug web pages in a default path if not provided.
     Files not retrieved and number of successful downloads will be returned.
+    
+    Medicines are processed concurrently by a pool of threads, so the webpage of a medicine
+    is parsed while the pdf files of the previous ones are still downloading.
 
     Parameters
     ----------
@@ -369,6 +1530,66 @@ def dwn_process(data_dict, limit = None, path = None):
         the number of files to download. The default is None.
     path : str, optional
         The path for downloading directory. If None a default path will be used.
+    workers : int, optional
+        The number of medicines processed concurrently. If None DEFAULT_WORKERS is used.
+    client : ScrapingClient.HttpClient, optional
+        The HTTP client shared by the workers. If None the default client is used.
+    chunk_size : int, optional
+        The number of bytes read and written at a time when downloading a pdf file.
+    sync : bool, optional
+        If True only the files which changed since the last run are downloaded, see sync_pdf_file.
+    extract : bool, optional
+        If True the text and metadata of each file are extracted by a pool of processes as soon as\
+        it is downloaded, see ScrapingExtract.PdfExtractor, and added to the search index of the\
+        downloading directory, see ScrapingSearch.SearchIndex.
+    dedup : bool, optional
+        If True each distinct file is stored once by content hash, and exposed as <ID>_<file name>,\
+        see ScrapingStorage.ContentStore.
+    archive : str, optional
+        'zip' or 'tar' to stream the files into rolling archive shards in the downloading directory\
+        instead of writing them one by one, see ScrapingArchive.ShardedArchive. The default is None.
+    shard_size : int, optional
+        The maximum size of an archive shard in bytes. If None ScrapingArchive.DEFAULT_SHARD_SIZE is used.
+    link_cache : ScrapingStorage.LinkCache or True, optional
+        The pdf links found in the medicines webpages in the previous runs, True for the cache file\
+        of the downloading directory, see ScrapingStorage.LINK_CACHE_NAME. If None no link is cached.
+    metrics : ScrapingMetrics.Metrics, optional
+        The timers and counters of the run, see fetch_call. If None default_metrics is used.
+
+    Returns
+    -------
+    unretrieved_list : list
+        Contains ID, name and short message tuples for undownloaded files.
+    counter : int
+        Number of successful downloads.
+    downloads_path : str
+        Location for downloaded files.
+    status_dict : dict
+        Only if extract is True: the extraction status of each file downloaded, by medicine SMC ID.
+
+    """
+    # get the medicines data
+    rows = zip(data_dict['IDs'], data_dict['Names'], data_dict['Links'])
+    return dwn_rows(rows, limit, path, workers, client, chunk_size, sync, extract = extract, dedup = dedup,
+                    archive = archive, shard_size = shard_size, link_cache = link_cache, metrics = metrics)
+
+def dwn_rows(rows, limit = None, path = None, workers = None, client = None,
+             chunk_size = DEFAULT_CHUNK_SIZE, sync = False, known = None, extract = False, dedup = False,
+             archive = None, shard_size = None, link_cache = None, metrics = None):
+    """
+    Download detailed advice pdf files for medicines rows, see dwn_process.
+    The failures are recorded in the ScrapingStorage.FailureStore of the downloading directory,\
+    so that they can be retried later without the table, see MedAdvScraper.retry_failed.
+
+    Parameters
+    ----------
+    rows : iterable
+        ID, name and webpage link tuples, in table order. The rows are read as they are needed,\
+        so they may still be produced while the first files are downloading.
+    limit, path, workers, client, chunk_size, sync, extract, dedup, archive, shard_size, link_cache, metrics :
+        See dwn_process.
+    known : ScrapingStorage.KnownIDs, optional
+        If provided, the IDs of the files downloaded are added to it and saved.
 
     Returns
     -------
@@ -378,41 +1599,263 @@ def dwn_process(data_dict, limit = None, path = None):
         Number of successful downloads.
     downloads_path : str
         Location for downloaded files.
+    status_dict : dict
+        Only if extract is True, see dwn_process.
 
     """
+    if workers != None and workers < 1: raise ValueError(f"At least one worker is required, got {workers}!")
+    if extract and archive != None: raise ValueError("The files archived cannot be extracted!")
+    
     # set the directory for downloading
     downloads_path = get_downloading_path(path)
-    # get the medicines data
-    IDs_list, names_list, links_list = data_dict['IDs'], data_dict['Names'], data_dict['Links']
     
     unretrieved_list = [] # for unretrieved files
     counter = 0 # count the number of files succefully downloaded
-    
-    print('Downloading files...')
-    for ID, name, link in zip(IDs_list, names_list, links_list):
+    # the files are extracted by other processes while the next ones are downloading
+    extractor = se.PdfExtractor(downloads_path) if extract else None
+    names = {} # names of the files extracted, for the search index
+    failed, succeeded = [], [] # recorded in the failures store at the end of the run
+    try:
+        for record in iter_records(rows, limit, downloads_path, workers, client, chunk_size, sync, dedup,
+                                   archive, shard_size, link_cache, metrics):
+            # store the ID and name for undowloaded file
+            if record.failure != None:
+                unretrieved_list.append(record.failure)
+                failed.append(record)
+            else:
+                succeeded.append(record.id)
+                # a failed file is not known, but the next delta run stops at the first known medicine\
+                # and misses it once a newer one is downloaded: see MedAdvScraper.retry_failed
+                if known != None: known.add(record.id)
+                if extractor != None:
+                    extractor.submit(record.id, record.path)
+                    names[record.id] = record.name
+            if record.resolved: counter += 1
         
-        # get the link to the detailed advice pdf file
-        med_data = get_file_link(file_id = ID, file_name = name, file_url = link)
+        if extractor == None: return (unretrieved_list, counter, downloads_path)
+        print('Extracting the text of the files...')
+        status_dict = extractor.wait()
+        # the documents extracted become searchable
+        with ssr.SearchIndex(os.path.join(downloads_path, ssr.SEARCH_DIR_NAME)) as search_index:
+            ssr.update_index(search_index, extractor.store, names,
+                             [ID for ID, status in status_dict.items() if status == se.STATUS_EXTRACTED])
+        return (unretrieved_list, counter, downloads_path, status_dict)
+    finally:
+        if known != None: known.save()
+        if extractor != None: extractor.close()
+        # the store is only created once a medicine fails
+        failures = ss.FailureStore(str(os.path.join(downloads_path, ss.FAILURES_NAME)))
+        failures.update(failed, succeeded)
+        if failed: print(f'{len(failed)} failures recorded for a later retry, see {failures.db_path}')
+
+def iter_in_background(iterable):
+    '''
+    Generate the items of an iterable consumed by a background thread, so that producing\
+    the next items is not delayed by the processing of the previous ones.
+    An exception raised by the iterable is raised again once its items are consumed.
+
+    Parameters
+    ----------
+    iterable : iterable
+        The items to produce.
+
+    Yields
+    ------
+    object
+        The items of iterable, in the same order.
+
+    '''
+    items = queue.Queue()
+    end = object() # marks the end of the items
+    stop = threading.Event()
+    errors = []
+    
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set(): break
+                items.put(item)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            # release the resources of a generator stopped early
+            if hasattr(iterable, 'close'): iterable.close()
+            items.put(end)
+    
+    threading.Thread(target = produce, daemon = True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is end: break
+            yield item
+        if errors: raise errors[0]
+    finally:
+        stop.set()
+
+def crawl_process(limit = None, path = None, workers = None, client = None, chunk_size = DEFAULT_CHUNK_SIZE,
+                  sync = False, rows = None, keep_driver = False, known = None, extract = False, dedup = False,
+                  archive = None, shard_size = None, link_cache = None, metrics = None):
+    """
+    Download detailed advice pdf files while the table Published is still loading: the rows of\
+    each table page are handed to the downloading workers as soon as the page is loaded.
+
+    Parameters
+    ----------
+    limit, path, workers, client, chunk_size, sync, extract, dedup, archive, shard_size, link_cache, metrics :
+        See dwn_process.
+    rows : iterable, optional
+        ID, name and webpage link tuples. If None the rows are generated by iter_table_rows.
+    keep_driver : bool, optional
+        If True the browser, if it is needed, is kept alive for the next call. The default is False.
+    known : ScrapingStorage.KnownIDs, optional
+        Delta mode: only the rows before the first known medicine are downloaded, see iter_new_rows,\
+        and the IDs of the files downloaded are added to known.
+
+    Returns
+    -------
+    fetch_result : Tuple or None
+        See dwn_process. None if the table could not be retrieved.
+
+    """
+    if rows == None and known != None:
+        rows = iter_new_rows(known, limit = limit, client = client, keep_driver = keep_driver, metrics = metrics)
+    elif rows == None:
+        rows = iter_table_rows(limit = limit, client = client, keep_driver = keep_driver, metrics = metrics)
+    
+    produced = [0] # the number of rows produced by the table stage
+    table_errors = []
+    def counted(rows):
+        try:
+            for row in rows:
+                produced[0] += 1
+                yield row
+        except Exception as e:
+            table_errors.append(e)
+            raise
+    
+    with closing(iter_in_background(counted(rows))) as background_rows:
+        try:
+            return dwn_rows(background_rows, limit, path, workers, client, chunk_size, sync, known, extract,
+                            dedup, archive, shard_size, link_cache, metrics)
+        except Exception as e:
+            # only a table which did not load at all is a failure of the whole process
+            if produced[0] or not table_errors: raise
+            print('Fail! Code: {}, {}'.format(type(e).__name__, str(e)))
+            return None
+
+def iter_records(rows, limit, downloads_path, workers = None, client = None, chunk_size = DEFAULT_CHUNK_SIZE,
+                 sync = False, dedup = False, archive = None, shard_size = None, link_cache = None, metrics = None):
+    """
+    Process medicines rows with a pool of threads and generate their records as soon as they are done,\
+    in table order, see process_row.
+
+    Parameters
+    ----------
+    rows : iterable
+        ID, name and webpage link tuples, in table order.
+    limit : int or None
+        the number of files to download.
+    downloads_path : str
+        The directory path to store the files.
+    workers, client, chunk_size, sync, dedup, archive, shard_size, link_cache, metrics :
+        See dwn_process.
+
+    Yields
+    ------
+    record : MedicineRecord
+        A processed medicine. Its failure is None if the file was downloaded or up to date.
+
+    """
+    if workers == None: workers = DEFAULT_WORKERS
+    if workers < 1: raise ValueError(f"At least one worker is required, got {workers}!")
+    if client == None: client = sc.get_default_client()
+    if chunk_size == None: chunk_size = DEFAULT_CHUNK_SIZE
+    if metrics == None: metrics = default_metrics
+    
+    if link_cache == True: link_cache = ss.LinkCache(str(os.path.join(downloads_path, ss.LINK_CACHE_NAME)))
+    
+    meter = sc.TransferMeter() # count the bytes downloaded
+    dwn_kwargs = {"chunk_size": chunk_size, "meter": meter}
+    # the record of the files already downloaded for an incremental sync
+    if sync: dwn_kwargs["manifest"] = ss.DownloadManifest(downloads_path)
+    # each distinct content is stored once
+    if dedup: dwn_kwargs["store"] = ss.ContentStore(downloads_path)
+    if archive != None:
+        import ScrapingArchive as sar
         
-        # if there is no link to the pdf file
-        if med_data == None:
-            unretrieved_list.append((ID, name, "Inaccessible or incorrect web page"))
-            continue
+        # the files are streamed into the shards, there is no file on disk to sync or deduplicate
+        if sync or dedup: raise ValueError("The archive output mode cannot be combined with sync or dedup!")
+        if shard_size == None: shard_size = sar.DEFAULT_SHARD_SIZE
+        dwn_kwargs["archive"] = sar.ShardedArchive(downloads_path, archive, shard_size)
+    
+    print('Downloading files...')
+    rows = iter(rows)
+    counter = 0 # count the medicines whose pdf link was found
+    executor = ThreadPoolExecutor(max_workers = workers)
+    try:
+        pending = deque() # rows being processed, in table order
+        exhausted = False
+        while True:
+            # keep the workers busy, without processing more rows than the limit still requires
+            while not exhausted and len(pending) < workers and \
+                    (limit == None or counter + len(pending) < limit):
+                try:
+                    ID, name, link = next(rows)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.append(executor.submit(process_row, ID, name, link, downloads_path, client, link_cache,
+                                               metrics, **dwn_kwargs))
+            
+            if not pending: break
+            
+            # collect the results in table order
+            record = pending.popleft().result()
+            if record.failure != None:
+                metrics.incr('files_failed', ID = record.id, reason = record.status)
+            else: metrics.incr('files_downloaded')
             
-        pdf_link = med_data['File link'] # the pdf link
-        # download the file
-        dwn_result = dwn_pdf_file(ID, name, pdf_link, downloads_path)
-        # store the ID and name for undowloaded file
-        if dwn_result != None: unretrieved_list.append(dwn_result)
-           
-        counter += 1
-        if counter == limit: break # if the limit is reached
+            if record.resolved: counter += 1
+            yield record
+            if counter == limit: break # if the limit is reached
+    finally:
+        # a consumer which stops early does not wait for the rows not started yet
+        executor.shutdown(wait = True, cancel_futures = True)
+        if sync: dwn_kwargs["manifest"].save()
+        if dedup:
+            # the objects of the files replaced by this run are not needed anymore
+            removed, freed_bytes = dwn_kwargs["store"].gc()
+            dwn_kwargs["store"].save()
+        if archive != None: dwn_kwargs["archive"].close()
+        if link_cache != None: link_cache.save()
     
-    return (unretrieved_list, counter, downloads_path)
+    print('{:.1f} MB downloaded at {:.2f} MB/s'.format(meter.bytes / 1e6, meter.rate / 1e6))
+    if sync: print(f'{meter.skipped} files already up to date')
+    if dedup:
+        store = dwn_kwargs["store"]
+        metrics.incr('files_deduplicated', store.duplicates)
+        metrics.incr('bytes_deduplicated', store.saved_bytes)
+        print('{} files already stored, {:.1f} MB saved'.format(store.duplicates, store.saved_bytes / 1e6))
+        if removed: print('{} replaced files removed from the store, {:.1f} MB freed'.format(removed, freed_bytes / 1e6))
+    if archive != None:
+        print(f'{dwn_kwargs["archive"].shards} archive shards written, see {dwn_kwargs["archive"].index_path}')
 
 def fetch_call(func):
+    '''
+    Decorate a fetching method: print its call, its result and the failures, and return the\
+    RunSummary of the run, with the latencies per stage.
+    
+    Each call records its events in its own ScrapingMetrics.Metrics, passed to the method as the\
+    metrics keyword, so concurrent calls do not mix their events. The caller may provide it,\
+    otherwise a new one sends its events to the sinks of the scraper metrics.
+
+    '''
     @functools.wraps(func)
     def wrapper_fetch_call(*args, **kwargs):
+        # the timers and counters of this run only
+        metrics = kwargs.pop('metrics', None)
+        if metrics == None: metrics = sm.Metrics(args[0].metrics.sinks)
+        
         # print the function signature
         args_repr = [repr(a) for a in args]
         kwargs_repr = [f"{k}={v!r}" for k, v in kwargs.items()]
@@ -420,7 +1863,9 @@ def fetch_call(func):
         print(f"Calling {func.__name__}({signature})")
         
         # get the fetching result
-        fetch_result =  func(*args, **kwargs)
+        fetch_result =  func(*args, metrics = metrics, **kwargs)
+        summary = metrics.summary(fetch_result)
+        metrics.flush()
         
         # quit if data retrieving failed
         if fetch_result == None:
@@ -429,12 +1874,23 @@ def fetch_call(func):
             print('Fail! Message: ' + error_msg)
             sys.exit()
         else:
-            unretrieved_list, counter, downloads_path = fetch_result
+            unretrieved_list, counter, downloads_path = fetch_result[:3]
             # print final message
             print(". ".join([f'The process ends with {counter} files downloaded successfully', 
                       f'Please see the following path for the results: {downloads_path}']))
             if unretrieved_list:
                 print('Failed to retrieve data for the following:')
                 for ID, name, message in unretrieved_list: print(ID, name, message)
+            # the extraction status, if the files were extracted
+            if len(fetch_result) > 3:
+                status_dict = fetch_result[3]
+                extracted = sum(status == se.STATUS_EXTRACTED for status in status_dict.values())
+                unchanged = sum(status == se.STATUS_UNCHANGED for status in status_dict.values())
+                print(f'{extracted} files extracted, {unchanged} unchanged since their last extraction')
+                for ID, status in status_dict.items():
+                    if status not in (se.STATUS_EXTRACTED, se.STATUS_UNCHANGED): print(ID, status)
+            print(summary)
+        
+        return summary
     
     return wrapper_fetch_call
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 14:25:09 2026
+
+@author: Hichem Dridi
+"""
+
+import os
+import time
+import sqlite3
+from pathlib import Path
+from contextlib import closing, contextmanager
+
+DEFAULT_INDEX_PATH = str(os.path.join(Path.home(), '.cache', 'medicines-advice', 'table_index.sqlite'))
+DEFAULT_TTL = 24 * 3600 # seconds before the index is considered outdated
+SQL_MAX_VARIABLES = 500 # values bound to a single query
+
+def normalize_name(name):
+    '''
+    Returns a medicine name ignoring case and repeated spaces, used for name lookups.
+
+    '''
+    return " ".join(name.split()).casefold()
+
+class TableIndex():
+    """
+    Local SQLite copy of the rows of the 'Published' table, with indexed lookups by ID\
+    and by normalized name. The copy is considered fresh for ttl seconds after it was stored.
+    """
+
+    def __init__(self, db_path = DEFAULT_INDEX_PATH, ttl = DEFAULT_TTL):
+        self.__db_path = db_path
+        self.__ttl = ttl
+        directory = os.path.dirname(db_path)
+        if directory: os.makedirs(directory, exist_ok = True)
+        with self.__connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS rows (
+                    position INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    norm_name TEXT NOT NULL,
+                    link TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS rows_id ON rows (id);
+                CREATE INDEX IF NOT EXISTS rows_norm_name ON rows (norm_name);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+                """)
+
+    def __repr__(self):
+        return "TableIndex"
+
+    @contextmanager
+    def __connect(self):
+        # a connection per call keeps the index usable from several threads, committed and closed on exit
+        with closing(sqlite3.connect(self.__db_path, timeout = 30)) as connection, connection:
+            yield connection
+
+    @property
+    def db_path(self):
+        return self.__db_path
+
+    @property
+    def ttl(self):
+        return self.__ttl
+
+    @ttl.setter
+    def ttl(self, ttl):
+        self.__ttl = ttl
+
+    def __meta(self, connection):
+        return dict(connection.execute("SELECT key, value FROM meta").fetchall())
+
+    def __len__(self):
+        with self.__connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def is_fresh(self, limit = None):
+        '''
+        Check whether the index can answer a request instead of the website.
+
+        Parameters
+        ----------
+        limit : int, optional
+            The number of first rows required. If None the whole table is required.
+
+        Returns
+        -------
+        bool
+            True if the index was stored less than ttl seconds ago and holds the rows required.
+
+        '''
+        with self.__connect() as connection:
+            meta = self.__meta(connection)
+            if "updated_at" not in meta or time.time() - meta["updated_at"] > self.__ttl: return False
+            if meta.get("complete"): return True
+            if limit == None: return False
+            return connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0] >= limit
+
+    def store(self, data_dict, complete = True):
+        '''
+        Replace the content of the index.
+
+        Parameters
+        ----------
+        data_dict : dict
+            A dictionnary of medicines IDs, names and web pages links, in table order.
+        complete : bool, optional
+            False if only the first rows of the table were retrieved. The default is True.
+
+        '''
+        rows = [(position, ID, name, normalize_name(name), link) for position, (ID, name, link) in \
+                enumerate(zip(data_dict['IDs'], data_dict['Names'], data_dict['Links']))]
+        with self.__connect() as connection:
+            connection.execute("DELETE FROM rows")
+            connection.executemany("INSERT INTO rows VALUES (?, ?, ?, ?, ?)", rows)
+            connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                   [("updated_at", time.time()), ("complete", int(complete))])
+
+    def __select(self, where = "", values = ()):
+        with self.__connect() as connection:
+            return connection.execute("SELECT position, id, name, link FROM rows " + where, values).fetchall()
+
+    def __lookup(self, column, values):
+        values = list(dict.fromkeys(values))
+        rows = []
+        # bind the values by batches to stay below the SQLite variables limit
+        for start in range(0, len(values), SQL_MAX_VARIABLES):
+            batch = values[start:start + SQL_MAX_VARIABLES]
+            rows.extend(self.__select(f"WHERE {column} IN ({', '.join('?' * len(batch))})", batch))
+        return rows
+
+    def data_dict(self, limit = None):
+        '''
+        Returns the rows of the index, in table order.
+
+        Parameters
+        ----------
+        limit : int, optional
+            The number of first rows to return. If None all the rows are returned.
+
+        Returns
+        -------
+        dict
+            A dictionnary of medicines IDs, names and web pages links.
+
+        '''
+        if limit == None: return to_data_dict(self.__select("ORDER BY position"))
+        return to_data_dict(self.__select("ORDER BY position LIMIT ?", (limit,)))
+
+    def lookup(self, IDs_list = None, names_list = None):
+        '''
+        Returns the rows of the index matching any of the given medicines SMC IDs or names, in table order.
+        Names are compared ignoring case and repeated spaces.
+
+        Parameters
+        ----------
+        IDs_list : list, optional
+            A list of medicines SMC identifiers.
+        names_list : list, optional
+            A list of medicines names.
+
+        Returns
+        -------
+        dict
+            A dictionnary of medicines IDs, names and web pages links.
+
+        '''
+        rows = self.__lookup("id", IDs_list or [])
+        rows += self.__lookup("norm_name", [normalize_name(name) for name in names_list or []])
+        # a row matching both an ID and a name is returned once
+        return to_data_dict(sorted(set(rows)))
+
+    def lookup_IDs(self, IDs_list):
+        '''
+        Returns the rows of the index for the given medicines SMC IDs, in table order.
+
+        '''
+        return self.lookup(IDs_list = IDs_list)
+
+    def lookup_names(self, names_list):
+        '''
+        Returns the rows of the index for the given medicines names, in table order.
+        Names are compared ignoring case and repeated spaces.
+
+        '''
+        return self.lookup(names_list = names_list)
+
+def to_data_dict(rows):
+    '''
+    Returns a dictionnary of IDs, names and links from (position, ID, name, link) rows.
+
+    '''
+    return {"IDs": [row[1] for row in rows], "Names": [row[2] for row in rows],
+            "Links": [row[3] for row in rows]}
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 21:34:12 2026
+
+@author: Hichem Dridi
+"""
+
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import ScrapingStorage as ss
+
+def percentile(values, fraction):
+    '''
+    Returns the nearest-rank percentile of sorted values, None if there is no value.
+
+    '''
+    if not values: return None
+    rank = max(1, -(-len(values) * fraction // 1))
+    return values[int(rank) - 1]
+
+class StageSummary():
+    """
+    Latency statistics of a stage: number of events, total, p50, p95 and maximum in seconds,\
+    and the bytes transferred if the stage reports them.
+    """
+
+    __slots__ = ('stage', 'count', 'total', 'p50', 'p95', 'max', 'bytes')
+
+    def __init__(self, stage, latencies, nbytes = 0):
+        latencies = sorted(latencies)
+        self.stage = stage
+        self.count = len(latencies)
+        self.total = sum(latencies)
+        self.p50 = percentile(latencies, 0.5)
+        self.p95 = percentile(latencies, 0.95)
+        self.max = latencies[-1] if latencies else None
+        self.bytes = nbytes
+
+    def __repr__(self):
+        return f"StageSummary({self.stage}, count={self.count}, p50={self.p50}, p95={self.p95})"
+
+class RunSummary():
+    """
+    Summary of a fetch run: the fetch result, the statistics per stage and the counters.
+    """
+
+    def __init__(self, fetch_result, stages, counters, elapsed):
+        self.fetch_result = fetch_result
+        self.stages = stages
+        self.counters = counters
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return "RunSummary"
+
+    def __str__(self):
+        lines = [f"Run completed in {self.elapsed:.2f} s",
+                 f"  {'stage':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'MB':>9}"]
+        for stage in self.stages.values():
+            lines.append(f"  {stage.stage:<18}{stage.count:>7}{stage.p50 * 1000:>10.1f}{stage.p95 * 1000:>10.1f}"
+                         f"{stage.max * 1000:>10.1f}{stage.bytes / 1e6:>9.1f}")
+        for counter, value in self.counters.items():
+            lines.append(f"  {counter}: {value}")
+        return "\n".join(lines)
+
+    @property
+    def unretrieved_list(self):
+        return self.fetch_result[0] if self.fetch_result != None else None
+
+    @property
+    def counter(self):
+        return self.fetch_result[1] if self.fetch_result != None else None
+
+    @property
+    def downloads_path(self):
+        return self.fetch_result[2] if self.fetch_result != None else None
+
+    @property
+    def extraction_status(self):
+        # the extraction status by medicine SMC ID, None if the files were not extracted
+        if self.fetch_result == None or len(self.fetch_result) < 4: return None
+        return self.fetch_result[3]
+
+class Metrics():
+    """
+    Timers and counters of the scraping stages. Every event is sent to the sinks as a dictionnary\
+    and kept in memory until the next reset to build the run summary.
+    """
+
+    def __init__(self, sinks = None):
+        self.__lock = threading.Lock()
+        self.__sinks = list(sinks) if sinks != None else []
+        self.reset()
+
+    def __repr__(self):
+        return "Metrics"
+
+    @property
+    def sinks(self):
+        return self.__sinks
+
+    def add_sink(self, sink):
+        '''
+        Send the next events to a sink, an object with emit(event) and flush(metrics) methods.
+
+        '''
+        self.__sinks.append(sink)
+
+    def reset(self):
+        '''
+        Forget the events recorded so far, at the beginning of a run.
+
+        '''
+        with self.__lock:
+            self.__latencies = {}
+            self.__bytes = {}
+            self.__counters = {}
+            self.__start = time.perf_counter()
+
+    def record(self, stage, seconds, **fields):
+        '''
+        Record the latency of a stage event.
+
+        Parameters
+        ----------
+        stage : str
+            The stage name, e.g. 'get_file_link'.
+        seconds : float
+            The latency of the event.
+        **fields :
+            Details of the event. A 'bytes' field counts the bytes transferred.
+
+        '''
+        with self.__lock:
+            self.__latencies.setdefault(stage, []).append(seconds)
+            self.__bytes[stage] = self.__bytes.get(stage, 0) + fields.get('bytes', 0)
+        self.__emit(dict(fields, event = stage, seconds = seconds))
+
+    def incr(self, counter, value = 1, **fields):
+        '''
+        Increase a counter, e.g. 'files_failed'.
+
+        '''
+        with self.__lock:
+            self.__counters[counter] = self.__counters.get(counter, 0) + value
+        self.__emit(dict(fields, event = counter, value = value))
+
+    @contextmanager
+    def timer(self, stage, **fields):
+        '''
+        Time the block of a with statement as an event of a stage.
+        The dictionnary returned can be completed with details of the event, e.g. bytes.
+
+        '''
+        event = dict(fields)
+        start = time.perf_counter()
+        try:
+            yield event
+        except BaseException as e:
+            event.setdefault('error', type(e).__name__)
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, **event)
+
+    def __emit(self, event):
+        event['time'] = time.time()
+        for sink in self.__sinks:
+            try:
+                sink.emit(event)
+            except Exception as e:
+                # a failing sink must not stop the scraping
+                print('Metrics sink failed! Code: {}, {}'.format(type(e).__name__, str(e)))
+
+    def snapshot(self):
+        '''
+        Returns the statistics per stage and a copy of the counters.
+
+        '''
+        with self.__lock:
+            stages = {stage: StageSummary(stage, latencies, self.__bytes.get(stage, 0))
+                      for stage, latencies in self.__latencies.items()}
+            return stages, dict(self.__counters)
+
+    def summary(self, fetch_result = None):
+        '''
+        Returns the RunSummary of the events recorded since the last reset.
+
+        '''
+        stages, counters = self.snapshot()
+        return RunSummary(fetch_result, stages, counters, time.perf_counter() - self.__start)
+
+    def flush(self):
+        '''
+        Let the sinks write what they accumulate, at the end of a run.
+
+        '''
+        for sink in self.__sinks:
+            try:
+                sink.flush(self)
+            except Exception as e:
+                print('Metrics sink failed! Code: {}, {}'.format(type(e).__name__, str(e)))
+
+class LoggingSink():
+    """
+    Sends every event to a logger, as a JSON message.
+    """
+
+    def __init__(self, logger = None, level = logging.INFO):
+        self.__logger = logger if logger != None else logging.getLogger('MedAdvScraper')
+        self.__level = level
+
+    def __repr__(self):
+        return "LoggingSink"
+
+    def emit(self, event):
+        self.__logger.log(self.__level, json.dumps(event, default = str))
+
+    def flush(self, metrics):
+        pass
+
+class JsonLinesSink():
+    """
+    Appends every event to a JSON lines file.
+    """
+
+    def __init__(self, file_path):
+        self.__file_path = file_path
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return "JsonLinesSink"
+
+    def emit(self, event):
+        line = json.dumps(event, default = str) + "\n"
+        with self.__lock:
+            with open(self.__file_path, mode = 'a', encoding = 'utf-8') as fh:
+                fh.write(line)
+
+    def flush(self, metrics):
+        pass
+
+class PrometheusSink():
+    """
+    Writes the statistics of the run to a file in the Prometheus text format,\
+    e.g. for the textfile collector of the node exporter.
+    """
+
+    def __init__(self, file_path, prefix = 'medadv'):
+        self.__file_path = file_path
+        self.__prefix = prefix
+
+    def __repr__(self):
+        return "PrometheusSink"
+
+    def emit(self, event):
+        pass
+
+    def flush(self, metrics):
+        stages, counters = metrics.snapshot()
+        name = self.__prefix + '_stage_seconds'
+        lines = [f'# HELP {name} Latency of the scraping stages.', f'# TYPE {name} summary']
+        for stage in stages.values():
+            lines.append(f'{name}{{stage="{stage.stage}",quantile="0.5"}} {stage.p50}')
+            lines.append(f'{name}{{stage="{stage.stage}",quantile="0.95"}} {stage.p95}')
+            lines.append(f'{name}_sum{{stage="{stage.stage}"}} {stage.total}')
+            lines.append(f'{name}_count{{stage="{stage.stage}"}} {stage.count}')
+        name = self.__prefix + '_stage_bytes_total'
+        lines += [f'# HELP {name} Bytes transferred by the scraping stages.', f'# TYPE {name} counter']
+        lines += [f'{name}{{stage="{stage.stage}"}} {stage.bytes}' for stage in stages.values()]
+        for counter, value in counters.items():
+            name = f'{self.__prefix}_{counter}_total'
+            lines += [f'# TYPE {name} counter', f'{name} {value}']
+
+        # replace the file atomically so the collector never reads a partial file
+        ss.write_text(self.__file_path, "\n".join(lines) + "\n")
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 08:52:31 2026
+
+@author: Hichem Dridi
+"""
+
+import os
+import sys
+import time
+import uuid
+import socket
+import sqlite3
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+import ScrapingFunctions as sf
+import ScrapingClient as sc
+import ScrapingStorage as ss
+
+QUEUE_NAME = '.queue.sqlite'
+DEFAULT_LEASE = 300 # seconds before the rows claimed by a silent worker can be claimed again
+DEFAULT_BATCH = 16 # rows claimed at a time by a worker
+MAX_ATTEMPTS = 3 # claims of a row before it is given up
+POLL_INTERVAL = 1.0 # seconds between two claims while the last rows are leased by other workers
+
+class WorkQueue():
+    """
+    Durable queue of the medicines rows to process, shared by worker processes through SQLite.
+    A worker claims a batch of rows for lease_time seconds and records the result of each row;\
+    the rows of a worker which stopped are claimed again by another one once their lease expires.
+    Workers on several hosts can share the queue through a shared filesystem, provided that it\
+    supports the file locks SQLite relies on.
+    """
+
+    def __init__(self, db_path, lease_time = DEFAULT_LEASE, max_attempts = MAX_ATTEMPTS):
+        self.__db_path = db_path
+        self.__lease_time = lease_time
+        self.__max_attempts = max_attempts
+        with self.__connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    position INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    name TEXT NOT NULL,
+                    link TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    owner TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    pdf_link TEXT,
+                    message TEXT,
+                    bytes INTEGER);
+                CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+                """)
+
+    def __repr__(self):
+        return "WorkQueue"
+
+    @contextmanager
+    def __connect(self):
+        # a connection per call, the queue is used by several threads and processes; closed on exit
+        with closing(sqlite3.connect(self.__db_path, timeout = 60, isolation_level = None)) as connection:
+            yield connection
+
+    @property
+    def db_path(self):
+        return self.__db_path
+
+    @property
+    def lease_time(self):
+        return self.__lease_time
+
+    def put(self, rows):
+        '''
+        Add medicines rows to the queue, the rows already queued keep their progress.
+
+        Parameters
+        ----------
+        rows : iterable
+            ID, name and webpage link tuples, in table order.
+
+        '''
+        with self.__connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            start = connection.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM tasks").fetchone()[0]
+            connection.executemany("INSERT OR IGNORE INTO tasks (position, id, name, link) VALUES (?, ?, ?, ?)",
+                                   ((start + i, ID, name, link) for i, (ID, name, link) in enumerate(rows)))
+            connection.execute("COMMIT")
+
+    def claim(self, owner, batch = DEFAULT_BATCH):
+        '''
+        Lease the next pending rows, and the rows whose lease expired, to a worker.
+
+        Parameters
+        ----------
+        owner : str
+            The worker identifier.
+        batch : int, optional
+            The maximum number of rows to claim.
+
+        Returns
+        -------
+        list
+            ID, name and webpage link tuples, empty if no row is available.
+
+        '''
+        now = time.time()
+        with self.__connect() as connection:
+            # the write lock is taken first so that two workers never claim the same rows
+            connection.execute("BEGIN IMMEDIATE")
+            # the rows leased too many times are given up
+            connection.execute("""UPDATE tasks SET status = 'failed', owner = NULL,
+                                  message = 'Abandoned after ' || attempts || ' attempts'
+                                  WHERE status = 'leased' AND lease_until < ? AND attempts >= ?""",
+                               (now, self.__max_attempts))
+            rows = connection.execute("""SELECT id, name, link FROM tasks
+                                         WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?)
+                                         ORDER BY position LIMIT ?""", (now, batch)).fetchall()
+            connection.executemany("""UPDATE tasks SET status = 'leased', owner = ?, lease_until = ?,
+                                      attempts = attempts + 1 WHERE id = ?""",
+                                   [(owner, now + self.__lease_time, row[0]) for row in rows])
+            connection.execute("COMMIT")
+        return rows
+
+    def renew(self, owner):
+        '''
+        Extend the leases of the rows claimed by a worker still running.
+
+        '''
+        with self.__connect() as connection:
+            connection.execute("UPDATE tasks SET lease_until = ? WHERE status = 'leased' AND owner = ?",
+                               (time.time() + self.__lease_time, owner))
+
+    def complete(self, owner, record):
+        '''
+        Checkpoint the result of a row claimed by a worker.
+
+        Parameters
+        ----------
+        owner : str
+            The worker identifier.
+        record : ScrapingFunctions.MedicineRecord
+            The processed medicine.
+
+        Returns
+        -------
+        bool
+            False if the lease was lost, the row was claimed again by another worker.
+
+        '''
+        status = 'failed' if record.failure != None else 'done'
+        message = record.failure[2] if record.failure != None else None
+        with self.__connect() as connection:
+            cursor = connection.execute("""UPDATE tasks SET status = ?, owner = NULL, lease_until = NULL,
+                                           pdf_link = ?, message = ?, bytes = ?
+                                           WHERE id = ? AND status = 'leased' AND owner = ?""",
+                                        (status, record.pdf_link, message, record.bytes, record.id, owner))
+            return cursor.rowcount == 1
+
+    def counts(self):
+        '''
+        Returns the number of rows per status: pending, leased, done and failed.
+
+        '''
+        with self.__connect() as connection:
+            counts = dict(connection.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ('pending', 'leased', 'done', 'failed')}
+
+    def unfinished(self):
+        '''
+        Returns the number of rows still pending or leased.
+
+        '''
+        counts = self.counts()
+        return counts['pending'] + counts['leased']
+
+    def results(self):
+        '''
+        Returns the results of the finished rows, like dwn_process.
+
+        Returns
+        -------
+        unretrieved_list : list
+            Contains ID, name and short message tuples for undownloaded files.
+        counter : int
+            Number of medicines whose pdf link was found.
+
+        '''
+        with self.__connect() as connection:
+            unretrieved_list = connection.execute("""SELECT id, name, message FROM tasks
+                                                     WHERE status = 'failed' ORDER BY position""").fetchall()
+            counter = connection.execute("""SELECT COUNT(*) FROM tasks WHERE status IN ('done', 'failed')
+                                            AND pdf_link IS NOT NULL""").fetchone()[0]
+        return unretrieved_list, counter
+
+    def clear(self):
+        '''
+        Remove all the rows of the queue.
+
+        '''
+        with self.__connect() as connection:
+            connection.execute("DELETE FROM tasks")
+
+def run_worker(db_path, downloads_path, threads = sf.DEFAULT_WORKERS, batch = DEFAULT_BATCH,
+               lease_time = DEFAULT_LEASE, chunk_size = sf.DEFAULT_CHUNK_SIZE, url = None, client_settings = None,
+               link_cache_settings = None):
+    '''
+    Process the rows of a queue until none is left: claim a batch, resolve the pdf links and\
+    download the files with a pool of threads, and checkpoint each result.
+
+    Parameters
+    ----------
+    db_path : str
+        The path of the queue database.
+    downloads_path : str
+        The directory path to store the files.
+    threads : int, optional
+        The number of rows of a batch processed concurrently.
+    batch : int, optional
+        The number of rows claimed at a time.
+    lease_time : int, optional
+        The seconds a worker has to process a batch before it can be claimed by another worker.
+    chunk_size : int, optional
+        The number of bytes read and written at a time when downloading a pdf file.
+    url : str, optional
+        The 'Medicines advice' webpage, see ScrapingFunctions.set_url. If None the default one is used.
+    client_settings : dict, optional
+        The settings of the HTTP client of the worker, see ScrapingClient.HttpClient.settings.\
+        If None the default client is used.
+    link_cache_settings : dict, optional
+        The settings of the link cache of the worker, see ScrapingStorage.LinkCache.settings.\
+        The cache is saved when the worker stops, the entries saved by the other workers in the meantime\
+        are replaced, which only costs their webpages requests in the next run. If None no link is cached.
+
+    Returns
+    -------
+    processed : int
+        The number of rows checkpointed by the worker.
+
+    '''
+    # a spawned process starts with the default url
+    if url != None: sf.set_url(url)
+    
+    queue = WorkQueue(db_path, lease_time)
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    # each process has its own client and paces its own requests
+    client = sc.client_from_settings(client_settings) if client_settings != None else sc.get_default_client()
+    cache = ss.LinkCache(**link_cache_settings) if link_cache_settings != None else None
+    dwn_kwargs = {"chunk_size": chunk_size, "meter": sc.TransferMeter()}
+    processed = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers = threads) as executor:
+            while True:
+                rows = queue.claim(owner, batch)
+                if not rows:
+                    # the rows leased by the other workers may still come back
+                    if queue.unfinished() == 0: break
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                for record in executor.map(lambda row: sf.process_row(*row, downloads_path, client, cache,
+                                                                      **dwn_kwargs), rows):
+                    if queue.complete(owner, record): processed += 1
+                    queue.renew(owner) # the batch is still in progress
+    finally:
+        if cache != None: cache.save()
+
+    return processed
+
+def sharded_process(data_dict, path = None, processes = None, threads = None, db_path = None,
+                    batch = DEFAULT_BATCH, lease_time = DEFAULT_LEASE, chunk_size = sf.DEFAULT_CHUNK_SIZE,
+                    client = None, link_cache = None):
+    '''
+    Download detailed advice pdf files with several worker processes sharing a durable work queue.
+    The queue keeps the progress of an interrupted run: calling again with the same queue resumes it.
+    More workers, on other hosts sharing the downloading directory, can join with:
+        python ScrapingQueue.py <db_path> <downloads_path> [processes]
+
+    Parameters
+    ----------
+    data_dict : dict
+        A dictionnary of medicines IDs, names and web pages links.
+    path : str, optional
+        The path for downloading directory. If None a default path will be used.
+    processes : int, optional
+        The number of worker processes. If None the number of CPUs is used.
+    threads : int, optional
+        The number of rows processed concurrently by each process. If None DEFAULT_WORKERS is used.
+    db_path : str, optional
+        The path of the queue database. If None it is stored in the downloading directory.
+    batch, lease_time, chunk_size :
+        See run_worker.
+    client : ScrapingClient.HttpClient, optional
+        A client whose settings are used by the workers, each one creating its own client from them,\
+        see ScrapingClient.client_from_settings. If None the workers use the default client.
+    link_cache : ScrapingStorage.LinkCache or True, optional
+        The pdf links found in the previous runs, True for the cache file of the downloading directory.\
+        Each worker reads and saves the file of the cache, see run_worker. If None no link is cached.
+
+    Returns
+    -------
+    unretrieved_list : list
+        Contains ID, name and short message tuples for undownloaded files.
+    counter : int
+        Number of successful downloads.
+    downloads_path : str
+        Location for downloaded files.
+
+    '''
+    if processes == None: processes = os.cpu_count() or 1
+    if processes < 1: raise ValueError(f"At least one process is required, got {processes}!")
+    if threads == None: threads = sf.DEFAULT_WORKERS
+    if chunk_size == None: chunk_size = sf.DEFAULT_CHUNK_SIZE
+
+    downloads_path = sf.get_downloading_path(path)
+    if db_path == None: db_path = str(os.path.join(downloads_path, QUEUE_NAME))
+    if link_cache == True: link_cache = ss.LinkCache(str(os.path.join(downloads_path, ss.LINK_CACHE_NAME)))
+
+    queue = WorkQueue(db_path, lease_time)
+    queue.put(zip(data_dict['IDs'], data_dict['Names'], data_dict['Links']))
+    print(f'Processing {queue.unfinished()} medicines with {processes} processes, queue: {db_path}')
+
+    # spawned processes do not inherit the threads and locks of this one
+    client_settings = client.settings if client != None else None
+    link_cache_settings = link_cache.settings if link_cache != None else None
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target = run_worker, args = (db_path, downloads_path, threads, batch,
+                                                             lease_time, chunk_size, sf.url, client_settings,
+                                                             link_cache_settings))
+               for _ in range(processes)]
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
+
+    failed = [worker.exitcode for worker in workers if worker.exitcode != 0]
+    if failed: print(f'{len(failed)} worker processes stopped with an error, their rows were taken over.')
+    if queue.unfinished():
+        # every worker stopped: finish the rows left in this process
+        run_worker(db_path, downloads_path, threads, batch, lease_time, chunk_size, client_settings = client_settings,
+                   link_cache_settings = link_cache_settings)
+
+    unretrieved_list, counter = queue.results()
+    queue.clear() # the run is complete, the next one starts from scratch
+    return (unretrieved_list, counter, downloads_path)
+
+if __name__ == '__main__':
+    # join a sharded crawl from another host: python ScrapingQueue.py <db_path> <downloads_path> [processes]
+    if len(sys.argv) < 3:
+        print("Usage: python ScrapingQueue.py <db_path> <downloads_path> [processes]")
+        sys.exit(1)
+    db_path, downloads_path = sys.argv[1:3]
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target = run_worker, args = (db_path, downloads_path)) for _ in range(processes)]
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:05:22 2026
+
+@author: Hichem Dridi
+"""
+
+import os
+import re
+import json
+import mmap
+import array
+import threading
+import ScrapingStorage as ss
+
+SEARCH_DIR_NAME = '.search'
+MAX_SEGMENTS = 8 # segments merged into one beyond this number
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def tokenize(text):
+    '''
+    Returns the set of the terms of a text, ignoring case.
+
+    '''
+    return set(TOKEN_PATTERN.findall(text.casefold()))
+
+class Segment():
+    """
+    Immutable part of the inverted index: a lexicon of terms and their posting lists of document numbers,\
+    stored as unsigned 32 bits integers in a memory-mapped file so that only the lists queried are read.
+    """
+
+    def __init__(self, directory, name):
+        self.__name = name
+        with open(os.path.join(directory, name + '.lex'), encoding = 'utf-8') as fh:
+            self.__lexicon = json.load(fh) # term: [offset, count]
+        self.__file = open(os.path.join(directory, name + '.post'), mode = 'rb')
+        # an empty file cannot be mapped
+        empty = os.fstat(self.__file.fileno()).st_size == 0
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access = mmap.ACCESS_READ) if not empty else None
+        self.__postings = memoryview(self.__map if not empty else b'').cast('I')
+
+    def __repr__(self):
+        return f"Segment({self.__name})"
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def terms(self):
+        return self.__lexicon.keys()
+
+    def postings(self, term):
+        '''
+        Returns the sorted document numbers of a term, a view on the mapped file.
+
+        '''
+        entry = self.__lexicon.get(term)
+        if entry == None: return ()
+        offset, count = entry
+        return self.__postings[offset:offset + count]
+
+    def close(self):
+        self.__postings.release()
+        if self.__map != None: self.__map.close()
+        self.__file.close()
+
+def write_segment(directory, name, postings):
+    '''
+    Write a segment from a dictionnary of terms and document numbers.
+
+    '''
+    lexicon = {}
+    data = array.array('I')
+    for term in sorted(postings):
+        numbers = sorted(postings[term])
+        lexicon[term] = [len(data), len(numbers)]
+        data.extend(numbers)
+    # the postings first, so that a lexicon never refers to missing data
+    with open(os.path.join(directory, name + '.post'), mode = 'wb') as fh:
+        data.tofile(fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    ss.write_text(os.path.join(directory, name + '.lex'), json.dumps(lexicon, separators = (',', ':')))
+
+class SearchIndex():
+    """
+    On-disk inverted index over the text of the detailed advice documents, keyed by medicine SMC ID.
+    Documents added are written as a new segment by commit, a document added again replaces the\
+    previous version, and the segments are merged once there are more than MAX_SEGMENTS.
+    A single process is expected to update the index at a time.
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__lock = threading.Lock()
+        os.makedirs(directory, exist_ok = True)
+        self.__docs_path = str(os.path.join(directory, 'docs.json'))
+        # docs: [ID, name] by document number, live: ID -> [document number, sha256], segments: names
+        self.__state = {"docs": [], "live": {}, "segments": [], "next_segment": 0}
+        if os.path.exists(self.__docs_path):
+            with open(self.__docs_path, encoding = 'utf-8') as fh:
+                self.__state = json.load(fh)
+        self.__segments = [Segment(directory, name) for name in self.__state["segments"]]
+        self.__pending = {} # term -> document numbers added since the last commit
+
+    def __repr__(self):
+        return "SearchIndex"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.__state["live"])
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    def indexed_sha256(self, ID):
+        '''
+        Returns the hash of the document indexed for a medicine, None if it is not indexed.
+
+        '''
+        entry = self.__state["live"].get(ID)
+        return entry[1] if entry != None else None
+
+    def add(self, ID, name, text, sha256 = None):
+        '''
+        Add the document of a medicine, replacing its previous version. Searchable after commit.
+
+        Parameters
+        ----------
+        ID : str
+            The medicine SMC ID.
+        name : str
+            The medicine name, its terms are searchable too.
+        text : str
+            The text of the detailed advice document.
+        sha256 : str, optional
+            The hash of the document file, to skip unchanged documents on the next update.
+
+        '''
+        with self.__lock:
+            number = len(self.__state["docs"])
+            self.__state["docs"].append([ID, name])
+            # the previous version is not live anymore, its postings are dropped by the next merge
+            self.__state["live"][ID] = [number, sha256]
+            for term in tokenize(" ".join([ID, name or "", text])):
+                self.__pending.setdefault(term, []).append(number)
+
+    def commit(self):
+        '''
+        Write the documents added as a new segment, merging the segments if there are too many.
+
+        '''
+        with self.__lock:
+            if self.__pending:
+                name = f"seg_{self.__state['next_segment']}"
+                self.__state["next_segment"] += 1
+                write_segment(self.__directory, name, self.__pending)
+                self.__segments.append(Segment(self.__directory, name))
+                self.__state["segments"].append(name)
+                self.__pending = {}
+            obsolete = self.__merge() if len(self.__segments) > MAX_SEGMENTS else []
+            ss.write_json(self.__docs_path, self.__state)
+            # the files of the merged segments are removed once the new state is on disk
+            for segment in obsolete:
+                segment.close()
+                for extension in ('.lex', '.post'):
+                    os.remove(os.path.join(self.__directory, segment.name + extension))
+
+    def __merge(self):
+        # merge all the segments into one, dropping the postings of the replaced documents
+        live = set(number for number, _ in self.__state["live"].values())
+        postings = {}
+        for segment in self.__segments:
+            for term in segment.terms:
+                numbers = [number for number in segment.postings(term) if number in live]
+                if numbers: postings.setdefault(term, []).extend(numbers)
+        name = f"seg_{self.__state['next_segment']}"
+        self.__state["next_segment"] += 1
+        write_segment(self.__directory, name, postings)
+        obsolete, self.__segments = self.__segments, [Segment(self.__directory, name)]
+        self.__state["segments"] = [name]
+        return obsolete
+
+    def search(self, terms):
+        '''
+        Returns the medicines whose name or document contain all the terms.
+
+        Parameters
+        ----------
+        terms : str or list
+            The searched terms, compared ignoring case.
+
+        Returns
+        -------
+        list
+            The medicines SMC IDs, in indexing order.
+
+        '''
+        if isinstance(terms, str): terms = [terms]
+        terms = tokenize(" ".join(terms))
+        if not terms: return []
+
+        with self.__lock:
+            docs, live = self.__state["docs"], self.__state["live"]
+            numbers = None
+            # the rarest term first makes the intersections cheaper
+            for term in sorted(terms, key = lambda term: sum(len(s.postings(term)) for s in self.__segments)):
+                term_numbers = set()
+                for segment in self.__segments: term_numbers.update(segment.postings(term))
+                numbers = term_numbers if numbers == None else numbers & term_numbers
+                if not numbers: return []
+            # only the current version of each document
+            return [docs[number][0] for number in sorted(numbers) if live[docs[number][0]][0] == number]
+
+    def close(self):
+        '''
+        Unmap the segments.
+
+        '''
+        for segment in self.__segments: segment.close()
+        self.__segments = []
+
+def update_index(search_index, extract_store, names, IDs = None):
+    '''
+    Add to a search index the extracted documents which changed since they were indexed.
+
+    Parameters
+    ----------
+    search_index : SearchIndex
+        The index to update.
+    extract_store : ScrapingExtract.ExtractStore
+        The texts extracted from the pdf files.
+    names : dict
+        The medicines names by SMC ID, e.g. from the table Published.
+    IDs : iterable, optional
+        The medicines to update. If None all the extracted documents are considered.
+
+    Returns
+    -------
+    int
+        The number of documents added.
+
+    '''
+    hashes = extract_store.hashes()
+    IDs = hashes.keys() if IDs == None else [ID for ID in IDs if ID in hashes]
+    added = 0
+    for ID in IDs:
+        if search_index.indexed_sha256(ID) == hashes[ID]: continue
+        extract = extract_store.get(ID)
+        search_index.add(ID, names.get(ID, ""), extract["text"], extract["sha256"])
+        added += 1
+    search_index.commit()
+    return added
@@ -0,0 +1,650 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 11:02:47 2026
+
+@author: Hichem Dridi
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from contextlib import closing, contextmanager
+
+MANIFEST_NAME = '.manifest.json'
+KNOWN_IDS_NAME = '.known_ids.json' # in the downloading directory, the IDs of its files
+LINK_CACHE_NAME = '.link_cache.json' # in the downloading directory, the pdf links of its medicines
+LINK_CACHE_AGE = 7 * 24 * 3600 # seconds a pdf link is used without requesting its webpage again
+LINK_CACHE_ENTRIES = 20000 # webpages kept, the least recently used are evicted beyond
+OBJECTS_DIR_NAME = '.objects'
+REFS_NAME = 'refs.json'
+SPOOL_SIZE = 8 * 1024 * 1024 # bytes of a download kept in memory until its content is known to be new
+FAILURES_NAME = '.failures.sqlite'
+RETRY_DELAY = 15 * 60 # seconds before the first retry of a failed medicine, doubled at each attempt
+MAX_RETRY_DELAY = 24 * 3600
+MAX_RETRY_ATTEMPTS = 8 # failures of a medicine after which it is not retried anymore
+
+def write_text(file_path, text):
+    '''
+    Write a text file atomically, through a temporary file in the same directory.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the file.
+    text : str
+        The content of the file.
+
+    '''
+    directory, file_name = os.path.split(file_path)
+    fd, temp_path = tempfile.mkstemp(dir = directory or None, prefix = '.' + file_name + '.', suffix = '.tmp')
+    try:
+        with os.fdopen(fd, mode = 'w', encoding = 'utf-8') as fh:
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path): os.remove(temp_path)
+        raise
+
+def write_json(file_path, data):
+    '''
+    Write a JSON file atomically, through a temporary file in the same directory.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the JSON file.
+    data : dict or list
+        The data to serialize.
+
+    '''
+    write_text(file_path, json.dumps(data, indent = 1, sort_keys = True))
+
+class DownloadManifest():
+    """
+    Record of the pdf files downloaded in a directory, keyed by medicine SMC ID.
+    Each entry keeps the pdf link, the file name, its size, sha256 hash and the ETag/Last-Modified\
+    validators sent by the server, so unchanged files can be skipped on the next run.
+    """
+
+    def __init__(self, directory):
+        self.__path = str(os.path.join(directory, MANIFEST_NAME))
+        self.__lock = threading.Lock()
+        self.__entries = {}
+        if os.path.exists(self.__path):
+            try:
+                with open(self.__path, encoding = 'utf-8') as fh:
+                    self.__entries = json.load(fh)
+            except (OSError, ValueError):
+                # a damaged manifest only costs a full download
+                print(f"Unable to read {self.__path}, it will be rebuilt.")
+
+    def __repr__(self):
+        return "DownloadManifest"
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def path(self):
+        return self.__path
+
+    def get(self, ID):
+        '''
+        Returns a copy of the entry of a medicine, None if it is not recorded.
+
+        '''
+        with self.__lock:
+            entry = self.__entries.get(ID)
+            return dict(entry) if entry != None else None
+
+    def update(self, ID, **fields):
+        '''
+        Replace the entry of a medicine.
+
+        Parameters
+        ----------
+        ID : str
+            The medicine SMC ID.
+        **fields :
+            The entry fields: url, file, size, sha256, etag and last_modified.
+
+        '''
+        with self.__lock:
+            self.__entries[ID] = fields
+
+    def save(self):
+        '''
+        Write the manifest to disk.
+
+        '''
+        with self.__lock:
+            write_json(self.__path, self.__entries)
+
+class KnownIDs():
+    """
+    Set of the medicines SMC IDs already downloaded, kept between runs to fetch only the new advice.
+    The file is kept in the downloading directory, see KNOWN_IDS_NAME: the IDs known are those of its files.
+    """
+
+    def __init__(self, file_path):
+        self.__path = file_path
+        self.__lock = threading.Lock()
+        self.__IDs = set()
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, encoding = 'utf-8') as fh:
+                    self.__IDs = set(json.load(fh))
+            except (OSError, ValueError):
+                # a damaged file only costs a full download
+                print(f"Unable to read {file_path}, it will be rebuilt.")
+
+    def __repr__(self):
+        return "KnownIDs"
+
+    def __len__(self):
+        return len(self.__IDs)
+
+    def __contains__(self, ID):
+        return ID in self.__IDs
+
+    @property
+    def path(self):
+        return self.__path
+
+    def add(self, ID):
+        '''
+        Record a medicine as downloaded.
+
+        '''
+        with self.__lock:
+            self.__IDs.add(ID)
+
+    def save(self):
+        '''
+        Write the known IDs to disk.
+
+        '''
+        directory = os.path.dirname(self.__path)
+        if directory: os.makedirs(directory, exist_ok = True)
+        with self.__lock:
+            write_json(self.__path, sorted(self.__IDs))
+
+
+def readable_name(ID, file_name):
+    '''
+    Returns the name of a medicine file in the readable layout: its SMC ID and the name in its link,\
+    so that two medicines with the same file name never overwrite each other.
+
+    '''
+    return re.sub(r'[^\w.-]', '_', ID) + '_' + file_name
+
+class ContentStore():
+    """
+    Content-addressed store of the pdf files of a directory: each distinct content is stored once,\
+    as .objects/<2 first hex digits>/<sha256>.pdf, whatever the links and medicines it comes from.
+    The readable layout, see readable_name, is made of hardlinks to the objects, and the refs file\
+    maps each medicine SMC ID to its object for the filesystems which do not support hardlinks.
+    The objects no medicine refers to anymore, after their file was replaced, are removed by gc.
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__objects_path = str(os.path.join(directory, OBJECTS_DIR_NAME))
+        self.__refs_path = str(os.path.join(self.__objects_path, REFS_NAME))
+        self.__lock = threading.Lock()
+        self.__refs = {} # ID -> sha256, file name and size
+        self.__duplicates = 0 # files whose content was already stored
+        self.__saved_bytes = 0 # bytes of these files, neither written nor stored again
+        self.__damaged = False # True if the refs file could not be read
+        os.makedirs(self.__objects_path, exist_ok = True)
+        if os.path.exists(self.__refs_path):
+            try:
+                with open(self.__refs_path, encoding = 'utf-8') as fh:
+                    self.__refs = json.load(fh)
+            except (OSError, ValueError):
+                # a damaged refs file is rebuilt by the next downloads, the objects are kept
+                self.__damaged = True
+                print(f"Unable to read {self.__refs_path}, it will be rebuilt.")
+
+    def __repr__(self):
+        return "ContentStore"
+
+    def __len__(self):
+        return len(self.__refs)
+
+    @property
+    def objects_path(self):
+        return self.__objects_path
+
+    @property
+    def duplicates(self):
+        return self.__duplicates
+
+    @property
+    def saved_bytes(self):
+        return self.__saved_bytes
+
+    def object_path(self, sha256):
+        '''
+        Returns the path of the object of a content.
+
+        '''
+        return str(os.path.join(self.__objects_path, sha256[:2], sha256 + '.pdf'))
+
+    def get(self, ID):
+        '''
+        Returns a copy of the reference of a medicine: sha256, file name and size, None if it is not stored.
+
+        '''
+        with self.__lock:
+            ref = self.__refs.get(ID)
+            return dict(ref) if ref != None else None
+
+    def write(self, ID, file_name, chunks, meter = None):
+        '''
+        Store the content of a medicine file, hashed while it is streamed.
+        Up to SPOOL_SIZE bytes are kept in memory, so a content already stored is not written at all.
+
+        Parameters
+        ----------
+        ID : str
+            The medicine SMC ID.
+        file_name : str
+            The name of the file in its link.
+        chunks : iterable
+            The content of the file, as bytes chunks.
+        meter : ScrapingClient.TransferMeter, optional
+            A counter for the bytes read.
+
+        Returns
+        -------
+        file_path : str
+            The path of the file in the readable layout, or of its object without hardlinks.
+        size : int
+            The size of the file.
+
+        '''
+        sha256 = hashlib.sha256()
+        spool = [] # the first chunks, until the content is too big to stay in memory
+        size = 0
+        fh, temp_path = None, None
+        try:
+            for chunk in chunks:
+                sha256.update(chunk)
+                size += len(chunk)
+                if meter != None: meter.add(len(chunk))
+                if fh != None: fh.write(chunk)
+                else:
+                    spool.append(chunk)
+                    if size > SPOOL_SIZE:
+                        fd, temp_path = tempfile.mkstemp(dir = self.__objects_path, suffix = '.part')
+                        fh = os.fdopen(fd, mode = 'wb')
+                        fh.writelines(spool)
+                        spool = None
+            if fh != None:
+                fh.flush()
+                os.fsync(fh.fileno())
+                fh.close()
+            elif not os.path.exists(self.object_path(sha256.hexdigest())):
+                # a new content: only now it goes to disk
+                fd, temp_path = tempfile.mkstemp(dir = self.__objects_path, suffix = '.part')
+                with os.fdopen(fd, mode = 'wb') as fh:
+                    fh.writelines(spool)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+        except BaseException:
+            if fh != None: fh.close()
+            if temp_path != None and os.path.exists(temp_path): os.remove(temp_path)
+            raise
+        return self.add(ID, file_name, temp_path, sha256.hexdigest(), size)
+
+    def add(self, ID, file_name, temp_path, sha256, size):
+        '''
+        Move a complete file into the store, or drop it if its content is already stored,\
+        and expose it in the readable layout.
+
+        Parameters
+        ----------
+        ID : str
+            The medicine SMC ID.
+        file_name : str
+            The name of the file in its link.
+        temp_path : str or None
+            The complete file, in the same filesystem. None if the content is known to be stored.
+        sha256 : str
+            The hash of the file.
+        size : int
+            The size of the file.
+
+        Returns
+        -------
+        file_path : str
+            The path of the file in the readable layout, or of its object without hardlinks.
+        size : int
+            The size of the file.
+
+        '''
+        object_path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok = True)
+        with self.__lock:
+            # the check and the move are atomic for the threads sharing the store
+            if os.path.exists(object_path):
+                if temp_path != None: os.remove(temp_path)
+                self.__duplicates += 1
+                self.__saved_bytes += size
+            else: os.replace(temp_path, object_path)
+            previous = self.__refs.get(ID)
+            self.__refs[ID] = {"sha256": sha256, "file": file_name, "size": size}
+            if previous != None and previous["file"] != file_name:
+                # the file of the medicine was renamed, its previous name is not exposed anymore
+                try:
+                    os.remove(os.path.join(self.__directory, readable_name(ID, previous["file"])))
+                except FileNotFoundError:
+                    pass
+        return self.link(object_path, str(os.path.join(self.__directory, readable_name(ID, file_name)))), size
+
+    def link(self, object_path, file_path):
+        '''
+        Expose an object at a path of the readable layout with a hardlink.
+        Returns the path of the file, the object path itself if the filesystem does not support hardlinks.
+
+        '''
+        if os.path.exists(file_path) and os.path.samefile(object_path, file_path): return file_path
+        link_path = f"{file_path}.{threading.get_ident()}.link"
+        try:
+            os.link(object_path, link_path)
+            # replace the previous version atomically
+            os.replace(link_path, file_path)
+        except OSError:
+            if os.path.exists(link_path): os.remove(link_path)
+            # the refs file still maps the medicine to its object
+            return object_path
+        return file_path
+
+    def gc(self):
+        '''
+        Remove the objects no medicine refers to anymore, once the files being stored are complete.
+        Nothing is removed if the refs file could not be read, since the refs are then incomplete.
+
+        Returns
+        -------
+        removed : int
+            The number of objects removed.
+        freed_bytes : int
+            The size of these objects.
+
+        '''
+        removed, freed_bytes = 0, 0
+        with self.__lock:
+            if self.__damaged: return removed, freed_bytes
+            referenced = {ref["sha256"] for ref in self.__refs.values()}
+            for directory, _, file_names in os.walk(self.__objects_path):
+                for file_name in file_names:
+                    sha256, extension = os.path.splitext(file_name)
+                    if extension != '.pdf' or sha256 in referenced: continue
+                    object_path = os.path.join(directory, file_name)
+                    freed_bytes += os.path.getsize(object_path)
+                    os.remove(object_path)
+                    removed += 1
+        return removed, freed_bytes
+
+    def save(self):
+        '''
+        Write the refs file to disk.
+
+        '''
+        with self.__lock:
+            write_json(self.__refs_path, self.__refs)
+            self.__damaged = False # the refs written are the complete ones
+
+class FailureStore():
+    """
+    Durable dead-letter store of the medicines which failed, keyed by SMC ID: the reason of the last\
+    failure, the attempts count and the time of the next retry, which backs off exponentially.
+    A medicine leaves the store once its file is downloaded. The database is only created\
+    by the first failure recorded, until then the store is empty.
+    """
+
+    def __init__(self, db_path, retry_delay = RETRY_DELAY, max_attempts = MAX_RETRY_ATTEMPTS):
+        self.__db_path = db_path
+        self.__retry_delay = retry_delay
+        self.__max_attempts = max_attempts
+
+    def __create(self, connection):
+        # the table is created with the first failure recorded
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS failures (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                link TEXT NOT NULL,
+                pdf_link TEXT,
+                reason TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                first_failed REAL NOT NULL,
+                last_failed REAL NOT NULL,
+                next_retry REAL NOT NULL)""")
+
+    def __repr__(self):
+        return "FailureStore"
+
+    @contextmanager
+    def __connect(self):
+        # a connection per call, like the other SQLite stores, committed and closed on exit
+        with closing(sqlite3.connect(self.__db_path, timeout = 30)) as connection, connection:
+            yield connection
+
+    @property
+    def db_path(self):
+        return self.__db_path
+
+    @property
+    def max_attempts(self):
+        return self.__max_attempts
+
+    @property
+    def exists(self):
+        return os.path.exists(self.__db_path)
+
+    def __len__(self):
+        if not self.exists: return 0
+        with self.__connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM failures").fetchone()[0]
+
+    def update(self, failed, succeeded = ()):
+        '''
+        Record the results of a run in a single transaction.
+
+        Parameters
+        ----------
+        failed : iterable
+            The MedicineRecord of the medicines which failed, their attempts count is increased.
+        succeeded : iterable
+            The SMC IDs of the medicines downloaded, removed from the store.
+
+        '''
+        failed = list(failed)
+        # the medicines downloaded cannot be in a store not created yet
+        if not failed and not self.exists: return
+        now = time.time()
+        with self.__connect() as connection:
+            self.__create(connection)
+            for record in failed:
+                row = connection.execute("SELECT attempts, first_failed FROM failures WHERE id = ?",
+                                         (record.id,)).fetchone()
+                attempts, first_failed = (row[0] + 1, row[1]) if row != None else (1, now)
+                delay = min(self.__retry_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+                connection.execute("INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (record.id, record.name, record.link, record.pdf_link, record.status,
+                                    attempts, first_failed, now, now + delay))
+            connection.executemany("DELETE FROM failures WHERE id = ?", ((ID,) for ID in succeeded))
+
+    def due(self, force = False):
+        '''
+        Returns the medicines to retry: those whose next retry time has come, all of them if force is True.
+        The medicines which failed max_attempts times are left out.
+
+        Returns
+        -------
+        list
+            ID, name and webpage link tuples, the oldest failures first.
+
+        '''
+        if not self.exists: return []
+        with self.__connect() as connection:
+            return connection.execute("""SELECT id, name, link FROM failures
+                                         WHERE attempts < ? AND (? OR next_retry <= ?)
+                                         ORDER BY first_failed""",
+                                      (self.__max_attempts, force, time.time())).fetchall()
+
+    def entries(self):
+        '''
+        Returns the medicines recorded, as dictionnaries of the columns of the store.
+
+        '''
+        if not self.exists: return []
+        with self.__connect() as connection:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute("SELECT * FROM failures ORDER BY first_failed")]
+
+class LinkCache():
+    """
+    Cache of the detailed advice pdf links found in the medicines webpages, keyed by webpage url.
+    Each entry keeps the pdf link, the ETag/Last-Modified validators of the webpage and the time it was\
+    last validated: a link younger than max_age is used without any request, an older one is revalidated\
+    with a conditional request. The least recently used entries beyond max_entries are evicted on save.
+    An entry also keeps the title of its webpage, a link is only used for the medicine name it was found for.
+    The file is read on first use, so creating a cache costs nothing, and only written when an entry\
+    was added, revalidated or removed: the use times of the entries are saved with the next change.
+    """
+
+    def __init__(self, file_path, max_age = LINK_CACHE_AGE, max_entries = LINK_CACHE_ENTRIES):
+        self.__path = file_path
+        self.__max_age = max_age
+        self.__max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__entries = None # url -> link, etag, last_modified, validated and used times
+        self.__changed = False
+
+    def __repr__(self):
+        return "LinkCache"
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__load())
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def settings(self):
+        '''
+        The arguments the cache was created with, to use the same file in another process.
+
+        '''
+        return {"file_path": self.__path, "max_age": self.__max_age, "max_entries": self.__max_entries}
+
+    @property
+    def max_age(self):
+        return self.__max_age
+
+    @max_age.setter
+    def max_age(self, max_age):
+        # 0 revalidates every link with a conditional request
+        self.__max_age = max_age
+
+    @property
+    def max_entries(self):
+        return self.__max_entries
+
+    @max_entries.setter
+    def max_entries(self, max_entries):
+        self.__max_entries = max_entries
+
+    def __load(self):
+        # called with the lock held
+        if self.__entries == None:
+            self.__entries = {}
+            if os.path.exists(self.__path):
+                try:
+                    with open(self.__path, encoding = 'utf-8') as fh:
+                        self.__entries = json.load(fh)
+                except (OSError, ValueError):
+                    # a damaged cache only costs the webpages requests
+                    print(f"Unable to read {self.__path}, it will be rebuilt.")
+        return self.__entries
+
+    def get(self, url):
+        '''
+        Returns a copy of the entry of a webpage, None if it is not cached. The entry becomes the most\
+        recently used, its 'fresh' field tells whether it can be used without a request.
+
+        '''
+        with self.__lock:
+            entry = self.__load().get(url)
+            if entry == None: return None
+            entry["used"] = time.time()
+            return dict(entry, fresh = time.time() - entry["validated"] < self.__max_age)
+
+    def put(self, url, link, etag = None, last_modified = None, title = None):
+        '''
+        Cache the pdf link found in a webpage, with the validators of the webpage response\
+        and the title of the webpage.
+
+        '''
+        now = time.time()
+        with self.__lock:
+            self.__load()[url] = {"link": link, "etag": etag, "last_modified": last_modified, "title": title,
+                                  "validated": now, "used": now}
+            self.__changed = True
+
+    def revalidated(self, url):
+        '''
+        Record that a webpage did not change since its link was cached.
+
+        '''
+        with self.__lock:
+            entry = self.__load().get(url)
+            if entry != None:
+                entry["validated"] = time.time()
+                self.__changed = True
+
+    def discard(self, url):
+        '''
+        Remove the entry of a webpage, e.g. when its cached link does not work anymore.
+
+        '''
+        with self.__lock:
+            if self.__load().pop(url, None) != None: self.__changed = True
+
+    def clear(self):
+        '''
+        Remove all the entries.
+
+        '''
+        with self.__lock:
+            self.__entries = {}
+            self.__changed = True
+
+    def save(self):
+        '''
+        Evict the least recently used entries beyond max_entries and write the cache to disk if it changed.
+
+        '''
+        with self.__lock:
+            if not self.__changed: return
+            entries = self.__load()
+            if len(entries) > self.__max_entries:
+                for url in sorted(entries, key = lambda url: entries[url]["used"])[:len(entries) - self.__max_entries]:
+                    del entries[url]
+            directory = os.path.dirname(self.__path)
+            if directory: os.makedirs(directory, exist_ok = True)
+            write_json(self.__path, entries)
+            self.__changed = False
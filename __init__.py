@@ -5,4 +5,19 @@ Created on Mon Oct 17 19:40:02 2022
 @author: Hichem Dridi
 """
 
-from ScrapingClass import MedAdvScraper
\ No newline at end of file
+from ScrapingClass import MedAdvScraper
+from ScrapingClient import HttpClient
+from ScrapingFunctions import MedicineRecord
+from ScrapingIndex import TableIndex
+from ScrapingMetrics import LoggingSink, JsonLinesSink, PrometheusSink
+from ScrapingSearch import SearchIndex
+from ScrapingArchive import ShardedArchive
+
+# asyncio is only imported by the code using the asynchronous scraper
+LAZY_NAMES = {'AsyncMedAdvScraper': 'ScrapingAsync', 'ScrapingError': 'ScrapingAsync'}
+
+def __getattr__(name):
+    if name in LAZY_NAMES:
+        import importlib
+        return getattr(importlib.import_module(LAZY_NAMES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:12:40 2026
+
+@author: Hichem Dridi
+
+Fixtures shared by the tests: the package modules are imported from the repository root\
+and the local 'Medicines advice' site of ScrapingBenchmarks serves the pages.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import ScrapingFunctions as sf
+import ScrapingBenchmarks as sb
+
+SITE_MEDICINES = 45 # three table pages, the last one incomplete
+
+@pytest.fixture(scope = 'session')
+def site():
+    # the scraping functions point at the local site for the whole session
+    original_url = sf.url
+    with sb.LocalSite(medicines = SITE_MEDICINES, pdf_size = 4 * 1024) as local_site:
+        sf.set_url(local_site.url)
+        yield local_site
+    sf.set_url(original_url)
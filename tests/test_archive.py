@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 15:21:34 2026
+
+@author: Hichem Dridi
+
+The rolling archive shards of the pdf files.
+"""
+
+import os
+import glob
+import pytest
+import ScrapingArchive as sar
+
+@pytest.mark.parametrize('format', sar.ARCHIVE_FORMATS)
+def test_shards_do_not_exceed_max_size(tmp_path, format):
+    max_size = 64 * 1024
+    contents = {f'SMC{number}': os.urandom(5000 + 997 * number) for number in range(30)}
+    with sar.ShardedArchive(str(tmp_path), format, max_size) as archive:
+        for ID, content in contents.items(): archive.write(ID, f'medicine-{ID}.pdf', [content])
+    
+    shards = glob.glob(str(tmp_path / f'{sar.SHARD_PREFIX}*.{format}'))
+    assert len(shards) > 2
+    assert all(os.path.getsize(shard) <= max_size for shard in shards)
+    # the shards are full enough
+    assert sum(map(os.path.getsize, shards)) > (len(shards) - 1) * max_size * 0.6
+    reopened = sar.ShardedArchive(str(tmp_path), format, max_size)
+    assert all(reopened.read(ID) == content for ID, content in contents.items())
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 11:05:52 2026
+
+@author: Hichem Dridi
+
+The asynchronous scraper against the local site.
+"""
+
+import os
+import glob
+import asyncio
+import pytest
+import ScrapingFunctions as sf
+import ScrapingClient as sc
+import ScrapingAsync as sa
+import ScrapingBenchmarks as sb
+
+pytest.importorskip('aiohttp')
+
+def fetch(method, *args, scheduler = None, **kwargs):
+    # run a fetch method of a new scraper in its own event loop
+    async def run():
+        async with sa.AsyncMedAdvScraper(retries = 0, scheduler = scheduler) as scraper:
+            return await getattr(scraper, method)(*args, **kwargs)
+    return asyncio.run(run())
+
+def downloaded(downloads_path):
+    # the files of the local site are named medicine-<number>-..., their medicine ID is SMC<number>
+    return sorted('SMC' + os.path.basename(file_path).split('-')[1]
+                  for file_path in glob.glob(os.path.join(downloads_path, '*.pdf')))
+
+def test_fetch_all_with_limit(site, tmp_path):
+    unretrieved_list, counter, downloads_path = fetch('fetch_all', limit = 23, path = str(tmp_path))
+    assert (unretrieved_list, counter) == ([], 23)
+    assert downloaded(downloads_path) == sorted(site.IDs()[:23])
+
+def test_fetch_byIDs_reports_unknown_IDs(site, tmp_path):
+    unretrieved_list, counter, downloads_path = fetch('fetch_byIDs', ['SMC5', 'SMC999', 'SMC12', 'SMC999'],
+                                                      path = str(tmp_path))
+    assert counter == 2
+    assert unretrieved_list == [('SMC999', None, "Bad or not found ID")]
+    assert downloaded(downloads_path) == ['SMC12', 'SMC5']
+
+def test_fetch_byNames_ignores_case(site, tmp_path):
+    unretrieved_list, counter, downloads_path = fetch('fetch_byNames', ['MEDICINE 7 (generic  7)',
+                                                                        'medicine 31 (GENERIC 31)', 'Unknown'],
+                                                      path = str(tmp_path))
+    assert counter == 2
+    assert unretrieved_list == [(None, 'Unknown', "Wrong or missing name")]
+    assert downloaded(downloads_path) == ['SMC31', 'SMC7']
+
+def test_bad_url_raises_scraping_error(site, tmp_path, monkeypatch):
+    monkeypatch.setattr(sf, 'url', site.url + 'missing/')
+    with pytest.raises(sa.ScrapingError):
+        fetch('fetch_all', limit = 3, path = str(tmp_path))
+    assert downloaded(str(tmp_path / 'Medicines advice')) == []
+
+def test_requests_are_paced_by_the_scheduler(site, tmp_path):
+    scheduler = sc.AdaptiveScheduler(pdf_budget = dict(sc.PDF_BUDGET, concurrency = 1, max_concurrency = 1))
+    assert fetch('fetch_all', limit = 5, path = str(tmp_path), scheduler = scheduler)[1] == 5
+    stats = scheduler.stats()
+    # the first table page and the medicines webpages, then the pdf files one at a time
+    assert (stats["html"]["requests"], stats["pdf"]["requests"]) == (6, 5)
+    assert stats["html"]["in_flight"] == stats["pdf"]["in_flight"] == 0
+
+def test_throttled_requests_are_reported(tmp_path):
+    scheduler = sc.AdaptiveScheduler()
+    with sb.LocalSite(medicines = 5, error_rate = 1.0) as overloaded_site:
+        original_url = sf.url
+        sf.set_url(overloaded_site.url)
+        try:
+            with pytest.raises(sa.ScrapingError):
+                fetch('fetch_all', path = str(tmp_path), scheduler = scheduler)
+        finally:
+            sf.set_url(original_url)
+    stats = scheduler.stats()["html"]
+    assert (stats["requests"], stats["throttled"], stats["in_flight"]) == (1, 1, 0)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:02:37 2026
+
+@author: Hichem Dridi
+
+The scheduler slots of the HTTP client.
+"""
+
+import gc
+import ScrapingClient as sc
+
+def pdf_in_flight(client):
+    return client.scheduler.stats()["pdf"]["in_flight"]
+
+def test_streamed_body_holds_the_slot(site):
+    client = sc.HttpClient(scheduler = sc.AdaptiveScheduler())
+    pdf_link = site.url.replace('/medicines-advice/', '/media/3/medicine-3.pdf')
+    with client.get(pdf_link, kind = 'pdf', stream = True) as response:
+        assert pdf_in_flight(client) == 1
+        chunks = response.iter_content(chunk_size = 1024)
+        next(chunks)
+        assert pdf_in_flight(client) == 1
+        for _ in chunks: pass
+        assert pdf_in_flight(client) == 0
+    assert pdf_in_flight(client) == 0
+
+def test_closed_or_dropped_response_frees_the_slot(site):
+    client = sc.HttpClient(scheduler = sc.AdaptiveScheduler())
+    pdf_link = site.url.replace('/medicines-advice/', '/media/3/medicine-3.pdf')
+    with client.get(pdf_link, kind = 'pdf', stream = True):
+        assert pdf_in_flight(client) == 1
+    assert pdf_in_flight(client) == 0
+    response = client.get(pdf_link, kind = 'pdf', stream = True)
+    assert pdf_in_flight(client) == 1
+    del response
+    gc.collect()
+    assert pdf_in_flight(client) == 0
+    # the body of a response which is not streamed is read by get
+    client.get(pdf_link, kind = 'pdf')
+    assert pdf_in_flight(client) == 0
+
+def test_client_from_settings():
+    client = sc.HttpClient(pool_size = 4, read_timeout = 12, retries = 1, headers = {"User-Agent": "test"},
+                           scheduler = sc.AdaptiveScheduler())
+    other = sc.client_from_settings(client.settings)
+    assert other.settings == client.settings
+    assert other.timeout == (sc.DEFAULT_CONNECT_TIMEOUT, 12) and other.retries == 1
+    assert other.scheduler != None and other.scheduler is not client.scheduler
+    assert sc.client_from_settings(sc.HttpClient().settings).scheduler == None
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:02:45 2026
+
+@author: Hichem Dridi
+
+The table index answering for the table Published while it is fresh.
+"""
+
+import os
+import glob
+import ScrapingFunctions as sf
+import ScrapingClient as sc
+import ScrapingIndex as si
+import ScrapingStorage as ss
+import ScrapingClass as scl
+
+def test_lookup(tmp_path):
+    index = si.TableIndex(str(tmp_path / 'index.sqlite'))
+    index.store({"IDs": ["SMC3", "SMC2", "SMC1"], "Names": ["Gamma", "Beta  Plus", "Alpha"],
+                 "Links": ["/3", "/2", "/1"]})
+    assert index.lookup(["SMC1", "SMC9"], ["beta plus", "ALPHA"]) == {"IDs": ["SMC2", "SMC1"],
+                                                                       "Names": ["Beta  Plus", "Alpha"],
+                                                                       "Links": ["/2", "/1"]}
+    assert index.lookup_IDs(["SMC3"])["IDs"] == ["SMC3"]
+    assert index.lookup_names(["gamma", "delta"])["IDs"] == ["SMC3"]
+    assert index.lookup() == {"IDs": [], "Names": [], "Links": []}
+
+def test_fetch_from_index(site, tmp_path):
+    index = si.TableIndex(str(tmp_path / 'index.sqlite'))
+    index.store(sf.get_table_data_http(client = sc.HttpClient()))
+    scraper = scl.MedAdvScraper(path = str(tmp_path), client = sc.HttpClient(), index = index)
+    scraper.fetch(IDs_list = ["SMC3", "SMC99"], names_list = ["medicine 7 (GENERIC 7)"])
+    downloaded = sorted(os.path.basename(file_path).split('-')[1]
+                        for file_path in glob.glob(str(tmp_path / 'Medicines advice' / '*.pdf')))
+    assert downloaded == ['3', '7']
+    # the links are cached in the downloading directory
+    assert os.path.exists(tmp_path / 'Medicines advice' / ss.LINK_CACHE_NAME)
+
+def test_iter_medicines_limit(site, tmp_path):
+    # from the table: the first page has 20 rows, only the first 3 are generated
+    scraper = scl.MedAdvScraper(client = sc.HttpClient())
+    assert [record.id for record in scraper.iter_medicines(limit = 3)] == site.IDs()[:3]
+    assert [record.id for record in scraper.iter_medicines(limit = 23)] == site.IDs()[:23]
+    # from the index
+    index = si.TableIndex(str(tmp_path / 'index.sqlite'))
+    index.store(sf.get_table_data_http(client = sc.HttpClient()))
+    scraper = scl.MedAdvScraper(client = sc.HttpClient(), index = index)
+    assert [record.id for record in scraper.iter_medicines(limit = 3)] == site.IDs()[:3]
+    assert [record.name for record in scraper.iter_medicines()] == site.names()
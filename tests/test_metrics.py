@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 10:21:36 2026
+
+@author: Hichem Dridi
+
+The timers, counters and sinks of ScrapingMetrics and the run summary of the fetch calls.
+"""
+
+import json
+import logging
+import threading
+import ScrapingClient as sc
+import ScrapingMetrics as sm
+import ScrapingClass as scl
+
+def test_percentile():
+    values = list(range(1, 21))
+    assert sm.percentile(values, 0.5) == 10
+    assert sm.percentile(values, 0.95) == 19
+    assert sm.percentile(values, 1) == 20
+    assert sm.percentile([7], 0.95) == 7
+    assert sm.percentile([], 0.5) == None
+
+def test_counters_and_stages():
+    metrics = sm.Metrics()
+    for seconds in (0.4, 0.1, 0.3, 0.2):
+        metrics.record('dwn_pdf_file', seconds, bytes = 1000)
+    metrics.incr('files_downloaded')
+    metrics.incr('files_downloaded', 2)
+    with metrics.timer('get_file_link') as event:
+        event['found'] = True
+
+    stages, counters = metrics.snapshot()
+    assert counters == {'files_downloaded': 3}
+    stage = stages['dwn_pdf_file']
+    assert (stage.count, stage.p50, stage.p95, stage.max, stage.bytes) == (4, 0.2, 0.4, 0.4, 4000)
+    assert stage.total == sum((0.4, 0.1, 0.3, 0.2))
+    assert stages['get_file_link'].count == 1
+
+    summary = metrics.summary(([], 3, '/tmp'))
+    assert summary.counter == 3 and summary.unretrieved_list == [] and summary.extraction_status == None
+    assert 'dwn_pdf_file' in str(summary)
+
+    metrics.reset()
+    assert metrics.snapshot() == ({}, {})
+
+def test_timer_records_the_error():
+    events = []
+    metrics = sm.Metrics([type('ListSink', (), {'emit': lambda self, event: events.append(event),
+                                                'flush': lambda self, metrics: None})()])
+    try:
+        with metrics.timer('page_load', url = 'x'):
+            raise ValueError()
+    except ValueError:
+        pass
+    assert events[0]['event'] == 'page_load' and events[0]['error'] == 'ValueError'
+    assert metrics.snapshot()[0]['page_load'].count == 1
+
+def test_sinks(tmp_path, caplog):
+    events_path = tmp_path / 'events.jsonl'
+    prometheus_path = tmp_path / 'medadv.prom'
+    metrics = sm.Metrics([sm.JsonLinesSink(str(events_path)), sm.PrometheusSink(str(prometheus_path))])
+    metrics.add_sink(sm.LoggingSink(logging.getLogger('test_metrics')))
+
+    with caplog.at_level(logging.INFO, logger = 'test_metrics'):
+        metrics.record('dwn_pdf_file', 0.5, ID = 'SMC1', bytes = 2048)
+        metrics.incr('files_failed', ID = 'SMC2', reason = 'Inaccessible link for pdf file')
+    metrics.flush()
+
+    events = [json.loads(line) for line in events_path.read_text(encoding = 'utf-8').splitlines()]
+    assert [(event['event'], event.get('ID')) for event in events] == [('dwn_pdf_file', 'SMC1'),
+                                                                       ('files_failed', 'SMC2')]
+    assert events[0]['bytes'] == 2048 and events[1]['value'] == 1
+    assert [json.loads(record.getMessage())['event'] for record in caplog.records] == ['dwn_pdf_file',
+                                                                                       'files_failed']
+
+    lines = prometheus_path.read_text(encoding = 'utf-8').splitlines()
+    assert 'medadv_stage_seconds{stage="dwn_pdf_file",quantile="0.95"} 0.5' in lines
+    assert 'medadv_stage_seconds_count{stage="dwn_pdf_file"} 1' in lines
+    assert 'medadv_stage_bytes_total{stage="dwn_pdf_file"} 2048' in lines
+    assert 'medadv_files_failed_total 1' in lines
+
+def test_concurrent_fetches_have_their_own_summary(site, tmp_path):
+    events_path = tmp_path / 'events.jsonl'
+    scraper = scl.MedAdvScraper(client = sc.HttpClient(), link_cache = None)
+    scraper.metrics.add_sink(sm.JsonLinesSink(str(events_path)))
+    summaries = {}
+
+    def fetch(limit):
+        summaries[limit] = scraper.fetch_all(limit = limit, path = str(tmp_path / str(limit)))
+
+    threads = [threading.Thread(target = fetch, args = (limit,)) for limit in (3, 25)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+
+    for limit, summary in summaries.items():
+        assert summary.counter == limit
+        assert summary.counters['files_downloaded'] == limit
+        assert summary.stages['dwn_pdf_file'].count == limit
+        assert summary.stages['get_file_link'].count == limit
+    # the sinks of the scraper receive the events of both runs
+    events = [json.loads(line) for line in events_path.read_text(encoding = 'utf-8').splitlines()]
+    assert sum(event['event'] == 'files_downloaded' for event in events) == 28
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:40:18 2026
+
+@author: Hichem Dridi
+
+The durable work queue shared by the worker processes of a sharded crawl.
+"""
+
+import os
+import glob
+import time
+import sqlite3
+import multiprocessing
+from contextlib import closing
+import pytest
+import ScrapingFunctions as sf
+import ScrapingClient as sc
+import ScrapingQueue as sq
+import ScrapingStorage as ss
+import ScrapingClass as scl
+
+def table_rows(site):
+    data_dict = sf.get_table_data_http(client = sc.HttpClient())
+    return list(zip(data_dict['IDs'], data_dict['Names'], data_dict['Links']))
+
+def attempts(db_path):
+    with closing(sqlite3.connect(db_path)) as connection:
+        return dict(connection.execute("SELECT id, attempts FROM tasks").fetchall())
+
+def downloaded(downloads_path):
+    # the files of the local site are named medicine-<number>-..., their medicine ID is SMC<number>
+    return sorted('SMC' + os.path.basename(file_path).split('-')[1]
+                  for file_path in glob.glob(os.path.join(downloads_path, '*.pdf')))
+
+def test_workers_process_every_row_once(site, tmp_path):
+    rows = table_rows(site)
+    db_path = str(tmp_path / sq.QUEUE_NAME)
+    queue = sq.WorkQueue(db_path)
+    queue.put(rows)
+    
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target = sq.run_worker, args = (db_path, str(tmp_path), 4, 4, sq.DEFAULT_LEASE,
+                                                                sf.DEFAULT_CHUNK_SIZE, sf.url))
+               for _ in range(3)]
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
+    
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+    assert queue.counts() == {'pending': 0, 'leased': 0, 'done': len(rows), 'failed': 0}
+    # each row was claimed by a single worker
+    assert set(attempts(db_path).values()) == {1}
+    assert downloaded(str(tmp_path)) == sorted(ID for ID, _, _ in rows)
+
+def test_expired_lease_is_claimed_again(site, tmp_path):
+    rows = table_rows(site)[:6]
+    db_path = str(tmp_path / sq.QUEUE_NAME)
+    queue = sq.WorkQueue(db_path, lease_time = 0.5)
+    queue.put(rows)
+    # a worker claims a batch and stops
+    lost = queue.claim('stopped-worker', batch = 3)
+    assert queue.counts()['leased'] == 3
+    time.sleep(0.6)
+    
+    assert sq.run_worker(db_path, str(tmp_path), threads = 2, batch = 2, lease_time = 0.5, url = sf.url) == 6
+    assert queue.counts()['done'] == 6
+    assert all(attempts(db_path)[ID] == 2 for ID, _, _ in lost)
+    # the late result of the stopped worker is not recorded
+    assert not queue.complete('stopped-worker', sf.MedicineRecord(*lost[0], status = sf.STATUS_DOWNLOADED))
+
+def test_interrupted_run_is_resumed(site, tmp_path):
+    rows = table_rows(site)
+    data_dict = {'IDs': [row[0] for row in rows], 'Names': [row[1] for row in rows], 'Links': [row[2] for row in rows]}
+    downloads_path = sf.get_downloading_path(str(tmp_path))
+    db_path = str(tmp_path / sq.QUEUE_NAME)
+    # the previous run completed the first rows and left some leased when it was interrupted
+    queue = sq.WorkQueue(db_path, lease_time = 0.5)
+    queue.put(rows)
+    finished = queue.claim('interrupted-worker', batch = 10)
+    for row in finished: queue.complete('interrupted-worker', sf.MedicineRecord(*row, status = sf.STATUS_DOWNLOADED))
+    queue.claim('interrupted-worker', batch = 5)
+    time.sleep(0.6)
+    
+    unretrieved_list, counter, path = sq.sharded_process(data_dict, str(tmp_path), processes = 2, threads = 4,
+                                                         db_path = db_path, batch = 4, lease_time = 0.5)
+    assert path == downloads_path
+    assert unretrieved_list == []
+    assert counter == len(rows) - len(finished)
+    # the completed rows were not downloaded again
+    assert downloaded(downloads_path) == sorted(ID for ID, _, _ in rows[len(finished):])
+    assert queue.unfinished() == 0
+
+def test_sharded_fetch_rejects_single_process_options(tmp_path):
+    for option, value in (('sync', True), ('extract', True), ('dedup', True), ('archive', 'zip')):
+        scraper = scl.MedAdvScraper(path = str(tmp_path), **{option: value})
+        with pytest.raises(ValueError, match = option):
+            scraper.fetch_sharded()
+
+def test_sharded_fetch_uses_the_link_cache(site, tmp_path):
+    scraper = scl.MedAdvScraper(path = str(tmp_path), client = sc.HttpClient())
+    summary = scraper.fetch_sharded(processes = 1)
+    assert summary.counter == len(site.IDs())
+    # the worker saved the links it found in the cache of the downloading directory
+    cache = ss.LinkCache(str(os.path.join(summary.downloads_path, ss.LINK_CACHE_NAME)))
+    assert len(cache) == len(site.IDs())
+    assert all(cache.get(link)["fresh"] for _, _, link in table_rows(site))
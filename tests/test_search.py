@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 14:37:09 2026
+
+@author: Hichem Dridi
+
+The inverted index over the documents extracted, its segments and their merge.
+"""
+
+import glob
+import ScrapingSearch as ssr
+
+def segments(directory):
+    return sorted(glob.glob(str(directory / 'seg_*.lex')))
+
+def test_add_commit_and_search(tmp_path):
+    with ssr.SearchIndex(str(tmp_path)) as search_index:
+        search_index.add("SMC1", "Alpha (alphamab)", "Accepted for use in adult patients.", "hash1")
+        search_index.add("SMC2", "Beta", "Not recommended for use in NHSScotland.")
+        # the documents are searchable once committed
+        assert search_index.search("use") == []
+        search_index.commit()
+        assert search_index.search("USE") == ["SMC1", "SMC2"]
+        assert search_index.search(["adult", "use"]) == ["SMC1"]
+        assert search_index.search("alphamab") == ["SMC1"]
+        assert search_index.search("smc2") == ["SMC2"]
+        assert search_index.search("adult nhsscotland") == []
+        assert search_index.search("") == []
+        assert len(search_index) == 2
+        assert search_index.indexed_sha256("SMC1") == "hash1" and search_index.indexed_sha256("SMC3") == None
+
+def test_segments_are_merged(tmp_path):
+    with ssr.SearchIndex(str(tmp_path)) as search_index:
+        for number in range(ssr.MAX_SEGMENTS):
+            search_index.add(f"SMC{number}", f"Medicine {number}", "common text")
+            search_index.commit()
+        assert len(segments(tmp_path)) == ssr.MAX_SEGMENTS
+        # a commit without a document does not write a segment
+        search_index.commit()
+        assert len(segments(tmp_path)) == ssr.MAX_SEGMENTS
+
+        search_index.add("SMC0", "Medicine 0", "replaced text")
+        search_index.commit()
+        assert len(segments(tmp_path)) == 1
+        assert search_index.search("common") == [f"SMC{number}" for number in range(1, ssr.MAX_SEGMENTS)]
+        assert search_index.search(["medicine", "replaced"]) == ["SMC0"]
+
+def test_replaced_document_does_not_match_its_old_terms(tmp_path):
+    with ssr.SearchIndex(str(tmp_path)) as search_index:
+        search_index.add("SMC1", "Alpha", "first version restricted")
+        search_index.commit()
+        search_index.add("SMC1", "Alpha", "second version accepted")
+        search_index.commit()
+        assert search_index.search("restricted") == []
+        assert search_index.search("accepted") == ["SMC1"]
+        assert search_index.search("version") == ["SMC1"]
+        assert len(search_index) == 1
+
+def test_reopen_from_disk(tmp_path):
+    with ssr.SearchIndex(str(tmp_path)) as search_index:
+        search_index.add("SMC1", "Alpha", "first version restricted", "hash1")
+        search_index.add("SMC2", "Beta", "accepted")
+        search_index.commit()
+        search_index.add("SMC1", "Alpha", "second version accepted", "hash2")
+        search_index.commit()
+        # a document added without commit is lost
+        search_index.add("SMC3", "Gamma", "accepted")
+
+    with ssr.SearchIndex(str(tmp_path)) as search_index:
+        assert search_index.search("accepted") == ["SMC2", "SMC1"]
+        assert search_index.search("restricted") == []
+        assert search_index.indexed_sha256("SMC1") == "hash2"
+        assert len(search_index) == 2
+        # the next segment does not overwrite the existing ones
+        search_index.add("SMC3", "Gamma", "accepted")
+        search_index.commit()
+        assert search_index.search("accepted") == ["SMC2", "SMC1", "SMC3"]
+        assert len(segments(tmp_path)) == 3
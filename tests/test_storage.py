@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:05:52 2026
+
+@author: Hichem Dridi
+
+The content-addressed store of the pdf files.
+"""
+
+import os
+import ScrapingStorage as ss
+
+def objects(store):
+    return sorted(file_name for _, _, file_names in os.walk(store.objects_path)
+                  for file_name in file_names if file_name.endswith('.pdf'))
+
+def test_replaced_objects_are_removed(tmp_path):
+    store = ss.ContentStore(str(tmp_path))
+    store.write('SMC1', 'first.pdf', [b'version 1'])
+    store.write('SMC2', 'second.pdf', [b'version 1'])
+    store.write('SMC3', 'third.pdf', [b'other'])
+    assert len(objects(store)) == 2 and store.duplicates == 1
+    
+    # the content shared with SMC2 is kept, the one of SMC3 is not referenced anymore
+    store.write('SMC1', 'first.pdf', [b'version 2'])
+    store.write('SMC3', 'third-v2.pdf', [b'version 2'])
+    assert store.gc() == (1, len(b'other'))
+    assert objects(store) == sorted(store.get(ID)['sha256'] + '.pdf' for ID in ('SMC1', 'SMC2'))
+    assert not os.path.exists(tmp_path / ss.readable_name('SMC3', 'third.pdf'))
+    assert (tmp_path / ss.readable_name('SMC3', 'third-v2.pdf')).read_bytes() == b'version 2'
+    assert (tmp_path / ss.readable_name('SMC2', 'second.pdf')).read_bytes() == b'version 1'
+    store.save()
+    assert ss.ContentStore(str(tmp_path)).gc() == (0, 0)
+
+def test_damaged_refs_keep_the_objects(tmp_path):
+    store = ss.ContentStore(str(tmp_path))
+    store.write('SMC1', 'first.pdf', [b'version 1'])
+    store.save()
+    with open(os.path.join(store.objects_path, ss.REFS_NAME), mode = 'w') as fh: fh.write('{')
+    damaged = ss.ContentStore(str(tmp_path))
+    assert damaged.gc() == (0, 0)
+    assert len(objects(damaged)) == 1
+
+def test_failure_store_is_created_by_the_first_failure(tmp_path):
+    import ScrapingFunctions as sf
+    
+    failures = ss.FailureStore(str(tmp_path / ss.FAILURES_NAME))
+    failures.update([], ['SMC1'])
+    assert not failures.exists
+    assert len(failures) == 0 and failures.due(force = True) == [] and failures.entries() == []
+    
+    failures.update([sf.MedicineRecord('SMC2', 'Medicine 2', '/2', status = 'Fail! Code: 404, Not Found')], ['SMC1'])
+    assert failures.exists and len(failures) == 1
+    assert failures.due() == [] # backing off
+    assert failures.due(force = True) == [('SMC2', 'Medicine 2', '/2')]
+    failures.update([], ['SMC2'])
+    assert len(failures) == 0
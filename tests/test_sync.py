@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 09:14:26 2026
+
+@author: Hichem Dridi
+
+The incremental sync of the pdf files: conditional requests and resumed downloads.
+"""
+
+import os
+import threading
+import ScrapingFunctions as sf
+import ScrapingClient as sc
+import ScrapingStorage as ss
+import ScrapingBenchmarks as sb
+
+PDF_SIZE = 4 * 1024 # see the site fixture
+
+def pdf_link(site, number):
+    return site.url.replace('/medicines-advice/', f'/media/{number}/medicine-{number}-final-october-2022-for-website.pdf')
+
+def part_path(directory, ID):
+    return os.path.join(directory, '.' + ID + '.part')
+
+def sync(site, directory, number, client, timeout = 30):
+    # the download runs in a daemon thread so that a deadlock fails the test instead of hanging it
+    record = sf.MedicineRecord(f'SMC{number}', f'Medicine {number}', None)
+    manifest = ss.DownloadManifest(directory)
+    result = []
+    thread = threading.Thread(target = lambda: result.append(sf.sync_pdf_file(
+        record.id, record.name, pdf_link(site, number), directory, manifest, client, record = record)), daemon = True)
+    thread.start()
+    thread.join(timeout)
+    assert result, f"The download did not complete within {timeout} s"
+    manifest.save()
+    return result[0], record
+
+def test_unsatisfiable_range_restarts_at_concurrency_1(site, tmp_path):
+    scheduler = sc.AdaptiveScheduler(pdf_budget = dict(sc.PDF_BUDGET, concurrency = 1, max_concurrency = 1))
+    client = sc.HttpClient(scheduler = scheduler)
+    directory = str(tmp_path)
+    assert sync(site, directory, 3, client)[0] == None
+    
+    # the final file is lost and the partial file is longer than the document
+    os.remove(os.path.join(directory, os.path.basename(pdf_link(site, 3))))
+    with open(part_path(directory, 'SMC3'), mode = 'wb') as fh: fh.write(b'1' * (PDF_SIZE + 100))
+    failure, record = sync(site, directory, 3, client)
+    assert failure == None
+    assert record.status == sf.STATUS_DOWNLOADED and record.bytes == PDF_SIZE
+    assert os.path.getsize(record.path) == PDF_SIZE
+    assert not os.path.exists(part_path(directory, 'SMC3'))
+    assert scheduler.stats()["pdf"]["in_flight"] == 0
+
+def interrupt(site, directory, number, kept):
+    # the final file is lost and only its first bytes are left in the partial file
+    file_path = os.path.join(directory, os.path.basename(pdf_link(site, number)))
+    with open(file_path, mode = 'rb') as fh: content = fh.read()
+    os.remove(file_path)
+    with open(part_path(directory, f'SMC{number}'), mode = 'wb') as fh: fh.write(content[:kept])
+    return content
+
+def test_unchanged_file_is_not_downloaded(site, tmp_path):
+    client = sc.HttpClient()
+    failure, record = sync(site, str(tmp_path), 4, client)
+    assert failure == None and record.status == sf.STATUS_DOWNLOADED and record.bytes == PDF_SIZE
+    failure, record = sync(site, str(tmp_path), 4, client)
+    assert failure == None and record.status == sf.STATUS_UP_TO_DATE and record.bytes == 0
+
+def test_interrupted_download_is_resumed(site, tmp_path):
+    client = sc.HttpClient()
+    sync(site, str(tmp_path), 5, client)
+    content = interrupt(site, str(tmp_path), 5, 1000)
+    failure, record = sync(site, str(tmp_path), 5, client)
+    assert failure == None
+    # only the missing bytes are downloaded
+    assert record.status == sf.STATUS_DOWNLOADED and record.bytes == PDF_SIZE - 1000
+    with open(record.path, mode = 'rb') as fh: assert fh.read() == content
+    assert ss.DownloadManifest(str(tmp_path)).get('SMC5')['size'] == PDF_SIZE
+
+def test_unsatisfiable_range_downloads_again(site, tmp_path):
+    client = sc.HttpClient()
+    sync(site, str(tmp_path), 6, client)
+    content = interrupt(site, str(tmp_path), 6, PDF_SIZE)
+    failure, record = sync(site, str(tmp_path), 6, client)
+    assert failure == None and record.bytes == PDF_SIZE
+    with open(record.path, mode = 'rb') as fh: assert fh.read() == content
+
+def test_misplaced_range_downloads_again(tmp_path):
+    with sb.LocalSite(medicines = 10, pdf_size = PDF_SIZE, bad_ranges = True) as bad_site:
+        client = sc.HttpClient()
+        sync(bad_site, str(tmp_path), 7, client)
+        content = interrupt(bad_site, str(tmp_path), 7, 1000)
+        failure, record = sync(bad_site, str(tmp_path), 7, client)
+    # the partial response is not appended, the whole file is downloaded again
+    assert failure == None and record.bytes == PDF_SIZE
+    with open(record.path, mode = 'rb') as fh: assert fh.read() == content
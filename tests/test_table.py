@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:20:11 2026
+
+@author: Hichem Dridi
+
+The table of the medicines advice and the medicines webpages, harvested over HTTP and through the browser.
+"""
+
+import re
+import html
+import time
+import shutil
+import pytest
+import ScrapingFunctions as sf
+import ScrapingClient as sc
+import ScrapingStorage as ss
+import ScrapingBenchmarks as sb
+
+ROW_PATTERN = re.compile(r'medicine-advice-table__id-row">([^<]*)<.*?medicine-advice-table__link" href="([^"]*)">'
+                         r'([^<]*)<', re.DOTALL)
+
+class FakeElement():
+    """
+    Element of FakeDriver, always displayed and enabled.
+    """
+
+    def __init__(self, value = None, on_click = None):
+        self.__value = value
+        self.__on_click = on_click
+
+    def get_attribute(self, name):
+        return self.__value
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        if self.__on_click != None: self.__on_click()
+
+class FakeDriver():
+    """
+    Stand-in for a selenium webdriver on the local site: the pages are requested over HTTP, the button\
+    'load more' appends the next table page like the page script, and the javascript extraction of the\
+    rows is emulated with a pattern independent of parse_table_rows.
+    """
+
+    def __init__(self):
+        self.title = None
+        self.current_url = None
+        self.page_source = None
+        self.__page = 1
+
+    def get(self, url):
+        import requests
+
+        self.current_url = url
+        self.page_source = requests.get(url, timeout = 10).text
+        self.title = html.unescape(re.search(r'<title>(.*?)</title>', self.page_source).group(1))
+        self.__page = 1
+
+    def __load_more(self):
+        import requests
+
+        self.__page += 1
+        rows = requests.get(f'{self.current_url}?page={self.__page}', timeout = 10).text
+        self.page_source = self.page_source.replace('</tbody>', rows + '\n</tbody>', 1)
+
+    def find_element(self, by, value):
+        if value == 'max-page-0':
+            return FakeElement(re.search(r'id="max-page-0" value="(\d+)"', self.page_source).group(1))
+        if 'btn-more-0' in value: return FakeElement(on_click = self.__load_more)
+        return FakeElement()
+
+    def execute_script(self, script, *args):
+        rows = ROW_PATTERN.findall(self.page_source)
+        if script == sf.TABLE_COUNT_SCRIPT: return len(rows)
+        assert script == sf.TABLE_ROWS_SCRIPT
+        start = args[0] if args else 0
+        # innerText is trimmed and the href property is absolute
+        return {"IDs": [ID.strip() for ID, _, _ in rows[start:]],
+                "Names": [html.unescape(name).strip() for _, _, name in rows[start:]],
+                "Links": [sf.urljoin(self.current_url, link) for _, link, _ in rows[start:]]}
+
+    def quit(self):
+        pass
+
+class FakeProvider():
+    """
+    Stand-in for sf.driver_provider handing out FakeDriver objects.
+    """
+
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, metrics = None):
+        self.acquired += 1
+        return FakeDriver()
+
+    def release(self, driver, keep_alive = False):
+        pass
+
+def browser_installed():
+    return any(shutil.which(name) for name in ('google-chrome', 'chromium', 'chromium-browser', 'chrome',
+                                                'firefox', 'msedge', 'microsoft-edge'))
+
+def test_parse_table_rows_page_and_fragment():
+    page = sb.make_table_page(sb.make_table_rows(1, 4))
+    data_dict = sf.parse_table_rows(page, base_url = 'http://example.org/medicines-advice/')
+    assert data_dict == {"IDs": ["SMC1", "SMC2", "SMC3"],
+                         "Names": [f"Medicine {n} (generic {n})" for n in (1, 2, 3)],
+                         "Links": [f"http://example.org/medicines-advice/medicine-{n}-full-smc{n}/"
+                                   for n in (1, 2, 3)]}
+    # a 'load more' fragment only has rows
+    fragment = sf.parse_table_rows(sb.make_table_rows(4, 6), base_url = 'http://example.org/medicines-advice/')
+    assert fragment["IDs"] == ["SMC4", "SMC5"]
+
+def test_get_table_data_http(site):
+    data_dict = sf.get_table_data_http(client = sc.HttpClient())
+    assert data_dict["IDs"] == site.IDs()
+    assert data_dict["Names"] == site.names()
+    assert all(link.startswith(site.url) for link in data_dict["Links"])
+    limited = sf.get_table_data_http(limit = 25, client = sc.HttpClient())
+    assert limited["IDs"][:25] == site.IDs()[:25]
+
+def test_selenium_path_matches_http(site, monkeypatch):
+    monkeypatch.setattr(sf, 'driver_provider', FakeProvider())
+    http_dict = sf.get_table_data_http(client = sc.HttpClient())
+    assert sf.get_table_data(browserless = False) == http_dict
+
+def test_fallback_to_selenium(site, monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setattr(sf, 'driver_provider', provider)
+    http_dict = sf.get_table_data_http(client = sc.HttpClient())
+    
+    def failing(limit = None, client = None, workers = None, metrics = None):
+        raise ValueError("The table is not available over HTTP")
+    monkeypatch.setattr(sf, 'get_table_data_http', failing)
+    assert sf.get_table_data(client = sc.HttpClient()) == http_dict
+    assert provider.acquired == 1
+
+@pytest.mark.skipif(not browser_installed(), reason = "no browser installed")
+def test_real_browser_matches_http(site):
+    http_dict = sf.get_table_data_http(client = sc.HttpClient())
+    assert sf.get_table_data(browserless = False) == http_dict
+
+def test_get_file_link(site):
+    client = sc.HttpClient()
+    med_data = sf.get_file_link('SMC7', 'Medicine 7 (generic 7)', site.url + 'medicine-7-full-smc7/', client)
+    assert med_data["File link"].endswith('/media/7/medicine-7-final-october-2022-for-website.pdf')
+    assert med_data["File link"].startswith(sf.base_url)
+    assert med_data["Cached"] == False
+
+def test_get_file_link_title_mismatch(site):
+    assert sf.get_file_link('SMC7', 'Medicine 8 (generic 8)', site.url + 'medicine-7-full-smc7/',
+                            sc.HttpClient()) == None
+
+def test_get_file_link_missing_link(site):
+    # the table page has the right title but no pdf link
+    assert sf.get_file_link('SMC0', 'Medicines advice', site.url, sc.HttpClient()) == None
+    # an inaccessible page
+    assert sf.get_file_link('SMC999', 'Medicine 999 (generic 999)', site.url + 'medicine-999-full-smc999/',
+                            sc.HttpClient()) == None
+
+class RecordingClient():
+    """
+    HttpClient recording the links requested.
+    """
+
+    def __init__(self):
+        self.client = sc.HttpClient()
+        self.links = []
+
+    def get(self, link, kind = 'html', **kwargs):
+        self.links.append(link)
+        return self.client.get(link, kind, **kwargs)
+
+def test_table_pages_requested_ahead(site):
+    client = RecordingClient()
+    pages = sf.iter_table_pages_http(client = client, workers = 1)
+    next(pages)
+    next(pages)
+    # the second page is consumed, only the third one is requested ahead
+    time.sleep(0.2)
+    assert [link.split('?')[-1] for link in client.links[1:]] == ['page=2', 'page=3']
+    pages.close()
+
+def test_get_file_link_cache(site, tmp_path):
+    cache = ss.LinkCache(str(tmp_path / ss.LINK_CACHE_NAME))
+    client = sc.HttpClient()
+    page_url = site.url + 'medicine-7-full-smc7/'
+    found = sf.get_file_link('SMC7', 'Medicine 7 (generic 7)', page_url, client, cache)
+    assert found["Cached"] == False
+    cached = sf.get_file_link('SMC7', 'Medicine 7 (generic 7)', page_url, client, cache)
+    assert cached["Cached"] == True and cached["File link"] == found["File link"]
+    # the title is still checked for a cached link
+    assert sf.get_file_link('SMC7', 'Medicine 8 (generic 8)', page_url, client, cache) == None
+
+def test_link_cache_saved_only_when_changed(tmp_path):
+    cache_path = tmp_path / ss.LINK_CACHE_NAME
+    cache = ss.LinkCache(str(cache_path))
+    cache.put('http://example.org/a/', 'http://example.org/a.pdf', title = 'A')
+    cache.save()
+    cache_path.unlink()
+    
+    cache = ss.LinkCache(str(cache_path))
+    cache_path.write_text('{"http://example.org/a/": {"link": "http://example.org/a.pdf", "etag": null, '
+                          '"last_modified": null, "title": "A", "validated": 0, "used": 0}}')
+    assert cache.get('http://example.org/a/')["fresh"] == False
+    cache_path.unlink()
+    cache.save()
+    assert not cache_path.exists()
+    cache.revalidated('http://example.org/a/')
+    cache.save()
+    assert cache_path.exists()